@@ -1,24 +1,15 @@
 from __future__ import annotations
 
-import json
-import re
 from dataclasses import dataclass
 
-from .llm import LLM
+from .deadline import Deadline
+from .llm import DEFAULT_MAX_TOKENS, LLM, template_post
+from .llm_accounting import call_context
+from .structured_output import BATCH_SCHEMA, POST_SCHEMA, WRITER_OUTCOMES, normalize_post, parse_post, parse_post_list
 
 
-def _extract_json_obj(text: str) -> dict | None:
-    if not text:
-        return None
-    s = text.strip()
-    start = s.find("{")
-    end = s.rfind("}")
-    if start == -1 or end == -1 or end <= start:
-        return None
-    try:
-        return json.loads(s[start : end + 1])
-    except Exception:
-        return None
+# Post length limit stated in the writer prompts.
+_POST_MAX_CHARS = 900
 
 
 def _clamp(s: str, n: int) -> str:
@@ -57,23 +48,21 @@ class OrchestratorAgent:
         return out
 
 
-class WriterAgent:
-    def __init__(self, llm: LLM):
-        self.llm = llm
+_WRITER_STYLES = {
+    "breaking_news": "Срочная новость: коротко, что случилось и почему важно.",
+    "tool_of_the_day": "Сфокусируйся на практическом инструменте/фиче и как применить.",
+    "explain_like_5": "Объясни простыми словами, но без потери смысла.",
+    "opinionated_take": "Дай осторожное мнение + аргументы + риски.",
+    "use_case": "Опиши кейс применения: проблема→решение→результат.",
+    "daily_digest": "Дай сжатый дайджест 1 новости с выводами.",
+}
 
-    def write(self, *, title: str, source: str, link: str, summary: str, format: str, lang: str) -> PlannedPost:
-        sys = "Ты редактор Telegram-канала про AI/LLM/AI-агентов. Пиши четко, кратко, без воды."
-        style_map = {
-            "breaking_news": "Срочная новость: коротко, что случилось и почему важно.",
-            "tool_of_the_day": "Сфокусируйся на практическом инструменте/фиче и как применить.",
-            "explain_like_5": "Объясни простыми словами, но без потери смысла.",
-            "opinionated_take": "Дай осторожное мнение + аргументы + риски.",
-            "use_case": "Опиши кейс применения: проблема→решение→результат.",
-            "daily_digest": "Дай сжатый дайджест 1 новости с выводами.",
-        }
-        style = style_map.get(format, "Новостной пост")
-
-        user = f"""Дано:
+
+def _writer_prompt(*, title: str, source: str, link: str, summary: str, format: str, lang: str) -> tuple[str, str]:
+    sys = "Ты редактор Telegram-канала про AI/LLM/AI-агентов. Пиши четко, кратко, без воды."
+    style = _WRITER_STYLES.get(format, "Новостной пост")
+
+    user = f"""Дано:
 - Источник: {source}
 - Заголовок: {title}
 - Ссылка: {link}
@@ -95,38 +84,46 @@ class WriterAgent:
 - 1 строка заголовок, затем 3-6 буллетов, затем 1 takeaway, затем ссылка, затем 2-5 хэштегов
 - Не выдумывай факты. Если данных мало - явно отметь.
 """
+    return sys, user
+
+
+def _writer_batch_prompt(*, items: list[dict], lang: str) -> tuple[str, str]:
+    sys = "Ты редактор Telegram-канала про AI/LLM/AI-агентов. Пиши четко, кратко, без воды."
+    blocks = []
+    for i, it in enumerate(items, 1):
+        blocks.append(
+            f"""[{i}] guid: {it["guid"]}
+- Источник: {it["source"]}
+- Заголовок: {it["title"]}
+- Ссылка: {it["link"]}
+- Стиль: {_WRITER_STYLES.get(it["format"], "Новостной пост")}
+- Анонс/текст:
+{it["summary"]}
+"""
+        )
+    news = "\n".join(blocks)
 
-        raw = None
-        if self.llm.prefer_ollama:
-            raw = self.llm._ollama_generate(system=sys, prompt=user)
-            if not raw:
-                raw = self.llm._openai_chat(system=sys, user=user)
-        else:
-            raw = self.llm._openai_chat(system=sys, user=user)
-            if not raw:
-                raw = self.llm._ollama_generate(system=sys, prompt=user)
-
-        obj = _extract_json_obj(raw or "")
-        if not obj:
-            # fallback to existing freeform rewrite
-            text = self.llm.rewrite_news(title=title, source=source, link=link, summary=summary, lang=lang)
-            return PlannedPost(guid=link or title, format=format, alt_title_1=title, alt_title_2=title, post_text=text)
-
-        alt1 = _clamp(str(obj.get("alt_title_1", "")), 90) or _clamp(title, 90)
-        alt2 = _clamp(str(obj.get("alt_title_2", "")), 90) or alt1
-        post = (obj.get("post") or "").strip()
-        if not post:
-            post = self.llm.rewrite_news(title=title, source=source, link=link, summary=summary, lang=lang)
-        return PlannedPost(guid=link or title, format=format, alt_title_1=alt1, alt_title_2=alt2, post_text=post)
+    user = f"""Дано {len(items)} новостей:
 
+{news}
+Сделай по одному посту на каждую новость на языке: {lang}.
 
-class CriticAgent:
-    def __init__(self, llm: LLM):
-        self.llm = llm
+Верни строго JSON: объект с массивом posts, по одному объекту на новость, с guid из входных данных:
+{{"posts": [
+  {{"guid": "...", "alt_title_1": "...", "alt_title_2": "...", "post": "..."}}
+]}}
+
+Правила для каждого post:
+- post <= 900 символов
+- 1 строка заголовок, затем 3-6 буллетов, затем 1 takeaway, затем ссылка, затем 2-5 хэштегов
+- Не выдумывай факты. Если данных мало - явно отметь.
+"""
+    return sys, user
 
-    def review(self, *, post_text: str, lang: str) -> str:
-        sys = "Ты строгий редактор-критик Telegram-постов."
-        user = f"""Проверь пост (язык: {lang}).
+
+def _critic_prompt(*, post_text: str, lang: str) -> tuple[str, str]:
+    sys = "Ты строгий редактор-критик Telegram-постов."
+    user = f"""Проверь пост (язык: {lang}).
 
 Пост:
 {post_text}
@@ -136,25 +133,12 @@ class CriticAgent:
 - что неясно/слишком длинно
 - что улучшить в первом экране
 """
-        out = None
-        if self.llm.prefer_ollama:
-            out = self.llm._ollama_generate(system=sys, prompt=user)
-            if not out:
-                out = self.llm._openai_chat(system=sys, user=user)
-        else:
-            out = self.llm._openai_chat(system=sys, user=user)
-            if not out:
-                out = self.llm._ollama_generate(system=sys, prompt=user)
-        return (out or "").strip()
+    return sys, user
 
 
-class ReviserAgent:
-    def __init__(self, llm: LLM):
-        self.llm = llm
-
-    def revise(self, *, post_text: str, critique: str, lang: str) -> str:
-        sys = "Ты редактор. Улучши пост по замечаниям критика."
-        user = f"""Язык: {lang}
+def _reviser_prompt(*, post_text: str, critique: str, lang: str) -> tuple[str, str]:
+    sys = "Ты редактор. Улучши пост по замечаниям критика."
+    user = f"""Язык: {lang}
 
 Исходный пост:
 {post_text}
@@ -167,13 +151,123 @@ class ReviserAgent:
 - заголовок + 3-6 буллетов + takeaway + ссылка + 2-5 хэштегов
 - не добавляй новых фактов, которых не было
 """
-        out = None
-        if self.llm.prefer_ollama:
-            out = self.llm._ollama_generate(system=sys, prompt=user)
-            if not out:
-                out = self.llm._openai_chat(system=sys, user=user)
-        else:
-            out = self.llm._openai_chat(system=sys, user=user)
-            if not out:
-                out = self.llm._ollama_generate(system=sys, prompt=user)
+    return sys, user
+
+
+def _planned_post(obj: dict, *, title: str, link: str, format: str, post: str) -> PlannedPost:
+    alt1 = _clamp(str(obj.get("alt_title_1", "")), 90) or _clamp(title, 90)
+    alt2 = _clamp(str(obj.get("alt_title_2", "")), 90) or alt1
+    return PlannedPost(guid=link or title, format=format, alt_title_1=alt1, alt_title_2=alt2, post_text=post)
+
+
+def _writer_result(raw: str | None, *, title: str, source: str, link: str, summary: str, format: str) -> tuple[PlannedPost, str]:
+    """Turn one writer answer into a post without asking the LLM again.
+
+    A JSON answer is validated and repaired locally; plain text (the model
+    ignored the format) is used as the post; anything else gets the template.
+    """
+    obj, status = parse_post(raw or "")
+    if obj is not None:
+        return _planned_post(obj, title=title, link=link, format=format, post=obj["post"]), status
+    text = (raw or "").strip()
+    if text and "{" not in text:
+        outcome = "freeform"
+    else:
+        text, outcome = template_post(title=title, source=source, link=link, summary=summary), "template"
+    return PlannedPost(guid=link or title, format=format, alt_title_1=title, alt_title_2=title, post_text=text), outcome
+
+
+class WriterAgent:
+    def __init__(self, llm: LLM):
+        self.llm = llm
+        self.batch_retries = 0
+        self.outcomes = dict.fromkeys(WRITER_OUTCOMES, 0)
+
+    def write(
+        self,
+        *,
+        title: str,
+        source: str,
+        link: str,
+        summary: str,
+        format: str,
+        lang: str,
+        deadline: Deadline | None = None,
+    ) -> PlannedPost:
+        sys, user = _writer_prompt(title=title, source=source, link=link, summary=summary, format=format, lang=lang)
+        with call_context(agent="writer", format=format):
+            raw = self.llm.generate(system=sys, user=user, stop="json", schema=POST_SCHEMA, deadline=deadline)
+        post, outcome = _writer_result(raw, title=title, source=source, link=link, summary=summary, format=format)
+        self.outcomes[outcome] += 1
+        return post
+
+    def write_batch(self, *, items: list[dict], lang: str, deadline: Deadline | None = None) -> dict[str, PlannedPost]:
+        """Write posts for several items in one request, keyed by guid.
+
+        items carry guid/title/source/link/summary/format. Answers that are
+        missing, malformed or break the length rule are retried one by one.
+        """
+        if len(items) <= 1:
+            return {it["guid"]: self._write_item(it, lang, deadline) for it in items}
+
+        sys, user = _writer_batch_prompt(items=items, lang=lang)
+        with call_context(agent="writer_batch", format=",".join(sorted({it["format"] for it in items}))):
+            raw = self.llm.generate(
+                system=sys,
+                user=user,
+                stop="json",
+                max_tokens=DEFAULT_MAX_TOKENS * len(items),
+                schema=BATCH_SCHEMA,
+                deadline=deadline,
+            )
+
+        by_guid = {it["guid"]: it for it in items}
+        out: dict[str, PlannedPost] = {}
+        for value in parse_post_list(raw or ""):
+            obj, _ = normalize_post(value)
+            if obj is None:
+                continue
+            it = by_guid.get(obj.get("guid", ""))
+            post = obj["post"]
+            if not it or it["guid"] in out or len(post) > _POST_MAX_CHARS:
+                continue
+            out[it["guid"]] = _planned_post(obj, title=it["title"], link=it["link"], format=it["format"], post=post)
+            self.outcomes["valid"] += 1
+        self.batch_retries += len(items) - len(out)
+        for it in items:
+            if it["guid"] not in out:
+                out[it["guid"]] = self._write_item(it, lang, deadline)
+        return out
+
+    def _write_item(self, it: dict, lang: str, deadline: Deadline | None = None) -> PlannedPost:
+        return self.write(
+            title=it["title"],
+            source=it["source"],
+            link=it["link"],
+            summary=it["summary"],
+            format=it["format"],
+            lang=lang,
+            deadline=deadline,
+        )
+
+
+class CriticAgent:
+    def __init__(self, llm: LLM):
+        self.llm = llm
+
+    def review(self, *, post_text: str, lang: str, deadline: Deadline | None = None) -> str:
+        sys, user = _critic_prompt(post_text=post_text, lang=lang)
+        with call_context(agent="critic"):
+            out = self.llm.generate(system=sys, user=user, deadline=deadline)
+        return (out or "").strip()
+
+
+class ReviserAgent:
+    def __init__(self, llm: LLM):
+        self.llm = llm
+
+    def revise(self, *, post_text: str, critique: str, lang: str, deadline: Deadline | None = None) -> str:
+        sys, user = _reviser_prompt(post_text=post_text, critique=critique, lang=lang)
+        with call_context(agent="reviser"):
+            out = self.llm.generate(system=sys, user=user, deadline=deadline)
         return (out or post_text).strip()
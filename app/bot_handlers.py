@@ -1,11 +1,15 @@
-from aiogram import Router
+import asyncio
+
+from aiogram import Bot, Router
 from aiogram.filters import Command
 from aiogram.types import Message
 from datetime import datetime
 
-from .publisher import post_one
-from .planner import ensure_daily_queue
-from .config import load_config
+from .publisher import post_one, publish_stats, publish_targets, refill_spares_soon
+from .planner import ensure_daily_queue, use_spare
+from .config import Config, parse_hhmm
+from .http_transport import all_transport_stats
+from .llm_router import all_hedge_stats, all_router_stats
 from .storage import Storage
 
 
@@ -17,8 +21,9 @@ async def start_cmd(message: Message, storage: Storage):
     await message.answer(
         "SOARIX News Bot\n\n"
         "Команды:\n"
-        "/settarget - установить чат/канал для автопостинга\n"
+        "/settarget - установить чат/канал для автопостинга (несколько через запятую)\n"
         "/postnow - опубликовать 1 пост сейчас\n"
+        "/skip HH:MM - заменить пост слота запасным\n"
         "/status - статус\n"
     )
 
@@ -27,7 +32,7 @@ async def start_cmd(message: Message, storage: Storage):
 async def settarget_cmd(message: Message, storage: Storage):
     parts = (message.text or "").split()
     if len(parts) >= 2:
-        target = parts[1].strip()
+        target = ",".join(p.strip(",") for p in parts[1:] if p.strip(","))
     else:
         target = str(message.chat.id)
 
@@ -36,47 +41,96 @@ async def settarget_cmd(message: Message, storage: Storage):
 
 
 @router.message(Command("status"))
-async def status_cmd(message: Message, storage: Storage):
+async def status_cmd(message: Message, storage: Storage, cfg: Config):
     target = storage.get_setting("target_chat_id", "")
-    cfg = load_config()
+    pub = publish_stats()
+    outbox = storage.outbox_summary()
     day = datetime.utcnow().date().isoformat()
     q = storage.get_queue(day)
+    late = storage.get_lateness_summary()
     await message.answer(
         "Status\n"
         f"- Target: {target or '(not set)'}\n"
         f"- Items in DB: {storage.count_items()}\n"
-        f"- Planned today: {len(q)} / {cfg.posts_per_day}\n"
+        f"- Planned today: {len(q)} / {cfg.max_posts_per_day}\n"
+        f"- Planner: {cfg.planner_mode}\n"
+        f"- Slot lateness (7d): avg={late['avg_seconds']}s max={late['max_seconds']}s\n"
+        f"- Publish: sends={pub['sends']} p50={pub['p50_ms']}ms p95={pub['p95_ms']}ms one-off bots={pub['bots_created']}\n"
+        f"- Outbox: pending={outbox.get('pending', 0)} failed={outbox.get('failed', 0)} unknown={outbox.get('unknown', 0)} "
+        f"retries={pub['retries']} rate_limited={pub['rate_limited']}\n"
+        + "".join(
+            f"- Target {t['chat_id']} (7d): sent={t['sent']} pending={t['pending']} failed={t['failed']} "
+            f"avg={t['avg_publish_ms']}ms\n"
+            for t in storage.outbox_target_stats()
+        )
+        + "".join(
+            f"- LLM {t['backend']}: req={t['requests']} fail={t['failures']} retries={t['retries']} "
+            f"p50={t['p50_ms']}ms p95={t['p95_ms']}ms ttft={t['ttft_p50_ms']}ms reused={t['connections_reused']}/{t['connections_opened']}\n"
+            for t in all_transport_stats()
+        )
+        + "".join(
+            f"- Route {name}: {r['state']} ewma={r['ewma_ms']}ms errors={r['errors']}/{r['calls']}\n"
+            for name, r in all_router_stats().items()
+        )
+        + "".join(
+            f"- Hedging: fired={h['fired']}/{h['requests']} won={h['won']} over_budget={h['denied']}\n"
+            for h in all_hedge_stats()
+            if h["requests"]
+        )
     )
 
 
 @router.message(Command("metrics"))
-async def metrics_cmd(message: Message, storage: Storage):
-    cfg = load_config()
-    chat_id = storage.get_setting("target_chat_id", "").strip() or cfg.target_chat_id
-    if not chat_id:
+async def metrics_cmd(message: Message, storage: Storage, cfg: Config):
+    targets = publish_targets(storage, cfg)
+    if not targets:
         await message.answer("Target chat id not set")
         return
-    rows = storage.get_latest_metrics(chat_id=str(chat_id), limit=10)
-    if not rows:
+    lines = []
+    for chat_id in targets:
+        rows = storage.get_latest_metrics(chat_id=chat_id, limit=10)
+        if not rows:
+            continue
+        lines.append(f"Latest metrics ({chat_id}):")
+        for r in rows[:10]:
+            lines.append(
+                f"- msg {r['message_id']}: views={r['views']} forwards={r['forwards']} replies={r['replies']} at {r['captured_at']}"
+            )
+    if not lines:
         await message.answer("No metrics yet. Run telethon collector.")
         return
-    lines = ["Latest metrics:"]
-    for r in rows[:10]:
-        lines.append(
-            f"- msg {r['message_id']}: views={r['views']} forwards={r['forwards']} replies={r['replies']} at {r['captured_at']}"
-        )
     await message.answer("\n".join(lines))
 
 
 @router.message(Command("postnow"))
-async def postnow_cmd(message: Message, storage: Storage):
-    target = storage.get_setting("target_chat_id", "") or str(message.chat.id)
-    ok, info = await post_one(storage=storage, target_chat_id=target)
+async def postnow_cmd(message: Message, storage: Storage, cfg: Config, bot: Bot):
+    targets = publish_targets(storage, cfg) or [str(message.chat.id)]
+    ok, info = await post_one(storage=storage, targets=targets, cfg=cfg, bot=bot)
     await message.answer("Posted" if ok else f"Nothing posted: {info}")
 
 
 @router.message(Command("plan"))
-async def plan_cmd(message: Message, storage: Storage):
-    cfg = load_config()
-    ok, info = ensure_daily_queue(storage=storage, cfg=cfg)
+async def plan_cmd(message: Message, storage: Storage, cfg: Config):
+    ok, info = await asyncio.to_thread(ensure_daily_queue, storage=storage, cfg=cfg)
     await message.answer(f"Planned: {ok}. {info}")
+
+
+@router.message(Command("skip"))
+async def skip_cmd(message: Message, storage: Storage, cfg: Config):
+    parts = (message.text or "").split()
+    slots = cfg.post_times[: cfg.max_posts_per_day]
+    slot = parse_hhmm(parts[1]) if len(parts) > 1 else None
+    if slot not in slots:
+        await message.answer(f"Usage: /skip HH:MM (slots: {', '.join(slots)})")
+        return
+    day = datetime.utcnow().date().isoformat()
+    q = storage.get_queue_slot(day, slot)
+    if q and q.get("status") == "posted":
+        await message.answer(f"Slot {slot} already posted")
+        return
+    q = use_spare(storage=storage, day=day, slot=slot)
+    if not q:
+        await message.answer("No spare posts available")
+        return
+    refill_spares_soon(storage=storage, cfg=cfg)
+    await message.answer(f"Slot {slot} now uses a spare: {q['guid']}")
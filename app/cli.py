@@ -1,10 +1,16 @@
 import argparse
+import dataclasses
 from datetime import datetime
 
 from .config import load_config
+from .engagement import load_weights
+from .llm_stub import StubOptions, create_stub_server, start_stub_server
+from .loadtest import run_load_test
 from .news import fetch_feeds
 from .planner import ensure_daily_queue
 from .storage import Storage
+from .post_lint import review_gate_stats
+from .structured_output import writer_output_stats
 
 
 def main():
@@ -14,9 +20,81 @@ def main():
     sub.add_parser("fetch")
     sub.add_parser("plan")
     sub.add_parser("queue")
+    sub.add_parser("engagement")
+    llmstats = sub.add_parser("llmstats")
+    llmstats.add_argument("--by", choices=Storage.LLM_CALL_GROUPS, default="day")
+    llmstats.add_argument("--days", type=int, default=7)
+
+    def stub_args(parser):
+        parser.add_argument("--latency", default="lognormal:300:0.6", help="fixed:MS, uniform:LO:HI or lognormal:MEDIAN:SIGMA")
+        parser.add_argument("--error-rate", type=float, default=0.0)
+        parser.add_argument("--error-status", type=int, default=503)
+        parser.add_argument("--chunk-delay-ms", type=float, default=0.0)
+
+    llmstub = sub.add_parser("llmstub")
+    llmstub.add_argument("--host", default="127.0.0.1")
+    llmstub.add_argument("--port", type=int, default=11435)
+    stub_args(llmstub)
+
+    loadtest = sub.add_parser("loadtest")
+    loadtest.add_argument("--days", type=int, default=7)
+    loadtest.add_argument("--channels", type=int, default=4)
+    loadtest.add_argument("--base-url", default="", help="an already running stub; default starts one in-process")
+    loadtest.add_argument("--stream", action="store_true")
+    loadtest.add_argument("--review", action="store_true")
+    loadtest.add_argument("--hedge", action="store_true")
+    stub_args(loadtest)
 
     args = p.parse_args()
     cfg = load_config()
+
+    if args.cmd in ("llmstub", "loadtest"):
+        options = StubOptions(
+            latency=args.latency,
+            error_rate=args.error_rate,
+            error_status=args.error_status,
+            chunk_delay_ms=args.chunk_delay_ms,
+        )
+
+    if args.cmd == "llmstub":
+        server = create_stub_server(host=args.host, port=args.port, options=options)
+        print(f"llm stub on http://{args.host}:{args.port} (OLLAMA_BASE_URL / OPENAI_BASE_URL=.../v1)")
+        server.serve_forever()
+        return
+
+    if args.cmd == "loadtest":
+        base_url = args.base_url.rstrip("/")
+        server = None
+        if not base_url:
+            server, base_url = start_stub_server(options=options)
+        try:
+            cfg = dataclasses.replace(
+                cfg,
+                llm_stream=args.stream or cfg.llm_stream,
+                enable_review=args.review,
+                llm_hedge=args.hedge or cfg.llm_hedge,
+            )
+            report = run_load_test(cfg, base_url=base_url, days=args.days, channels=args.channels)
+        finally:
+            if server is not None:
+                server.shutdown()
+        for key, value in report.items():
+            if key == "transports":
+                for t in value:
+                    print(
+                        f"- transport {t['backend']}: requests={t['requests']} failures={t['failures']} "
+                        f"retries={t['retries']} p50={t['p50_ms']}ms p95={t['p95_ms']}ms"
+                    )
+            elif key == "hedging":
+                for h in value:
+                    print(f"- hedging: fired={h['fired']}/{h['requests']} won={h['won']} over_budget={h['denied']}")
+            elif key == "failures":
+                for f in value:
+                    print(f"- failed {f}")
+            else:
+                print(f"{key}={value}")
+        return
+
     storage = Storage(cfg.db_path)
 
     if args.cmd == "fetch":
@@ -37,6 +115,27 @@ def main():
             print(f"- {row['slot']} {row['status']} {row['format']} {row['guid']}")
         return
 
+    if args.cmd == "engagement":
+        weights = load_weights(storage)
+        for row in storage.list_engagement_stats():
+            posts = float(row["posts"] or 0.0)
+            mean = float(row["views"] or 0.0) / posts if posts else 0.0
+            w = weights.sources.get(row["key"]) if row["kind"] == "source" else weights.buckets.get(row["key"])
+            print(f"- {row['kind']}={row['key']} posts={posts:.1f} mean_views={mean:.0f} weight={w}")
+        return
+
+    if args.cmd == "llmstats":
+        writer = writer_output_stats(storage)
+        print(" ".join(f"writer_{k}={v}" for k, v in writer.items()))
+        print(" ".join(f"review_{k}={v}" for k, v in review_gate_stats(storage).items()))
+        for row in storage.get_llm_call_rollup(by=args.by, days=args.days):
+            print(
+                f"- {args.by}={row[args.by]} calls={row['calls']} ok={row['ok']} cache_hits={row['cache_hits']} "
+                f"tokens={row['prompt_tokens']}+{row['completion_tokens']} "
+                f"avg={row['avg_latency_ms']}ms max={row['max_latency_ms']}ms total={row['total_seconds']}s"
+            )
+        return
+
 
 if __name__ == "__main__":
     main()
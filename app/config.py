@@ -1,3 +1,4 @@
+import math
 import os
 from dataclasses import dataclass
 
@@ -49,6 +50,59 @@ class Config:
     telethon_session: str
     collect_interval_seconds: int
     metrics_recent_limit: int
+    engagement_half_life_days: float = 14.0
+    # Per-message metric sampling: fresh or fast-growing posts every min seconds,
+    # older posts less often, down to once per max seconds
+    metrics_min_sample_seconds: int = 120
+    metrics_max_sample_seconds: int = 86400
+    # Posts older than this are no longer sampled
+    metrics_max_age_days: int = 30
+
+    # Planner (daily | lookahead)
+    planner_mode: str = "daily"
+    plan_lead_minutes: int = 30
+    plan_buffer_slots: int = 2
+    spare_pool_size: int = 2
+    writer_batch_size: int = 1
+    # Upper bound on one planning run; each slot must also be ready before its post time
+    plan_run_budget_seconds: int = 600
+
+    # Outbox: attempts per post before giving up, and the retry backoff
+    outbox_max_attempts: int = 6
+    outbox_backoff_seconds: int = 10
+    outbox_backoff_max_seconds: int = 900
+    # Send pacing: bot-wide (Telegram allows ~30 msg/s) and per target chat
+    publish_rate_per_second: int = 25
+    publish_chat_rate_per_minute: int = 20
+
+    # Skip critic/reviser for drafts that pass the local format linter
+    review_lint_gate: bool = True
+
+    # LLM transport
+    llm_connect_timeout_seconds: float = 3.0
+    llm_max_retries: int = 1
+    llm_max_concurrency: int = 4
+    llm_stream: bool = False
+    llm_stream_max_chars: int = 2000
+    llm_breaker_failures: int = 3
+    llm_breaker_open_seconds: int = 60
+    llm_structured_output: str = "schema"
+    # Hedged requests: past this percentile of observed latency, race a second request
+    llm_hedge: bool = False
+    llm_hedge_percentile: int = 95
+    llm_hedge_budget_percent: int = 10
+    # Any OpenAI-compatible endpoint (a proxy, or the local stub for load tests)
+    openai_base_url: str = "https://api.openai.com/v1"
+
+    # Ollama model residency (keep_alive empty = server default; warm-up lead 0 = off)
+    ollama_keep_alive: str = "30m"
+    ollama_warmup_lead_minutes: int = 5
+    ollama_warmup_timeout_seconds: int = 180
+
+    # LLM generation cache (ttl 0 disables it)
+    llm_cache_ttl_hours: int = 72
+    llm_cache_max_entries: int = 2000
+    llm_cache_max_mb: int = 16
 
 
 def _split_csv(value: str) -> list[str]:
@@ -62,19 +116,30 @@ def _safe_int(value: str, default: int) -> int:
         return default
 
 
+def _safe_float(value: str, default: float) -> float:
+    try:
+        out = float(value)
+    except (TypeError, ValueError):
+        return default
+    return out if math.isfinite(out) else default
+
+
+def parse_hhmm(raw: str) -> str | None:
+    """A time of day as zero-padded "HH:MM" ("9:05" -> "09:05"), or None if it isn't one."""
+    parts = (raw or "").strip().split(":")
+    if len(parts) != 2:
+        return None
+    hh, mm = parts
+    if not (hh.isdigit() and mm.isdigit()):
+        return None
+    h, m = int(hh), int(mm)
+    if 0 <= h <= 23 and 0 <= m <= 59:
+        return f"{h:02d}:{m:02d}"
+    return None
+
+
 def _validate_hhmm(values: list[str]) -> list[str]:
-    out: list[str] = []
-    for raw in values:
-        parts = raw.split(":")
-        if len(parts) != 2:
-            continue
-        hh, mm = parts
-        if not (hh.isdigit() and mm.isdigit()):
-            continue
-        h, m = int(hh), int(mm)
-        if 0 <= h <= 23 and 0 <= m <= 59:
-            out.append(f"{h:02d}:{m:02d}")
-    return out
+    return [t for t in map(parse_hhmm, values) if t]
 
 
 def load_config() -> Config:
@@ -99,6 +164,13 @@ def load_config() -> Config:
     if not rss_feeds:
         rss_feeds = DEFAULT_RSS_FEEDS
 
+    planner_mode = os.getenv("PLANNER_MODE", "daily").strip().lower()
+    if planner_mode not in ("daily", "lookahead"):
+        planner_mode = "daily"
+    structured_output = os.getenv("LLM_STRUCTURED_OUTPUT", "schema").strip().lower()
+    if structured_output not in ("schema", "json", "off"):
+        structured_output = "schema"
+
     return Config(
         telegram_bot_token=token,
         app_mode=app_mode,
@@ -122,4 +194,38 @@ def load_config() -> Config:
         telethon_session=os.getenv("TELETHON_SESSION", "soarix_telethon").strip() or "soarix_telethon",
         collect_interval_seconds=_safe_int(os.getenv("COLLECT_INTERVAL_SECONDS", "600"), 600),
         metrics_recent_limit=_safe_int(os.getenv("METRICS_RECENT_LIMIT", "30"), 30),
+        engagement_half_life_days=max(1.0, _safe_float(os.getenv("ENGAGEMENT_HALF_LIFE_DAYS", "14"), 14.0)),
+        metrics_min_sample_seconds=max(60, _safe_int(os.getenv("METRICS_MIN_SAMPLE_SECONDS", "120"), 120)),
+        metrics_max_sample_seconds=max(600, _safe_int(os.getenv("METRICS_MAX_SAMPLE_SECONDS", "86400"), 86400)),
+        metrics_max_age_days=max(1, _safe_int(os.getenv("METRICS_MAX_AGE_DAYS", "30"), 30)),
+        planner_mode=planner_mode,
+        plan_lead_minutes=max(1, _safe_int(os.getenv("PLAN_LEAD_MINUTES", "30"), 30)),
+        plan_buffer_slots=max(1, _safe_int(os.getenv("PLAN_BUFFER_SLOTS", "2"), 2)),
+        spare_pool_size=max(0, _safe_int(os.getenv("SPARE_POOL_SIZE", "2"), 2)),
+        plan_run_budget_seconds=max(30, _safe_int(os.getenv("PLAN_RUN_BUDGET_SECONDS", "600"), 600)),
+        writer_batch_size=min(6, max(1, _safe_int(os.getenv("WRITER_BATCH_SIZE", "1"), 1))),
+        outbox_max_attempts=max(1, _safe_int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"), 6)),
+        outbox_backoff_seconds=max(1, _safe_int(os.getenv("OUTBOX_BACKOFF_SECONDS", "10"), 10)),
+        outbox_backoff_max_seconds=max(1, _safe_int(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "900"), 900)),
+        publish_rate_per_second=min(30, max(1, _safe_int(os.getenv("PUBLISH_RATE_PER_SECOND", "25"), 25))),
+        publish_chat_rate_per_minute=max(1, _safe_int(os.getenv("PUBLISH_CHAT_RATE_PER_MINUTE", "20"), 20)),
+        review_lint_gate=os.getenv("REVIEW_LINT_GATE", "1").strip() not in ("0", "false", "False"),
+        llm_connect_timeout_seconds=max(1, _safe_int(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "3"), 3)),
+        llm_max_retries=max(0, _safe_int(os.getenv("LLM_MAX_RETRIES", "1"), 1)),
+        llm_max_concurrency=max(1, _safe_int(os.getenv("LLM_MAX_CONCURRENCY", "4"), 4)),
+        llm_stream=os.getenv("LLM_STREAM", "0").strip() in ("1", "true", "True"),
+        llm_stream_max_chars=max(200, _safe_int(os.getenv("LLM_STREAM_MAX_CHARS", "2000"), 2000)),
+        llm_breaker_failures=max(1, _safe_int(os.getenv("LLM_BREAKER_FAILURES", "3"), 3)),
+        llm_breaker_open_seconds=max(5, _safe_int(os.getenv("LLM_BREAKER_OPEN_SECONDS", "60"), 60)),
+        llm_structured_output=structured_output,
+        llm_hedge=os.getenv("LLM_HEDGE", "0").strip() in ("1", "true", "True"),
+        llm_hedge_percentile=min(99, max(50, _safe_int(os.getenv("LLM_HEDGE_PERCENTILE", "95"), 95))),
+        llm_hedge_budget_percent=min(100, max(0, _safe_int(os.getenv("LLM_HEDGE_BUDGET_PERCENT", "10"), 10))),
+        openai_base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").strip().rstrip("/"),
+        ollama_keep_alive=os.getenv("OLLAMA_KEEP_ALIVE", "30m").strip(),
+        ollama_warmup_lead_minutes=max(0, _safe_int(os.getenv("OLLAMA_WARMUP_LEAD_MINUTES", "5"), 5)),
+        ollama_warmup_timeout_seconds=max(10, _safe_int(os.getenv("OLLAMA_WARMUP_TIMEOUT_SECONDS", "180"), 180)),
+        llm_cache_ttl_hours=max(0, _safe_int(os.getenv("LLM_CACHE_TTL_HOURS", "72"), 72)),
+        llm_cache_max_entries=max(1, _safe_int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"), 2000)),
+        llm_cache_max_mb=max(1, _safe_int(os.getenv("LLM_CACHE_MAX_MB", "16"), 16)),
     )
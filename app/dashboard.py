@@ -2,18 +2,22 @@ from __future__ import annotations
 
 import asyncio
 import json
-import threading
 import urllib.parse
 from html import escape
 from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 from .config import Config
-from .publisher import post_one
+from .jobs import JobRunner
+from .llm_cache import cache_stats
+from .publisher import post_one, publish_targets
 from .storage import Storage
+from .post_lint import review_gate_stats
+from .structured_output import writer_output_stats
 
 
-_POST_NOW_LOCK = threading.Lock()
+# Dashboard actions run in the background; the request only enqueues them.
+_JOB_WORKERS = 2
 
 
 def _render_html(cfg: Config, storage: Storage) -> str:
@@ -35,6 +39,26 @@ def _render_html(cfg: Config, storage: Storage) -> str:
     )
 
     post_times = ", ".join(cfg.post_times[: cfg.max_posts_per_day])
+    late = metrics["slot_lateness"]
+    cache = cache_stats(storage)
+    writer = writer_output_stats(storage)
+    gate = review_gate_stats(storage)
+    outbox = storage.outbox_summary()
+    target_lines = "".join(
+        f"<br/>{escape(str(t['chat_id']))}: sent {t['sent']} / failed {t['failed']}, avg {t['avg_publish_ms']}ms"
+        for t in storage.outbox_target_stats()
+    )
+    llm_rows = "".join(
+        "<tr>"
+        f"<td>{escape(str(row['agent']))}</td>"
+        f"<td>{row['calls']}</td>"
+        f"<td>{row['cache_hits']}</td>"
+        f"<td>{row['prompt_tokens']} / {row['completion_tokens']}</td>"
+        f"<td>{row['avg_latency_ms']}</td>"
+        f"<td>{row['total_seconds']}</td>"
+        "</tr>"
+        for row in storage.get_llm_call_rollup(by="agent")
+    )
 
     return f"""<!doctype html>
 <html>
@@ -61,6 +85,11 @@ def _render_html(cfg: Config, storage: Storage) -> str:
     <div class='card'><b>Posts last 24h</b><br/>{metrics['posts_last_24h']}</div>
     <div class='card'><b>Timezone</b><br/>{escape(cfg.timezone)}</div>
     <div class='card'><b>Post times</b><br/>{escape(post_times)}</div>
+    <div class='card'><b>Slot lateness (7d)</b><br/>avg {late['avg_seconds']}s / max {late['max_seconds']}s, publish avg {late['avg_publish_ms']}ms</div>
+    <div class='card'><b>LLM cache</b><br/>hits {cache['hits']} / misses {cache['misses']}, saved {cache['saved_seconds']}s</div>
+    <div class='card'><b>Writer JSON</b><br/>valid {writer['valid']} / repaired {writer['repaired']}, fallback rate {writer['fallback_rate']:.1%}</div>
+    <div class='card'><b>Review gate</b><br/>lint clean {gate['lint_clean']} / flagged {gate['lint_flagged']}, LLM calls saved {gate['llm_calls_saved']}, skipped for deadline: critique {gate['skipped_critique']} / revise {gate['skipped_revise']}</div>
+    <div class='card'><b>Outbox</b><br/>sent {outbox.get('sent', 0)} / pending {outbox.get('pending', 0)} / failed {outbox.get('failed', 0)} / unknown {outbox.get('unknown', 0)}{target_lines}</div>
   </div>
 
   <h3>Управление</h3>
@@ -78,6 +107,12 @@ def _render_html(cfg: Config, storage: Storage) -> str:
     <tbody>{top_sources_rows}</tbody>
   </table>
 
+  <h3>LLM calls by agent (7d)</h3>
+  <table>
+    <thead><tr><th>Agent</th><th>Calls</th><th>Cache hits</th><th>Tokens in / out</th><th>Avg ms</th><th>Total s</th></tr></thead>
+    <tbody>{llm_rows}</tbody>
+  </table>
+
   <h3>Recent posts</h3>
   <table>
     <thead><tr><th>Posted</th><th>Source</th><th>Title</th><th>Link</th></tr></thead>
@@ -88,13 +123,25 @@ def _render_html(cfg: Config, storage: Storage) -> str:
 """
 
 
+def _post_now_job(cfg: Config, storage: Storage, targets: list[str]):
+    def run(report) -> dict:
+        ok, info = asyncio.run(post_one(storage=storage, targets=targets, cfg=cfg, progress=report))
+        return {"ok": ok, "info": info}
+
+    return run
+
+
 def create_dashboard_server(*, cfg: Config, storage: Storage, host: str, port: int) -> ThreadingHTTPServer:
+    jobs = JobRunner(max_workers=_JOB_WORKERS)
+
     class Handler(BaseHTTPRequestHandler):
-        def _send_json(self, payload: dict, status: int = 200):
+        def _send_json(self, payload: dict, status: int = 200, headers: dict | None = None):
             body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
             self.send_response(status)
             self.send_header("Content-Type", "application/json; charset=utf-8")
             self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
             self.end_headers()
             self.wfile.write(body)
 
@@ -116,6 +163,28 @@ def create_dashboard_server(*, cfg: Config, storage: Storage, host: str, port: i
             if self.path == "/api/metrics":
                 self._send_json(storage.get_metrics_summary())
                 return
+            if self.path == "/api/llm-cache":
+                self._send_json(cache_stats(storage))
+                return
+            url = urllib.parse.urlparse(self.path)
+            if url.path == "/api/llm-calls":
+                query = urllib.parse.parse_qs(url.query)
+                by = (query.get("by") or ["day"])[0]
+                if by not in Storage.LLM_CALL_GROUPS:
+                    self._send_json({"error": f"by must be one of {', '.join(Storage.LLM_CALL_GROUPS)}"}, status=400)
+                    return
+                self._send_json({"by": by, "rows": storage.get_llm_call_rollup(by=by)})
+                return
+            if url.path == "/api/jobs":
+                self._send_json({"jobs": [job.to_dict() for job in jobs.recent()]})
+                return
+            if url.path.startswith("/api/jobs/"):
+                job = jobs.get(url.path.removeprefix("/api/jobs/"))
+                if job is None:
+                    self._send_json({"error": "job not found"}, status=404)
+                    return
+                self._send_json(job.to_dict())
+                return
 
             self._send_json({"error": "not found"}, status=404)
 
@@ -134,19 +203,17 @@ def create_dashboard_server(*, cfg: Config, storage: Storage, host: str, port: i
                 return
 
             if self.path == "/post-now":
-                if not _POST_NOW_LOCK.acquire(blocking=False):
-                    self._send_json({"ok": False, "error": "publish already in progress"}, status=409)
+                targets = publish_targets(storage, cfg)
+                if not targets:
+                    self._send_json({"ok": False, "error": "target_chat_id not set"}, status=400)
                     return
-                try:
-                    target = storage.get_setting("target_chat_id", "") or cfg.target_chat_id
-                    if not target:
-                        self._send_json({"ok": False, "error": "target_chat_id not set"}, status=400)
-                        return
-
-                    ok, info = asyncio.run(post_one(storage=storage, target_chat_id=str(target)))
-                    self._send_json({"ok": ok, "info": info})
-                finally:
-                    _POST_NOW_LOCK.release()
+                # One manual publish at a time: a second click gets the running job back.
+                job, created = jobs.submit("post_now", _post_now_job(cfg, storage, targets), key="post_now")
+                self._send_json(
+                    {"ok": True, "job_id": job.id, "status": job.status, "created": created},
+                    status=HTTPStatus.ACCEPTED,
+                    headers={"Location": f"/api/jobs/{job.id}"},
+                )
                 return
 
             self._send_json({"error": "not found"}, status=404)
@@ -154,7 +221,9 @@ def create_dashboard_server(*, cfg: Config, storage: Storage, host: str, port: i
         def log_message(self, format: str, *args):  # noqa: A003
             return
 
-    return ThreadingHTTPServer((host, port), Handler)
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.jobs = jobs
+    return server
 
 
 def run_dashboard(cfg: Config, *, host: str = "0.0.0.0", port: int | None = None):
@@ -167,4 +236,5 @@ def run_dashboard(cfg: Config, *, host: str = "0.0.0.0", port: int | None = None
     try:
         server.serve_forever()
     finally:
+        server.jobs.shutdown()
         server.server_close()
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import time
+
+
+class Deadline:
+    """A point in time (monotonic clock) by which a piece of work must be done.
+
+    Passed from the planner through the agents down to the HTTP transport,
+    so every step can size its timeout from the time that is left.
+    """
+
+    __slots__ = ("at",)
+
+    def __init__(self, at: float):
+        self.at = float(at)
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        return cls(time.monotonic() + max(0.0, float(seconds)))
+
+    def remaining(self) -> float:
+        return max(0.0, self.at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def cap(self, seconds: float) -> float:
+        """seconds, shortened to what is left."""
+        return min(float(seconds), self.remaining())
+
+    def earliest(self, other: "Deadline | None") -> "Deadline":
+        return self if other is None or self.at <= other.at else other
+
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.1f}s)"
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from .news import bucket_topic
+from .storage import Storage
+
+
+# Pseudo-posts at the channel mean mixed into every key, so a single lucky
+# post doesn't swing a source's weight.
+_PRIOR_POSTS = 3.0
+# Score points per doubling of decayed mean views over the channel mean.
+_POINTS_PER_DOUBLING = 3.0
+_MAX_POINTS = 6
+
+
+def _parse_ts(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def decay_factor(dt_seconds: float, half_life_seconds: float) -> float:
+    if dt_seconds <= 0 or half_life_seconds <= 0:
+        return 1.0
+    return 0.5 ** (dt_seconds / half_life_seconds)
+
+
+class EngagementAggregator:
+    """Keeps exponentially decayed per-source and per-bucket engagement sums.
+
+    Each snapshot only adds the views/forwards gained since the previous
+    snapshot of the same post, so the metrics table is never rescanned.
+    """
+
+    def __init__(self, storage: Storage, *, half_life_days: float = 14.0):
+        self.storage = storage
+        self.half_life_seconds = float(half_life_days) * 86400.0
+
+    def observe(self, *, chat_id: str, message_id: int, captured_at: str, views: int, forwards: int) -> bool:
+        prev = self.storage.get_post_engagement(chat_id=chat_id, message_id=message_id)
+        if prev:
+            source, bucket = prev["source"], prev["bucket"]
+            d_views = max(0, int(views) - int(prev["views"] or 0))
+            d_forwards = max(0, int(forwards) - int(prev["forwards"] or 0))
+            new_post = 0
+            if not d_views and not d_forwards:
+                return False
+        else:
+            # Only our own posts can be attributed to a source and bucket.
+            guid = self.storage.get_queue_guid_by_message_id(message_id, chat_id=chat_id)
+            item = self.storage.get_item(guid) if guid else None
+            if not item:
+                return False
+            source = item.get("source") or "unknown"
+            bucket = bucket_topic(title=item.get("title", ""), summary=item.get("summary", ""))
+            d_views, d_forwards, new_post = max(0, int(views)), max(0, int(forwards)), 1
+
+        stats = [
+            self._fold(kind, key, captured_at, new_post, d_views, d_forwards)
+            for kind, key in (("source", source), ("bucket", bucket))
+        ]
+        self.storage.save_engagement(
+            post={
+                "chat_id": chat_id,
+                "message_id": message_id,
+                "source": source,
+                "bucket": bucket,
+                "views": max(int(views), int(prev["views"] or 0) if prev else 0),
+                "forwards": max(int(forwards), int(prev["forwards"] or 0) if prev else 0),
+                "updated_at": captured_at,
+            },
+            stats=stats,
+        )
+        return True
+
+    def _fold(self, kind: str, key: str, captured_at: str, posts: int, views: int, forwards: int) -> dict:
+        cur = self.storage.get_engagement_stat(kind, key) or {"posts": 0.0, "views": 0.0, "forwards": 0.0}
+        now, then = _parse_ts(captured_at), _parse_ts(cur.get("updated_at"))
+        f = decay_factor((now - then).total_seconds(), self.half_life_seconds) if now and then else 1.0
+        return {
+            "kind": kind,
+            "key": key,
+            "posts": float(cur["posts"] or 0.0) * f + posts,
+            "views": float(cur["views"] or 0.0) * f + views,
+            "forwards": float(cur["forwards"] or 0.0) * f + forwards,
+            "updated_at": captured_at,
+        }
+
+
+@dataclass
+class EngagementWeights:
+    """Score points per source/bucket, relative to the channel's mean views."""
+
+    sources: dict[str, int] = field(default_factory=dict)
+    buckets: dict[str, int] = field(default_factory=dict)
+
+    def source(self, name: str) -> int | None:
+        return self.sources.get(name or "")
+
+    def bucket(self, name: str) -> int:
+        return self.buckets.get(name or "", 0)
+
+
+def load_weights(storage: Storage) -> EngagementWeights:
+    rows = storage.list_engagement_stats()
+    out = EngagementWeights()
+    for kind, target in (("source", out.sources), ("bucket", out.buckets)):
+        kind_rows = [r for r in rows if r["kind"] == kind]
+        total_posts = sum(float(r["posts"] or 0.0) for r in kind_rows)
+        total_views = sum(float(r["views"] or 0.0) for r in kind_rows)
+        if total_posts <= 0 or total_views <= 0:
+            continue
+        mean = total_views / total_posts
+        for r in kind_rows:
+            shrunk = (float(r["views"] or 0.0) + _PRIOR_POSTS * mean) / (float(r["posts"] or 0.0) + _PRIOR_POSTS)
+            points = round(_POINTS_PER_DOUBLING * math.log2(max(shrunk, 1e-9) / mean))
+            target[r["key"]] = max(-_MAX_POINTS, min(_MAX_POINTS, points))
+    return out
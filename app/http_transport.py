@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .deadline import Deadline
+
+
+# Statuses worth another attempt; everything else is returned to the caller.
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+def _retry_after_seconds(value: str | None) -> float | None:
+    if not value:
+        return None
+    value = value.strip()
+    if value.replace(".", "", 1).isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class Transport:
+    """Keep-alive HTTP session for one LLM backend.
+
+    Bounds in-flight requests, retries connect errors and 429/5xx answers
+    with jittered exponential backoff (honouring Retry-After) and keeps
+    latency and connection-reuse counters.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 15.0,
+        max_concurrency: int = 4,
+        max_retries: int = 1,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        max_retry_after: float = 30.0,
+    ):
+        self.name = name
+        self.connect_timeout = float(connect_timeout)
+        self.read_timeout = float(read_timeout)
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+        self.max_retry_after = float(max_retry_after)
+
+        self.session = requests.Session()
+        self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, int(max_concurrency)), max_retries=0)
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+        self._slots = threading.BoundedSemaphore(max(1, int(max_concurrency)))
+
+        self._lock = threading.Lock()
+        self._latencies: deque[float] = deque(maxlen=200)
+        self._ttfts: deque[float] = deque(maxlen=200)
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+
+    def _backoff(self, attempt: int, retry_after: float | None) -> float | None:
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_retry_after else None
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2**attempt)))
+
+    def post(
+        self,
+        url: str,
+        *,
+        json: dict,
+        headers: dict | None = None,
+        stream: bool = False,
+        deadline: Deadline | None = None,
+    ) -> requests.Response | None:
+        """POST with retries; returns the final response or None on a network failure.
+
+        With a deadline, timeouts shrink to the time left and no retry is
+        started that could not finish before it.
+        """
+        attempt = 0
+        while True:
+            # Waiting for a free slot counts against the deadline too.
+            if not self._slots.acquire(timeout=deadline.remaining() if deadline is not None else None):
+                return None
+            connect_timeout, read_timeout = self.connect_timeout, self.read_timeout
+            if deadline is not None:
+                connect_timeout, read_timeout = deadline.cap(connect_timeout), deadline.cap(read_timeout)
+            t0 = time.perf_counter()
+            resp = None
+            retry_after = None
+            try:
+                if deadline is not None and deadline.expired():
+                    return None
+                resp = self.session.post(
+                    url,
+                    json=json,
+                    headers=headers,
+                    stream=stream,
+                    timeout=(connect_timeout, read_timeout),
+                )
+            except requests.exceptions.ReadTimeout:
+                # The backend accepted the request but is slow; a retry only doubles the wait.
+                self._record(time.perf_counter() - t0, ok=False)
+                return None
+            except requests.exceptions.RequestException:
+                self._record(time.perf_counter() - t0, ok=False)
+            else:
+                ok = resp.status_code < 400
+                self._record(time.perf_counter() - t0, ok=ok)
+                if resp.status_code not in RETRY_STATUSES:
+                    return resp
+                retry_after = _retry_after_seconds(resp.headers.get("Retry-After"))
+            finally:
+                self._slots.release()
+
+            delay = self._backoff(attempt, retry_after)
+            if attempt >= self.max_retries or delay is None:
+                return resp
+            if deadline is not None and delay >= deadline.remaining():
+                return resp
+            if resp is not None:
+                resp.close()
+            with self._lock:
+                self.retries += 1
+            attempt += 1
+            time.sleep(delay)
+
+    def _record(self, seconds: float, *, ok: bool):
+        with self._lock:
+            self.requests += 1
+            if not ok:
+                self.failures += 1
+            self._latencies.append(seconds)
+
+    def record_ttft(self, seconds: float):
+        """Time to first streamed token, measured by the caller reading the body."""
+        with self._lock:
+            self._ttfts.append(seconds)
+
+    def stats(self) -> dict:
+        opened = served = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            opened += int(getattr(pool, "num_connections", 0))
+            served += int(getattr(pool, "num_requests", 0))
+        with self._lock:
+            lat = sorted(self._latencies)
+            ttft = sorted(self._ttfts)
+            requests_, failures, retries = self.requests, self.failures, self.retries
+
+        def pct(values: list[float], p: float) -> float:
+            return round(values[min(len(values) - 1, int(p * len(values)))] * 1000, 1) if values else 0.0
+
+        return {
+            "backend": self.name,
+            "requests": requests_,
+            "failures": failures,
+            "retries": retries,
+            "p50_ms": pct(lat, 0.5),
+            "p95_ms": pct(lat, 0.95),
+            "ttft_p50_ms": pct(ttft, 0.5),
+            "connections_opened": opened,
+            "connections_reused": max(0, served - opened),
+        }
+
+
+_TRANSPORTS: dict[tuple, Transport] = {}
+_TRANSPORTS_LOCK = threading.Lock()
+
+
+def get_transport(name: str, **options) -> Transport:
+    """Process-wide transport per backend, so pools outlive individual LLM objects."""
+    key = (name, tuple(sorted(options.items())))
+    with _TRANSPORTS_LOCK:
+        t = _TRANSPORTS.get(key)
+        if t is None:
+            t = _TRANSPORTS[key] = Transport(name, **options)
+        return t
+
+
+def all_transport_stats() -> list[dict]:
+    with _TRANSPORTS_LOCK:
+        transports = list(_TRANSPORTS.values())
+    return [t.stats() for t in transports]
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Callable
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    # queued -> running -> done | failed
+    status: str = "queued"
+    progress: str = ""
+    result: dict | None = None
+    error: str = ""
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class JobRunner:
+    """Runs slow dashboard actions on a small thread pool.
+
+    submit() returns at once with a Job the caller can poll by id. A job with
+    the same key that is still queued or running is returned instead of
+    starting a second one. Finished jobs are kept in memory, newest `keep`.
+    """
+
+    def __init__(self, *, max_workers: int = 2, keep: int = 100):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dashboard-job")
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._active: dict[str, str] = {}  # key -> job id
+        self._lock = threading.Lock()
+        self.keep = int(keep)
+
+    def submit(self, kind: str, fn: Callable[[Callable[[str], None]], dict], *, key: str | None = None) -> tuple[Job, bool]:
+        """Queue fn(report); returns (job, created). fn's return value becomes job.result."""
+        with self._lock:
+            if key and key in self._active:
+                return self._jobs[self._active[key]], False
+            job = Job(id=uuid.uuid4().hex[:12], kind=kind)
+            self._jobs[job.id] = job
+            if key:
+                self._active[key] = job.id
+            while len(self._jobs) > self.keep:
+                oldest = next(iter(self._jobs.values()))
+                if oldest.status in ("queued", "running"):
+                    break
+                self._jobs.popitem(last=False)
+        self._pool.submit(self._run, job, fn, key)
+        return job, True
+
+    def _run(self, job: Job, fn, key: str | None):
+        def report(progress: str):
+            job.progress = progress
+
+        job.status, job.started_at = "running", time.time()
+        try:
+            job.result = fn(report)
+            job.status = "done"
+        except Exception as e:  # reported through the job, not the server
+            job.error, job.status = str(e) or type(e).__name__, "failed"
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if key and self._active.get(key) == job.id:
+                    del self._active[key]
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def recent(self, limit: int = 20) -> list[Job]:
+        with self._lock:
+            return list(reversed(self._jobs.values()))[:limit]
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
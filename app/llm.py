@@ -1,12 +1,186 @@
+import asyncio
 import json
 import re
-import requests
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+from .deadline import Deadline
+from .http_transport import get_transport
+from .llm_accounting import CallRecorder, call_context, current_tags
+from .llm_cache import GenerationCache
+from .llm_router import BackendRouter, HedgeBudget, get_hedge_budget, get_router
+
+
+# Completion cap for a single post; batch calls ask for a multiple of it.
+DEFAULT_MAX_TOKENS = 650
+
+# A call that ends with less than this left on its deadline was cut short by
+# the deadline (capped timeout or slot wait), not by the backend.
+_DEADLINE_SLACK_SECONDS = 0.05
+
+# What to ask OpenAI for instead when a model rejects the response_format
+# (gpt-3.5-turbo has no json_schema; some compatible servers have neither).
+_OPENAI_FORMAT_FALLBACK = {"schema": "json", "json": "off"}
+
+
+
+class _HedgePool:
+    """Threads for hedged requests, shared by all LLM objects.
+
+    A losing blocking request can't be interrupted and keeps its worker until
+    its HTTP timeout. Callers therefore reserve both workers of a race up front,
+    and when the pool is taken up by such stragglers they skip hedging and call
+    the backend directly instead of queueing behind them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool: ThreadPoolExecutor | None = None
+        self.size = 0
+        self.busy = 0
+
+    def reserve(self, n: int, *, size: int) -> bool:
+        with self._lock:
+            if size > self.size:
+                # Grow to the largest concurrency seen; running tasks finish on the old pool.
+                if self._pool is not None:
+                    self._pool.shutdown(wait=False)
+                self._pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix="llm-hedge")
+                self.size = size
+            if self.busy + n > self.size:
+                return False
+            self.busy += n
+            return True
+
+    def release(self, n: int = 1):
+        with self._lock:
+            self.busy -= n
+
+    def submit(self, fn, *args):
+        """Run fn on a worker reserved earlier; the worker is released when fn returns."""
+
+        def run():
+            try:
+                return fn(*args)
+            finally:
+                self.release()
+
+        return self._pool.submit(run)
+
+
+_HEDGE_POOL = _HedgePool()
+
+
+class _Cancelled(Exception):
+    """Raised inside a streaming read when the other hedged request already won."""
 
 
 def _strip(s: str) -> str:
     return (s or "").strip()
 
 
+@dataclass
+class Completion:
+    """One backend answer; token counts and load_ms are None when the backend didn't report them.
+
+    truncated: a streamed answer cut off at stream_max_chars; returned but never cached.
+    """
+
+    text: str
+    backend: str = ""
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    cached: bool = False
+    load_ms: float | None = None
+    truncated: bool = False
+
+
+def template_post(*, title: str, source: str, link: str, summary: str) -> str:
+    """Post built without any LLM call; the last resort when generation fails."""
+    safe_summary = re.sub(r"\s+", " ", (summary or "")).strip()
+    if len(safe_summary) > 280:
+        safe_summary = safe_summary[:280].rstrip() + "…"
+    return (
+        f"{title}\n\n"
+        f"- Источник: {source}\n"
+        f"- Коротко: {safe_summary or '(данных мало)'}\n\n"
+        f"{link}\n"
+        "#ai #llm #agents"
+    )
+
+
+class JsonObjectTracker:
+    """Incrementally finds where the first top-level JSON object or array closes."""
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, chunk: str) -> int | None:
+        """Return the offset just past the closing brace inside chunk, if reached."""
+        for i, ch in enumerate(chunk):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"' and self.started:
+                self.in_string = True
+            elif ch in "{[":
+                self.depth += 1
+                self.started = True
+            elif ch in "}]" and self.started:
+                self.depth -= 1
+                if self.depth == 0:
+                    return i + 1
+        return None
+
+
+def _ollama_usage(data: dict) -> dict:
+    load = data.get("load_duration")
+    return {
+        "prompt_tokens": data.get("prompt_eval_count"),
+        "completion_tokens": data.get("eval_count"),
+        "load_ms": load / 1e6 if load is not None else None,
+    }
+
+
+def _openai_usage(data: dict) -> dict:
+    usage = data.get("usage") or {}
+    return {"prompt_tokens": usage.get("prompt_tokens"), "completion_tokens": usage.get("completion_tokens")}
+
+
+def _ollama_chunks(r, meta: dict):
+    for line in r.iter_lines():
+        if not line:
+            continue
+        data = json.loads(line)
+        yield data.get("response", "")
+        if data.get("done"):
+            meta.update(_ollama_usage(data))
+            return
+
+
+def _openai_chunks(r, meta: dict):
+    for line in r.iter_lines():
+        if not line or not line.startswith(b"data:"):
+            continue
+        body = line[5:].strip()
+        if body == b"[DONE]":
+            return
+        data = json.loads(body)
+        if data.get("usage"):
+            meta.update(_openai_usage(data))
+        choices = data.get("choices") or [{}]
+        yield (choices[0].get("delta") or {}).get("content") or ""
+
+
 class LLM:
     def __init__(
         self,
@@ -17,6 +191,19 @@ class LLM:
         openai_model: str,
         timeout_seconds: int = 15,
         prefer_ollama: bool = True,
+        connect_timeout_seconds: float = 3.0,
+        max_retries: int = 1,
+        max_concurrency: int = 4,
+        cache: GenerationCache | None = None,
+        stream: bool = False,
+        stream_max_chars: int = 2000,
+        router: BackendRouter | None = None,
+        recorder: CallRecorder | None = None,
+        structured_output: str = "schema",
+        keep_alive: str = "",
+        openai_base_url: str = "https://api.openai.com/v1",
+        hedge_percentile: float | None = None,
+        hedge_budget: HedgeBudget | None = None,
     ):
         self.ollama_base_url = _strip(ollama_base_url).rstrip("/")
         self.ollama_model = _strip(ollama_model)
@@ -24,8 +211,243 @@ class LLM:
         self.openai_model = _strip(openai_model) or "gpt-3.5-turbo"
         self.timeout_seconds = int(timeout_seconds)
         self.prefer_ollama = bool(prefer_ollama)
+        self.connect_timeout_seconds = float(connect_timeout_seconds)
+        self.max_retries = int(max_retries)
+        self.max_concurrency = int(max_concurrency)
+        self.cache = cache
+        self.stream = bool(stream)
+        self.stream_max_chars = int(stream_max_chars)
+        self.router = router or get_router()
+        self.recorder = recorder
+        self.structured_output = _strip(structured_output).lower() or "off"
+        # Set once the OpenAI model has rejected structured_output; see _OPENAI_FORMAT_FALLBACK.
+        self._openai_structured: str | None = None
+        self.keep_alive = _strip(keep_alive)
+        self.openai_base_url = _strip(openai_base_url).rstrip("/")
+        self.hedge_percentile = hedge_percentile
+        self.hedge_budget = hedge_budget or (get_hedge_budget(0.1) if hedge_percentile else None)
+        self._local = threading.local()
+
+    @classmethod
+    def from_config(cls, cfg, *, storage=None) -> "LLM":
+        cache = None
+        if storage is not None and cfg.llm_cache_ttl_hours > 0:
+            cache = GenerationCache(
+                storage,
+                ttl_seconds=cfg.llm_cache_ttl_hours * 3600,
+                max_entries=cfg.llm_cache_max_entries,
+                max_bytes=cfg.llm_cache_max_mb << 20,
+            )
+        return cls(
+            ollama_base_url=cfg.ollama_base_url,
+            ollama_model=cfg.ollama_model,
+            openai_api_key=cfg.openai_api_key,
+            openai_model=cfg.openai_model,
+            timeout_seconds=cfg.llm_timeout_seconds,
+            prefer_ollama=cfg.prefer_ollama,
+            connect_timeout_seconds=cfg.llm_connect_timeout_seconds,
+            max_retries=cfg.llm_max_retries,
+            max_concurrency=cfg.llm_max_concurrency,
+            cache=cache,
+            stream=cfg.llm_stream,
+            stream_max_chars=cfg.llm_stream_max_chars,
+            router=get_router(failure_threshold=cfg.llm_breaker_failures, open_seconds=cfg.llm_breaker_open_seconds),
+            recorder=CallRecorder(storage) if storage is not None else None,
+            structured_output=cfg.llm_structured_output,
+            keep_alive=cfg.ollama_keep_alive,
+            openai_base_url=cfg.openai_base_url,
+            hedge_percentile=cfg.llm_hedge_percentile / 100 if cfg.llm_hedge else None,
+            hedge_budget=get_hedge_budget(cfg.llm_hedge_budget_percent / 100) if cfg.llm_hedge else None,
+        )
+
+    def _transport(self, backend: str):
+        return get_transport(
+            backend,
+            connect_timeout=self.connect_timeout_seconds,
+            read_timeout=self.timeout_seconds,
+            max_concurrency=self.max_concurrency,
+            max_retries=self.max_retries,
+        )
+
+    def transport_stats(self) -> dict[str, dict]:
+        return {name: self._transport(name).stats() for name in ("ollama", "openai")}
+
+    def generate(
+        self,
+        *,
+        system: str,
+        user: str,
+        stop: str | None = None,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        schema: dict | None = None,
+        deadline: Deadline | None = None,
+    ) -> str | None:
+        """Ask backends in router order (preferred first unless broken or much slower); None if all fail.
+
+        stop="json" lets a streaming call hang up once the first JSON value closes;
+        max_tokens caps OpenAI output and scales the streaming length budget;
+        schema asks the backend for JSON of that shape (see structured_output);
+        deadline bounds every attempt, and nothing is sent once it has passed.
+        """
+        kw = {"stop": stop, "max_tokens": max_tokens, "schema": schema, "deadline": deadline}
+        calls = {
+            "ollama": lambda: self._ollama_complete(system=system, prompt=user, **kw),
+            "openai": lambda: self._openai_complete(system=system, user=user, **kw),
+        }
+        t0 = time.perf_counter()
+        order = self.router.order(self.backends()) if deadline is None or not deadline.expired() else []
+        if self.hedge_percentile and order:
+            result, tried = self._hedged(order, calls)
+        else:
+            result, tried = self._in_order(order, calls)
+        if self.recorder is not None:
+            self.recorder.record(
+                completion=result,
+                tried=tried,
+                prompt_chars=len(system) + len(user),
+                latency_ms=(time.perf_counter() - t0) * 1000,
+                cache_enabled=self.cache is not None,
+                deadline_expired=deadline is not None and deadline.expired(),
+            )
+        return result.text if result else None
+
+    def _in_order(self, order: list[str], calls: dict, tried: list[str] | None = None) -> tuple[Completion | None, list[str]]:
+        tried = tried if tried is not None else []
+        for backend in order:
+            tried.append(backend)
+            result = calls[backend]()
+            if result:
+                return result, tried
+        return None, tried
+
+    def _hedged(self, order: list[str], calls: dict) -> tuple[Completion | None, list[str]]:
+        """Start the primary; past its latency percentile, race a second request against it.
+
+        The hedge goes to the next backend, or to the same one if it's the
+        only backend. The first non-empty answer wins and the other request
+        is told to stop: a streaming read hangs up at its next chunk, a
+        blocking one finishes in the background and is ignored.
+        """
+        primary = order[0]
+        self.hedge_budget.note_request()
+        delay = self.router.latency_percentile(primary, self.hedge_percentile)
+        # Two workers per concurrent call (primary and backup), and as many again for stragglers.
+        if delay is None or not _HEDGE_POOL.reserve(2, size=4 * max(1, self.max_concurrency)):
+            return self._in_order(order, calls)
+
+        cancel = threading.Event()
+        first = _HEDGE_POOL.submit(self._cancellable, calls[primary], cancel)
+        done, _ = wait([first], timeout=delay)
+        if not done and self.hedge_budget.try_acquire():
+            backup = order[1] if len(order) > 1 else primary
+            second = _HEDGE_POOL.submit(self._cancellable, calls[backup], cancel)
+            pending = {first, second}
+            try:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        result = fut.result()
+                        if result:
+                            if fut is second:
+                                self.hedge_budget.note_win()
+                                return result, [primary, backup]
+                            return result, [primary]
+            finally:
+                cancel.set()
+            return None, [primary, backup]
+
+        _HEDGE_POOL.release()  # the backup's worker wasn't needed
+        result = first.result()
+        if result:
+            return result, [primary]
+        return self._in_order(order[1:], calls, tried=[primary])
+
+    def _cancellable(self, call, cancel: threading.Event) -> Completion | None:
+        self._local.cancel = cancel
+        try:
+            return call()
+        finally:
+            self._local.cancel = None
+
+    def _cancelled(self) -> bool:
+        cancel = getattr(self._local, "cancel", None)
+        return cancel is not None and cancel.is_set()
+
+    def expected_call_seconds(self) -> float:
+        """Typical duration of one call, for deciding whether another one fits in a deadline."""
+        for backend in self.backends():
+            ewma = self.router.ewma(backend)
+            if ewma is not None:
+                return ewma
+        return float(self.timeout_seconds)
+
+    def backends(self) -> list[str]:
+        """Configured backends in preference order."""
+        out = []
+        if self.ollama_base_url and self.ollama_model:
+            out.append("ollama")
+        if self.openai_api_key:
+            out.append("openai")
+        return out if self.prefer_ollama else out[::-1]
 
-    def rewrite_news(self, *, title: str, source: str, link: str, summary: str, lang: str = "ru") -> str:
+    def _keep_alive(self) -> dict:
+        if not self.keep_alive:
+            return {}
+        # Ollama takes a duration string ("30m") or seconds (-1 keeps the model loaded).
+        value = self.keep_alive
+        return {"keep_alive": int(value) if value.lstrip("-").isdigit() else value}
+
+    def warm_up(self, *, timeout_seconds: float) -> Completion | None:
+        """Load the Ollama model with an empty prompt so the next real call starts warm.
+
+        Uses its own long read timeout; the answer is recorded as a "warmup"
+        call so its load time shows up next to cold and warm generations.
+        """
+        if not self.ollama_base_url or not self.ollama_model:
+            return None
+        transport = get_transport(
+            "ollama_warmup",
+            connect_timeout=self.connect_timeout_seconds,
+            read_timeout=timeout_seconds,
+            max_concurrency=1,
+            max_retries=0,
+        )
+        payload = {"model": self.ollama_model, "prompt": "", "stream": False, **self._keep_alive()}
+        t0 = time.perf_counter()
+        out = None
+        try:
+            r = transport.post(f"{self.ollama_base_url}/api/generate", json=payload)
+            if r is not None and r.status_code == 200:
+                out = Completion(text="", backend="ollama", **_ollama_usage(r.json()))
+        except Exception:
+            out = None
+        if self.recorder is not None:
+            with call_context(agent="warmup"):
+                self.recorder.record(
+                    completion=out,
+                    tried=["ollama"],
+                    prompt_chars=0,
+                    latency_ms=(time.perf_counter() - t0) * 1000,
+                    cache_enabled=False,
+                )
+        return out
+
+    def _ollama_format(self, schema: dict | None) -> dict:
+        if schema is None or self.structured_output == "off":
+            return {}
+        return {"format": schema if self.structured_output == "schema" else "json"}
+
+    def _openai_format(self, schema: dict | None, mode: str | None = None) -> dict:
+        mode = mode or self._openai_structured or self.structured_output
+        if schema is None or mode == "off":
+            return {}
+        if mode == "schema":
+            return {"response_format": {"type": "json_schema", "json_schema": {"name": "answer", "schema": schema, "strict": True}}}
+        return {"response_format": {"type": "json_object"}}
+
+    def rewrite_news(
+        self, *, title: str, source: str, link: str, summary: str, lang: str = "ru", deadline: Deadline | None = None
+    ) -> str:
         sys = (
             "Ты редактор Telegram-канала про AI (агенты, LLM, автоматизация). "
             "Перепиши новость в виде короткого поста."
@@ -46,68 +468,274 @@ class LLM:
 - Не выдумывай факты. Если данных мало - так и скажи.
 """
 
-        if self.prefer_ollama:
-            ollama = self._ollama_generate(system=sys, prompt=user)
-            if ollama:
-                return ollama
-            openai = self._openai_chat(system=sys, user=user)
-            if openai:
-                return openai
-        else:
-            openai = self._openai_chat(system=sys, user=user)
-            if openai:
-                return openai
-            ollama = self._ollama_generate(system=sys, prompt=user)
-            if ollama:
-                return ollama
-
-        safe_summary = re.sub(r"\s+", " ", (summary or "")).strip()
-        if len(safe_summary) > 280:
-            safe_summary = safe_summary[:280].rstrip() + "…"
-        return (
-            f"{title}\n\n"
-            f"- Источник: {source}\n"
-            f"- Коротко: {safe_summary or '(данных мало)'}\n\n"
-            f"{link}\n"
-            "#ai #llm #agents"
-        )
+        with call_context(agent=current_tags().get("agent") or "rewrite"):
+            out = self.generate(system=sys, user=user, deadline=deadline)
+        if out:
+            return out
+        return template_post(title=title, source=source, link=link, summary=summary)
 
-    def _ollama_generate(self, *, system: str, prompt: str) -> str | None:
-        if not self.ollama_base_url or not self.ollama_model:
+    def _cached(
+        self,
+        *,
+        backend: str,
+        model: str,
+        system: str,
+        user: str,
+        params: dict,
+        call,
+        deadline: Deadline | None = None,
+    ) -> Completion | None:
+        key = None
+        if self.cache is not None:
+            key = GenerationCache.key(backend=backend, model=model, system=system, user=user, params=params)
+            hit = self.cache.get(key)
+            if hit is not None:
+                return Completion(text=hit, backend=backend, cached=True)
+        t0 = time.perf_counter()
+        out = call()
+        elapsed = time.perf_counter() - t0
+        if out is None and self._cancelled():
+            # Lost a hedge race; that says nothing about the backend's health.
             return None
-        try:
-            payload = {"model": self.ollama_model, "prompt": f"{system}\n\n{prompt}", "stream": False}
-            r = requests.post(f"{self.ollama_base_url}/api/generate", json=payload, timeout=self.timeout_seconds)
-            if r.status_code != 200:
-                return None
-            data = r.json()
-            return _strip(data.get("response", "")) or None
-        except Exception:
+        if out is None and deadline is not None and deadline.remaining() <= _DEADLINE_SLACK_SECONDS:
+            # Our slot ran out (or nothing was sent at all); neither says the backend is unhealthy.
+            return None
+        # Only real backend round-trips feed the router; cache hits would skew the EWMA.
+        self.router.record(backend, ok=bool(out), seconds=elapsed)
+        if out and key is not None and not out.truncated:
+            self.cache.put(key, backend=backend, model=model, response=out.text, latency_ms=elapsed * 1000)
+        return out
+
+    def _stream_max_chars(self, max_tokens: int) -> int:
+        return self.stream_max_chars * max(1, max_tokens) // DEFAULT_MAX_TOKENS
+
+    def _stream_params(self, stop: str | None, max_tokens: int) -> dict:
+        if not self.stream:
+            return {}
+        return {"stream": True, "stop": stop, "max_chars": self._stream_max_chars(max_tokens)}
+
+    def _ollama_generate(self, *, system: str, prompt: str, **kwargs) -> str | None:
+        out = self._ollama_complete(system=system, prompt=prompt, **kwargs)
+        return out.text if out else None
+
+    def _openai_chat(self, *, system: str, user: str, **kwargs) -> str | None:
+        out = self._openai_complete(system=system, user=user, **kwargs)
+        return out.text if out else None
+
+    def _ollama_complete(
+        self,
+        *,
+        system: str,
+        prompt: str,
+        stop: str | None = None,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        schema: dict | None = None,
+        deadline: Deadline | None = None,
+    ) -> Completion | None:
+        if not self.ollama_base_url or not self.ollama_model:
             return None
+        return self._cached(
+            backend="ollama",
+            model=self.ollama_model,
+            system=system,
+            user=prompt,
+            params={"stream": False, **self._stream_params(stop, max_tokens), **self._ollama_format(schema)},
+            call=lambda: self._ollama_request(
+                system=system, prompt=prompt, stop=stop, max_tokens=max_tokens, schema=schema, deadline=deadline
+            ),
+            deadline=deadline,
+        )
 
-    def _openai_chat(self, *, system: str, user: str) -> str | None:
+    def _openai_complete(
+        self,
+        *,
+        system: str,
+        user: str,
+        stop: str | None = None,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        schema: dict | None = None,
+        deadline: Deadline | None = None,
+    ) -> Completion | None:
         if not self.openai_api_key:
             return None
+        return self._cached(
+            backend="openai",
+            model=self.openai_model,
+            system=system,
+            user=user,
+            params={
+                "temperature": 0.5,
+                "max_tokens": max_tokens,
+                **self._stream_params(stop, max_tokens),
+                **self._openai_format(schema),
+            },
+            call=lambda: self._openai_request(
+                system=system, user=user, stop=stop, max_tokens=max_tokens, schema=schema, deadline=deadline
+            ),
+            deadline=deadline,
+        )
+
+    def _read_stream(
+        self, backend: str, r, chunks, stop: str | None, max_chars: int, meta: dict, deadline: Deadline | None = None
+    ) -> str:
+        """Collect streamed text, hanging up once the answer is complete, over budget or out of time."""
+        t0 = time.perf_counter()
+        tracker = JsonObjectTracker() if stop == "json" else None
+        parts: list[str] = []
+        size = 0
+        first = True
+        try:
+            for chunk in chunks(r, meta):
+                if self._cancelled():
+                    raise _Cancelled()
+                if not chunk:
+                    continue
+                if first:
+                    self._transport(backend).record_ttft(time.perf_counter() - t0)
+                    first = False
+                if tracker is not None:
+                    end = tracker.feed(chunk)
+                    if end is not None:
+                        parts.append(chunk[:end])
+                        break
+                parts.append(chunk)
+                size += len(chunk)
+                if size >= max_chars:
+                    # Hanging up here also skips Ollama's final chunk, so load_ms stays unknown.
+                    meta["truncated"] = True
+                    break
+                if deadline is not None and deadline.expired():
+                    # Same as a read timeout: a cut-off answer must not be used or cached.
+                    raise TimeoutError("deadline passed mid-stream")
+        finally:
+            # Closing mid-stream drops the connection, which stops generation server-side.
+            r.close()
+        return "".join(parts)
+
+    def _ollama_request(
+        self,
+        *,
+        system: str,
+        prompt: str,
+        stop: str | None = None,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        schema: dict | None = None,
+        deadline: Deadline | None = None,
+    ) -> Completion | None:
         try:
-            headers = {"Authorization": f"Bearer {self.openai_api_key}", "Content-Type": "application/json"}
             payload = {
-                "model": self.openai_model,
-                "messages": [
-                    {"role": "system", "content": system},
-                    {"role": "user", "content": user},
-                ],
-                "temperature": 0.5,
-                "max_tokens": 650,
+                "model": self.ollama_model,
+                "prompt": f"{system}\n\n{prompt}",
+                "stream": self.stream,
+                **self._ollama_format(schema),
+                **self._keep_alive(),
             }
-            r = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=self.timeout_seconds,
+            r = self._transport("ollama").post(
+                f"{self.ollama_base_url}/api/generate", json=payload, stream=self.stream, deadline=deadline
             )
-            if r.status_code != 200:
+            if r is None or r.status_code != 200:
                 return None
-            data = r.json()
-            return _strip(data["choices"][0]["message"]["content"]) or None
+            if self.stream:
+                meta: dict = {}
+                text = _strip(
+                    self._read_stream("ollama", r, _ollama_chunks, stop, self._stream_max_chars(max_tokens), meta, deadline)
+                )
+            else:
+                data = r.json()
+                text, meta = _strip(data.get("response", "")), _ollama_usage(data)
+            return Completion(text=text, backend="ollama", **meta) if text else None
         except Exception:
             return None
+
+    def _openai_request(
+        self,
+        *,
+        system: str,
+        user: str,
+        stop: str | None = None,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        schema: dict | None = None,
+        deadline: Deadline | None = None,
+    ) -> Completion | None:
+        try:
+            headers = {"Authorization": f"Bearer {self.openai_api_key}", "Content-Type": "application/json"}
+            mode = self._openai_structured or self.structured_output
+            while True:
+                payload = {
+                    "model": self.openai_model,
+                    "messages": [
+                        {"role": "system", "content": system},
+                        {"role": "user", "content": user},
+                    ],
+                    "temperature": 0.5,
+                    "max_tokens": int(max_tokens),
+                    **self._openai_format(schema, mode),
+                }
+                if self.stream:
+                    payload["stream"] = True
+                    payload["stream_options"] = {"include_usage": True}
+                r = self._transport("openai").post(
+                    f"{self.openai_base_url}/chat/completions",
+                    headers=headers,
+                    json=payload,
+                    stream=self.stream,
+                    deadline=deadline,
+                )
+                if not (r is not None and r.status_code == 400 and "response_format" in payload):
+                    break
+                if "response_format" not in r.text and "json_schema" not in r.text:
+                    break
+                # The model doesn't support this response_format: ask for the next weaker one
+                # and keep using that for later calls.
+                r.close()
+                mode = self._openai_structured = _OPENAI_FORMAT_FALLBACK.get(mode, "off")
+            if r is None or r.status_code != 200:
+                return None
+            if self.stream:
+                meta: dict = {}
+                text = _strip(
+                    self._read_stream("openai", r, _openai_chunks, stop, self._stream_max_chars(max_tokens), meta, deadline)
+                )
+            else:
+                data = r.json()
+                text, meta = _strip(data["choices"][0]["message"]["content"]), _openai_usage(data)
+            return Completion(text=text, backend="openai", **meta) if text else None
+        except Exception:
+            return None
+
+
+class AsyncLLM:
+    """Awaitable facade over LLM for code running on the event loop.
+
+    Backend calls run in worker threads (the pooled transports bound how many
+    at once), so aiogram polling and APScheduler keep running meanwhile.
+    Fallback order and the template fallback are exactly those of LLM.
+    """
+
+    def __init__(self, llm: LLM):
+        self.llm = llm
+
+    @property
+    def prefer_ollama(self) -> bool:
+        return self.llm.prefer_ollama
+
+    async def generate(
+        self,
+        *,
+        system: str,
+        user: str,
+        stop: str | None = None,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        schema: dict | None = None,
+        deadline: Deadline | None = None,
+    ) -> str | None:
+        return await asyncio.to_thread(
+            self.llm.generate, system=system, user=user, stop=stop, max_tokens=max_tokens, schema=schema, deadline=deadline
+        )
+
+    async def rewrite_news(
+        self, *, title: str, source: str, link: str, summary: str, lang: str = "ru", deadline: Deadline | None = None
+    ) -> str:
+        return await asyncio.to_thread(
+            self.llm.rewrite_news, title=title, source=source, link=link, summary=summary, lang=lang, deadline=deadline
+        )
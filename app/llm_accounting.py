@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING
+
+from .storage import Storage
+
+if TYPE_CHECKING:
+    from .llm import Completion
+
+
+_CONTEXT: ContextVar[dict] = ContextVar("llm_call_context", default={})
+
+
+@contextmanager
+def call_context(**tags):
+    """Tag LLM calls made inside the block (agent, format) for accounting."""
+    token = _CONTEXT.set({**_CONTEXT.get(), **tags})
+    try:
+        yield
+    finally:
+        _CONTEXT.reset(token)
+
+
+def current_tags() -> dict:
+    return dict(_CONTEXT.get())
+
+
+# Ollama reports how long it spent loading the model; above this the call was cold.
+COLD_LOAD_MS = 1000.0
+
+
+def model_load_state(completion: Completion | None) -> str:
+    if completion is None or completion.load_ms is None:
+        return ""
+    return "cold" if completion.load_ms >= COLD_LOAD_MS else "warm"
+
+
+def estimate_tokens(chars: int) -> int:
+    # Rough average for mixed Russian/English text.
+    return max(1, round(chars / 4)) if chars else 0
+
+
+class CallRecorder:
+    """Writes one llm_calls row per LLM.generate call."""
+
+    def __init__(self, storage: Storage):
+        self.storage = storage
+
+    def record(
+        self,
+        *,
+        completion: Completion | None,
+        tried: list[str],
+        prompt_chars: int,
+        latency_ms: float,
+        cache_enabled: bool,
+        deadline_expired: bool = False,
+    ):
+        ctx = _CONTEXT.get()
+        prompt_tokens = completion.prompt_tokens if completion else None
+        completion_tokens = completion.completion_tokens if completion else None
+        estimated = prompt_tokens is None or (completion is not None and completion_tokens is None)
+        if prompt_tokens is None:
+            prompt_tokens = estimate_tokens(prompt_chars)
+        if completion_tokens is None:
+            completion_tokens = estimate_tokens(len(completion.text)) if completion else 0
+
+        if not cache_enabled:
+            cache_status = "off"
+        else:
+            cache_status = "hit" if completion is not None and completion.cached else "miss"
+
+        if completion is not None:
+            outcome = "ok" if len(tried) == 1 else "fallback"
+        elif deadline_expired:
+            outcome = "deadline"
+        else:
+            outcome = "failed" if tried else "no_backend"
+
+        self.storage.add_llm_call(
+            agent=ctx.get("agent") or "direct",
+            format=ctx.get("format") or "",
+            backend=completion.backend if completion else (tried[-1] if tried else ""),
+            fallback_path=">".join(tried),
+            prompt_tokens=int(prompt_tokens),
+            completion_tokens=int(completion_tokens),
+            tokens_estimated=estimated,
+            latency_ms=float(latency_ms),
+            cache_status=cache_status,
+            outcome=outcome,
+            model_load=model_load_state(completion),
+        )
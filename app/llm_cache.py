@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+
+from .storage import Storage
+
+
+class GenerationCache:
+    """SQLite-backed cache of LLM completions keyed by a hash of the full request.
+
+    Entries expire after ttl_seconds; beyond max_entries/max_bytes the least
+    recently used ones are evicted. Hits, misses and the backend latency the
+    hits avoided are kept in the counters table under "llm_cache.".
+    """
+
+    def __init__(self, storage: Storage, *, ttl_seconds: float, max_entries: int = 2000, max_bytes: int = 16 << 20):
+        self.storage = storage
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+
+    @staticmethod
+    def key(*, backend: str, model: str, system: str, user: str, params: dict | None = None) -> str:
+        raw = json.dumps([backend, model, system, user, params or {}], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        hit = self.storage.cache_get(key, min_created_at=now - self.ttl_seconds, now=now)
+        if hit is None:
+            self.storage.incr_counters({"llm_cache.misses": 1})
+            return None
+        self.storage.incr_counters({"llm_cache.hits": 1, "llm_cache.saved_ms": hit["latency_ms"]})
+        return hit["response"]
+
+    def put(self, key: str, *, backend: str, model: str, response: str, latency_ms: float):
+        now = time.time()
+        self.storage.cache_put(key=key, backend=backend, model=model, response=response, latency_ms=latency_ms, now=now)
+        evicted = self.storage.cache_evict(
+            min_created_at=now - self.ttl_seconds,
+            max_entries=self.max_entries,
+            max_bytes=self.max_bytes,
+        )
+        if evicted:
+            self.storage.incr_counters({"llm_cache.evicted": evicted})
+
+    def stats(self) -> dict:
+        return cache_stats(self.storage)
+
+
+def cache_stats(storage: Storage) -> dict:
+    c = storage.get_counters("llm_cache.")
+    hits, misses = int(c.get("llm_cache.hits", 0)), int(c.get("llm_cache.misses", 0))
+    return {
+        **storage.cache_summary(),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+        "saved_seconds": round(c.get("llm_cache.saved_ms", 0.0) / 1000.0, 1),
+        "evicted": int(c.get("llm_cache.evicted", 0)),
+    }
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+
+@dataclass
+class _BackendState:
+    ewma: float | None = None
+    failures: int = 0
+    open_until: float = 0.0
+    probing: bool = False
+    calls: int = 0
+    errors: int = 0
+    latencies: deque = field(default_factory=lambda: deque(maxlen=200))
+
+
+class BackendRouter:
+    """Orders LLM backends by health and observed latency.
+
+    Each backend has an EWMA of successful call latency and a circuit
+    breaker: after failure_threshold consecutive failures it is skipped for
+    open_seconds, then a single probe call decides whether it closes again.
+    The caller's preferred backend stays first unless it is broken or more
+    than slow_factor times slower than the alternative.
+    """
+
+    def __init__(self, *, alpha: float = 0.3, failure_threshold: int = 3, open_seconds: float = 60.0, slow_factor: float = 2.0):
+        self.alpha = float(alpha)
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.open_seconds = float(open_seconds)
+        self.slow_factor = float(slow_factor)
+        self._lock = threading.Lock()
+        self._state: dict[str, _BackendState] = {}
+
+    def _get(self, backend: str) -> _BackendState:
+        st = self._state.get(backend)
+        if st is None:
+            st = self._state[backend] = _BackendState()
+        return st
+
+    def order(self, preferred: list[str]) -> list[str]:
+        """Backends to try, best first; broken ones are left out unless a probe is due."""
+        now = time.monotonic()
+        out: list[str] = []
+        with self._lock:
+            for b in preferred:
+                st = self._get(b)
+                if st.open_until <= 0:
+                    out.append(b)
+                elif st.open_until <= now:
+                    # Hand the probe to this caller only; if it never gets used
+                    # (an earlier backend answered) another one is due later.
+                    st.open_until = now + self.open_seconds
+                    st.probing = True
+                    out.append(b)
+            if len(out) >= 2:
+                first, second = self._state[out[0]].ewma, self._state[out[1]].ewma
+                if first is not None and second is not None and first > second * self.slow_factor:
+                    out[0], out[1] = out[1], out[0]
+        return out
+
+    def record(self, backend: str, *, ok: bool, seconds: float):
+        with self._lock:
+            st = self._get(backend)
+            st.calls += 1
+            was_probe, st.probing = st.probing, False
+            if ok:
+                st.latencies.append(seconds)
+                st.ewma = seconds if st.ewma is None else self.alpha * seconds + (1 - self.alpha) * st.ewma
+                st.failures = 0
+                st.open_until = 0.0
+                return
+            st.errors += 1
+            st.failures += 1
+            if was_probe or st.failures >= self.failure_threshold:
+                st.open_until = time.monotonic() + self.open_seconds
+
+    def ewma(self, backend: str) -> float | None:
+        with self._lock:
+            st = self._state.get(backend)
+            return st.ewma if st is not None else None
+
+    def latency_percentile(self, backend: str, p: float, *, min_samples: int = 20) -> float | None:
+        """Observed successful-call latency at percentile p, once there are enough samples."""
+        with self._lock:
+            values = sorted(self._get(backend).latencies)
+        if len(values) < min_samples:
+            return None
+        return values[min(len(values) - 1, int(p * len(values)))]
+
+    def snapshot(self) -> dict[str, dict]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                b: {
+                    "ewma_ms": round(st.ewma * 1000, 1) if st.ewma is not None else None,
+                    "state": "closed" if st.open_until <= 0 else ("half-open" if st.probing or st.open_until <= now else "open"),
+                    "consecutive_failures": st.failures,
+                    "calls": st.calls,
+                    "errors": st.errors,
+                }
+                for b, st in self._state.items()
+            }
+
+
+class HedgeBudget:
+    """Caps hedged (duplicate) LLM requests at a fraction of all requests."""
+
+    def __init__(self, ratio: float):
+        self.ratio = max(0.0, float(ratio))
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.fired = 0
+        self.won = 0
+        self.denied = 0
+
+    def note_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.fired + 1 > self.ratio * self.requests:
+                self.denied += 1
+                return False
+            self.fired += 1
+            return True
+
+    def note_win(self):
+        with self._lock:
+            self.won += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ratio": self.ratio,
+                "requests": self.requests,
+                "fired": self.fired,
+                "won": self.won,
+                "denied": self.denied,
+            }
+
+
+_ROUTERS: dict[tuple, BackendRouter] = {}
+_ROUTERS_LOCK = threading.Lock()
+
+
+def get_router(**options) -> BackendRouter:
+    """Process-wide router, so health survives across per-run LLM objects."""
+    key = tuple(sorted(options.items()))
+    with _ROUTERS_LOCK:
+        r = _ROUTERS.get(key)
+        if r is None:
+            r = _ROUTERS[key] = BackendRouter(**options)
+        return r
+
+
+def all_router_stats() -> dict[str, dict]:
+    with _ROUTERS_LOCK:
+        routers = list(_ROUTERS.values())
+    out: dict[str, dict] = {}
+    for r in routers:
+        out.update(r.snapshot())
+    return out
+
+
+_BUDGETS: dict[float, HedgeBudget] = {}
+
+
+def get_hedge_budget(ratio: float) -> HedgeBudget:
+    with _ROUTERS_LOCK:
+        b = _BUDGETS.get(ratio)
+        if b is None:
+            b = _BUDGETS[ratio] = HedgeBudget(ratio)
+        return b
+
+
+def all_hedge_stats() -> list[dict]:
+    with _ROUTERS_LOCK:
+        budgets = list(_BUDGETS.values())
+    return [b.stats() for b in budgets]
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+
+_GUID = re.compile(r"guid: (\S+)")
+_LINK = re.compile(r"Ссылка: (\S+)")
+
+CANNED_POST = (
+    "Заголовок новости\n\n"
+    "- Что случилось\n"
+    "- Почему это важно\n"
+    "- Что изменится\n\n"
+    "Takeaway: попробуйте на своих задачах.\n"
+    "https://example.com/news\n"
+    "#ai #llm"
+)
+CANNED_CRITIQUE = "- Сократить первый абзац\n- Уточнить источник\n- Убрать повтор в буллетах"
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """Latency sampler in seconds from "fixed:MS", "uniform:LO:HI" or "lognormal:MEDIAN:SIGMA"."""
+    kind, _, rest = (spec or "fixed:0").partition(":")
+    args = [float(x) for x in rest.split(":") if x]
+    if kind == "fixed" and len(args) == 1:
+        return lambda: args[0] / 1000
+    if kind == "uniform" and len(args) == 2:
+        return lambda: random.uniform(args[0], args[1]) / 1000
+    if kind == "lognormal" and len(args) == 2:
+        return lambda: random.lognormvariate(0.0, args[1]) * args[0] / 1000
+    raise ValueError(f"bad latency spec: {spec!r}")
+
+
+@dataclass
+class StubOptions:
+    latency: str = "fixed:0"
+    error_rate: float = 0.0
+    error_status: int = 503
+    chunk_chars: int = 40
+    chunk_delay_ms: float = 0.0
+    post: str = CANNED_POST
+    critique: str = CANNED_CRITIQUE
+
+
+@dataclass
+class StubStats:
+    requests: int = 0
+    errors: int = 0
+    streamed: int = 0
+    by_kind: dict[str, int] = field(default_factory=dict)
+
+
+def _answer(system: str, prompt: str, options: StubOptions) -> tuple[str, str]:
+    """Pick a canned answer the way the agents' prompts expect it; returns (kind, text)."""
+
+    def post(link: str | None = None) -> dict:
+        # Link the item actually given, as a well-behaved writer would.
+        text = options.post.replace("https://example.com/news", link) if link else options.post
+        return {"alt_title_1": "Заголовок 1", "alt_title_2": "Заголовок 2", "post": text}
+
+    links = _LINK.findall(prompt)
+    if '"posts"' in prompt:
+        guids = _GUID.findall(prompt)
+        posts = [{"guid": g, **post(link)} for g, link in zip(guids, links + [None] * len(guids))]
+        return "writer_batch", json.dumps({"posts": posts}, ensure_ascii=False)
+    if '"post"' in prompt:
+        return "writer", json.dumps(post(links[0] if links else None), ensure_ascii=False)
+    # Ollama gets system and user as one prompt, so look at both.
+    if "Замечания критика" in prompt:
+        return "reviser", options.post
+    if "критик" in system + prompt:
+        return "critic", options.critique
+    return "other", options.post
+
+
+def create_stub_server(*, host: str = "127.0.0.1", port: int = 0, options: StubOptions | None = None) -> ThreadingHTTPServer:
+    """Serve /api/generate (Ollama) and /v1/chat/completions (OpenAI) with canned answers.
+
+    Latency, injected errors and streaming chunking come from StubOptions;
+    GET /stats returns request counters.
+    """
+    options = options or StubOptions()
+    latency = parse_latency(options.latency)
+    stats = StubStats()
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):  # noqa: N802
+            if self.path == "/stats":
+                with lock:
+                    payload = {**stats.__dict__, "by_kind": dict(stats.by_kind)}
+                self._send(200, json.dumps(payload).encode())
+                return
+            self._send(404, b'{"error": "not found"}')
+
+        def do_POST(self):  # noqa: N802
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", "0"))) or b"{}")
+            if self.path == "/api/generate":
+                system, prompt = "", payload.get("prompt", "")
+            elif self.path == "/v1/chat/completions":
+                messages = {m["role"]: m["content"] for m in payload.get("messages", [])}
+                system, prompt = messages.get("system", ""), messages.get("user", "")
+            else:
+                self._send(404, b'{"error": "not found"}')
+                return
+
+            kind, text = _answer(system, prompt, options)
+            stream = bool(payload.get("stream"))
+            failed = random.random() < options.error_rate
+            with lock:
+                stats.requests += 1
+                stats.errors += int(failed)
+                stats.streamed += int(stream and not failed)
+                stats.by_kind[kind] = stats.by_kind.get(kind, 0) + 1
+
+            time.sleep(latency())
+            if failed:
+                self._send(options.error_status, b'{"error": "injected"}')
+                return
+            usage = {"prompt_tokens": len(system + prompt) // 4, "completion_tokens": len(text) // 4}
+            if self.path == "/api/generate":
+                self._ollama(text, usage, stream)
+            else:
+                self._openai(text, usage, stream)
+
+        def _chunks(self, text: str):
+            step = max(1, options.chunk_chars)
+            for i in range(0, len(text), step):
+                yield text[i : i + step]
+
+        def _stream(self, content_type: str, lines):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            try:
+                for line in lines:
+                    self.wfile.write(line.encode())
+                    self.wfile.flush()
+                    if options.chunk_delay_ms:
+                        time.sleep(options.chunk_delay_ms / 1000)
+            except OSError:
+                return  # client hung up early
+
+        def _ollama(self, text: str, usage: dict, stream: bool):
+            done = {"done": True, "prompt_eval_count": usage["prompt_tokens"], "eval_count": usage["completion_tokens"]}
+            if not stream:
+                self._send(200, json.dumps({"response": text, **done}, ensure_ascii=False).encode())
+                return
+            lines = (json.dumps({"response": c, "done": False}, ensure_ascii=False) + "\n" for c in self._chunks(text))
+            self._stream("application/x-ndjson", [*lines, json.dumps({"response": "", **done}) + "\n"])
+
+        def _openai(self, text: str, usage: dict, stream: bool):
+            if not stream:
+                body = {"choices": [{"message": {"role": "assistant", "content": text}}], "usage": usage}
+                self._send(200, json.dumps(body, ensure_ascii=False).encode())
+                return
+            lines = [
+                "data: " + json.dumps({"choices": [{"delta": {"content": c}}]}, ensure_ascii=False) + "\n\n"
+                for c in self._chunks(text)
+            ]
+            lines.append("data: " + json.dumps({"choices": [], "usage": usage}) + "\n\n")
+            lines.append("data: [DONE]\n\n")
+            self._stream("text/event-stream", lines)
+
+        def log_message(self, format: str, *args):  # noqa: A003
+            return
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_stub_server(**kwargs) -> tuple[ThreadingHTTPServer, str]:
+    """Start the stub on a background thread; returns (server, base_url)."""
+    server = create_stub_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import dataclasses
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from .config import Config
+from .http_transport import all_transport_stats
+from .llm_router import all_hedge_stats
+from .planner import ensure_daily_queue
+from .storage import Storage
+
+
+def _percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def stub_config(cfg: Config, *, base_url: str, db_path: str) -> Config:
+    """cfg pointed at the local stub: both backends, no feeds, no cache."""
+    return dataclasses.replace(
+        cfg,
+        db_path=db_path,
+        rss_feeds=[],
+        ollama_base_url=base_url,
+        ollama_model=cfg.ollama_model or "stub",
+        openai_api_key="stub",
+        openai_base_url=f"{base_url}/v1",
+        # Every simulated item is new, but a warm cache from an earlier run would hide LLM latency.
+        llm_cache_ttl_hours=0,
+    )
+
+
+def _seed_items(storage: Storage, *, channel: int, day: str, count: int):
+    for i in range(count):
+        guid = f"load-{channel}-{day}-{i}"
+        storage.upsert_item(
+            guid=guid,
+            source=f"source{i % 7}.example",
+            title=f"Новость {i}: агенты и LLM в {day}",
+            link=f"https://source{i % 7}.example/{guid}",
+            published=f"{day}T{i % 24:02d}:00:00",
+            summary="Компания выпустила новую модель для агентов. Детали релиза и бенчмарки.",
+        )
+
+
+def _publish_day(storage: Storage, day: str):
+    """Mark the planned slots as posted, so the next day plans from fresh items."""
+    for i, row in enumerate(storage.get_queue(day)):
+        if row["status"] != "planned":
+            continue
+        storage.mark_queue_posted(day=day, slot=row["slot"], tg_message_id=i + 1)
+        storage.mark_posted(row["guid"], "")
+
+
+def run_load_test(
+    cfg: Config,
+    *,
+    base_url: str,
+    days: int = 7,
+    channels: int = 1,
+    items_per_day: int | None = None,
+    start: date | None = None,
+    workdir: str | None = None,
+) -> dict:
+    """Run ensure_daily_queue for every (channel, day) against base_url.
+
+    Each channel has its own database and runs its days in order; channels
+    run concurrently and share the process-wide LLM transports and router,
+    as several bots in one process would.
+    """
+    start = start or date(2030, 1, 1)
+    items_per_day = items_per_day or cfg.max_posts_per_day * 3
+    tmp = None
+    if workdir is None:
+        tmp = tempfile.TemporaryDirectory()
+        workdir = tmp.name
+
+    latencies: list[float] = []
+    planned: list[int] = []
+    failures: list[str] = []
+    lock = threading.Lock()
+
+    def run_channel(channel: int):
+        storage = Storage(os.path.join(workdir, f"channel{channel}.db"))
+        ccfg = stub_config(cfg, base_url=base_url, db_path=storage.db_path)
+        for d in range(days):
+            day = (start + timedelta(days=d)).isoformat()
+            _seed_items(storage, channel=channel, day=day, count=items_per_day)
+            t0 = time.perf_counter()
+            try:
+                ensure_daily_queue(storage=storage, cfg=ccfg, day=day)
+            except Exception as e:  # keep the other runs going
+                with lock:
+                    failures.append(f"channel{channel} {day}: {e!r}")
+                continue
+            elapsed = time.perf_counter() - t0
+            rows = storage.get_queue(day)
+            _publish_day(storage, day)
+            with lock:
+                latencies.append(elapsed)
+                planned.append(len(rows))
+
+    t0 = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, channels)) as pool:
+            list(pool.map(run_channel, range(channels)))
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+    wall = time.perf_counter() - t0
+
+    posts = sum(planned)
+    return {
+        "runs": len(latencies),
+        "failed_runs": len(failures),
+        "failures": failures[:10],
+        "planned_posts": posts,
+        "wall_seconds": round(wall, 2),
+        "runs_per_second": round(len(latencies) / wall, 2) if wall else 0.0,
+        "posts_per_second": round(posts / wall, 2) if wall else 0.0,
+        "run_p50_ms": round(_percentile(latencies, 0.5) * 1000, 1),
+        "run_p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+        "run_p99_ms": round(_percentile(latencies, 0.99) * 1000, 1),
+        "run_max_ms": round(max(latencies, default=0.0) * 1000, 1),
+        "transports": all_transport_stats(),
+        "hedging": [h for h in all_hedge_stats() if h["requests"]],
+    }
@@ -1,11 +1,11 @@
 import asyncio
 
-from aiogram import Bot, Dispatcher
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
+from aiogram import Dispatcher
 
 from .bot_handlers import router
 from .config import Config
+from .planner import backfill_payloads
+from .publisher import make_bot, recover_outbox
 from .scheduler import setup_scheduler
 from .storage import Storage
 
@@ -14,15 +14,25 @@ def run_bot(cfg: Config):
     storage = Storage(cfg.db_path)
     if cfg.target_chat_id:
         storage.set_setting("target_chat_id", cfg.target_chat_id)
+    recover_outbox(storage, cfg)
+    backfill_payloads(storage)
 
     async def runner():
-        bot = Bot(token=cfg.telegram_bot_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+        # One bot client for polling and publishing, so sends reuse its warm connections.
+        bot = make_bot(cfg)
         dp = Dispatcher()
 
         dp.include_router(router)
         dp["storage"] = storage
-
-        sched = setup_scheduler(storage=storage, post_times=cfg.post_times[: cfg.max_posts_per_day], timezone=cfg.timezone)
+        dp["cfg"] = cfg
+
+        sched = setup_scheduler(
+            storage=storage,
+            post_times=cfg.post_times[: cfg.max_posts_per_day],
+            timezone=cfg.timezone,
+            cfg=cfg,
+            bot=bot,
+        )
         sched.start()
 
         await dp.start_polling(bot)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import time
+from typing import TYPE_CHECKING
 from urllib.parse import urlparse
 
 import feedparser
@@ -8,6 +9,9 @@ import feedparser
 from .feeds import KEYWORDS
 from .storage import Storage
 
+if TYPE_CHECKING:
+    from .engagement import EngagementWeights
+
 
 def _contains_keywords(text: str) -> bool:
     t = (text or "").lower()
@@ -41,8 +45,12 @@ def fetch_feeds(storage: Storage, rss_feeds: list[str]) -> int:
     return added
 
 
-def score_item(*, title: str, summary: str, source: str) -> int:
-    """Cheap heuristic score for 'top topics'."""
+def score_item(*, title: str, summary: str, source: str, weights: EngagementWeights | None = None) -> int:
+    """Cheap heuristic score for 'top topics'.
+
+    With engagement weights, learned source/bucket points replace the static
+    source table wherever the channel already has data.
+    """
     text = (title or "") + " " + (summary or "")
     t = text.lower()
     score = 0
@@ -75,14 +83,19 @@ def score_item(*, title: str, summary: str, source: str) -> int:
             score += v
 
     # Source weights
-    source_w = {
-        "OpenAI": 4,
-        "DeepMind": 3,
-        "Google AI": 3,
-        "Hugging Face": 3,
-        "Anthropic": 3,
-    }.get(source or "", 0)
-    score += source_w
+    learned = weights.source(source) if weights else None
+    if learned is not None:
+        score += learned
+    else:
+        score += {
+            "OpenAI": 4,
+            "DeepMind": 3,
+            "Google AI": 3,
+            "Hugging Face": 3,
+            "Anthropic": 3,
+        }.get(source or "", 0)
+    if weights:
+        score += weights.bucket(bucket_topic(title=title, summary=summary))
 
     # Keep within a sane range
     if score < 0:
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable
+
+
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    name: str
+    processed: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0
+    max_latency: float = 0.0
+    max_queue_depth: int = 0
+
+    @property
+    def avg_latency(self) -> float:
+        return self.busy_seconds / self.processed if self.processed else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "stage": self.name,
+            "processed": self.processed,
+            "errors": self.errors,
+            "avg_latency": round(self.avg_latency, 3),
+            "max_latency": round(self.max_latency, 3),
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+@dataclass
+class _Envelope:
+    index: int
+    value: Any
+    error: BaseException | None = None
+
+
+class StagePipeline:
+    """Push jobs through a chain of stages, one worker thread per stage.
+
+    Stages are connected by bounded queues, so job N can sit in a later
+    stage while job N+1 is still in an earlier one. A failing job is
+    carried through untouched and the first error is re-raised by run().
+    """
+
+    def __init__(self, stages: list[tuple[str, Callable[[Any], Any]]], *, maxsize: int = 2):
+        if not stages:
+            raise ValueError("pipeline needs at least one stage")
+        self.stages = stages
+        self.maxsize = max(1, int(maxsize))
+        self.stats = [StageStats(name=name) for name, _ in stages]
+
+    def _worker(self, i: int, fn: Callable[[Any], Any], inbox: queue.Queue, outbox: queue.Queue):
+        st = self.stats[i]
+        while True:
+            env = inbox.get()
+            if env is _DONE:
+                outbox.put(_DONE)
+                return
+            if env.error is None:
+                t0 = time.perf_counter()
+                try:
+                    env.value = fn(env.value)
+                except Exception as e:  # keep the pipeline draining
+                    env.error = e
+                    st.errors += 1
+                dt = time.perf_counter() - t0
+                st.processed += 1
+                st.busy_seconds += dt
+                st.max_latency = max(st.max_latency, dt)
+            outbox.put(env)
+            if i + 1 < len(self.stats):
+                self.stats[i + 1].max_queue_depth = max(self.stats[i + 1].max_queue_depth, outbox.qsize())
+
+    def run(self, jobs: Iterable[Any]) -> list[Any]:
+        queues = [queue.Queue(maxsize=self.maxsize) for _ in self.stages]
+        queues.append(queue.Queue())  # results are never bounded
+        threads = [
+            threading.Thread(target=self._worker, args=(i, fn, queues[i], queues[i + 1]), daemon=True)
+            for i, (_, fn) in enumerate(self.stages)
+        ]
+        for t in threads:
+            t.start()
+
+        n = 0
+        for job in jobs:
+            queues[0].put(_Envelope(index=n, value=job))
+            self.stats[0].max_queue_depth = max(self.stats[0].max_queue_depth, queues[0].qsize())
+            n += 1
+        queues[0].put(_DONE)
+
+        out: list[_Envelope] = []
+        while True:
+            env = queues[-1].get()
+            if env is _DONE:
+                break
+            out.append(env)
+        for t in threads:
+            t.join()
+
+        out.sort(key=lambda e: e.index)
+        for env in out:
+            if env.error is not None:
+                raise env.error
+        return [env.value for env in out]
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{s.name}:n={s.processed} avg={s.avg_latency:.1f}s max={s.max_latency:.1f}s q<={s.max_queue_depth}"
+            for s in self.stats
+        )
@@ -1,38 +1,137 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
-import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from zoneinfo import ZoneInfo
 
-from .agents import OrchestratorAgent, WriterAgent, CriticAgent, ReviserAgent
+from .agents import OrchestratorAgent, PlannedPost, WriterAgent, CriticAgent, ReviserAgent
 from .config import Config
-from .llm import LLM
+from .deadline import Deadline
+from .engagement import load_weights
+from .llm import LLM, template_post
 from .news import fetch_feeds, score_item, bucket_topic
+from .pipeline import StagePipeline
+from .post_lint import lint_post
+from .render import PayloadError, render_payload
 from .storage import Storage
 
 
+# Bounded hand-off between write/critique/revise, so a fast writer can run at
+# most this many drafts ahead of the critic.
+_STAGE_QUEUE_SIZE = 2
+
+# A slot's post must be saved this long before it fires.
+_SLOT_MARGIN_SECONDS = 30
+
+
 def _today_utc() -> str:
     return datetime.now(timezone.utc).date().isoformat()
 
 
-def ensure_daily_queue(*, storage: Storage, cfg: Config) -> tuple[bool, str]:
-    day = _today_utc()
+def _tz(cfg: Config):
+    try:
+        return ZoneInfo(cfg.timezone)
+    except Exception:
+        return timezone.utc
+
+
+def upcoming_slots(cfg: Config, now: datetime | None = None) -> list[tuple[datetime, str]]:
+    """Next fire time of every configured slot, soonest first."""
+    local = (now or datetime.now(timezone.utc)).astimezone(_tz(cfg))
+    out = []
+    for slot in cfg.post_times[: cfg.max_posts_per_day]:
+        hh, mm = slot.split(":")
+        at = local.replace(hour=int(hh), minute=int(mm), second=0, microsecond=0)
+        if at <= local:
+            at += timedelta(days=1)
+        out.append((at, slot))
+    out.sort()
+    return out
+
+
+def slot_lateness_seconds(cfg: Config, slot: str, now: datetime | None = None) -> float:
+    """Seconds between the most recent scheduled fire time of slot and now."""
+    local = (now or datetime.now(timezone.utc)).astimezone(_tz(cfg))
+    hh, mm = slot.split(":")
+    at = local.replace(hour=int(hh), minute=int(mm), second=0, microsecond=0)
+    if at > local:
+        at -= timedelta(days=1)
+    return (local - at).total_seconds()
+
+
+def slot_fire_time(cfg: Config, day: str, slot: str) -> datetime:
+    """When slot fires for the queue day (a UTC date, as the publisher keys it)."""
+    tz = _tz(cfg)
+    hh, mm = slot.split(":")
+    d = date.fromisoformat(day)
+    for offset in (0, -1, 1):
+        at = datetime.combine(d + timedelta(days=offset), dt_time(int(hh), int(mm)), tzinfo=tz)
+        if at.astimezone(timezone.utc).date() == d:
+            return at
+    return datetime.combine(d, dt_time(int(hh), int(mm)), tzinfo=tz)
+
+
+def slot_deadline(cfg: Config, day: str, slot: str, run_deadline: Deadline, now: datetime | None = None) -> Deadline:
+    """The run deadline, moved earlier if the slot fires before it."""
+    now = now or datetime.now(timezone.utc)
+    left = (slot_fire_time(cfg, day, slot) - now).total_seconds() - _SLOT_MARGIN_SECONDS
+    if left <= 0:
+        # Already due (daily mode plans at post time): the run budget is all there is.
+        return run_deadline
+    return Deadline.after(left).earliest(run_deadline)
+
+
+def ensure_daily_queue(*, storage: Storage, cfg: Config, day: str | None = None) -> tuple[bool, str]:
+    day = day or _today_utc()
     existing = storage.get_queue(day)
     if len(existing) >= cfg.max_posts_per_day:
         return False, "queue already planned"
 
     added = fetch_feeds(storage, cfg.rss_feeds)
+    return True, f"feeds_added={added}, " + _plan_slots(storage=storage, cfg=cfg, day=day)
+
+
+def plan_ahead(*, storage: Storage, cfg: Config, now: datetime | None = None) -> tuple[bool, str]:
+    """Lookahead mode: plan slots firing within the lead time, plus a rolling buffer."""
+    now = now or datetime.now(timezone.utc)
+    lead = timedelta(minutes=cfg.plan_lead_minutes)
+
+    due: dict[str, set[str]] = {}
+    for i, (at, slot) in enumerate(upcoming_slots(cfg, now)):
+        if i >= cfg.plan_buffer_slots and at - now > lead:
+            continue
+        # Day keys follow the publisher, which looks slots up by UTC date at fire time.
+        day = at.astimezone(timezone.utc).date().isoformat()
+        if storage.get_queue_slot(day, slot):
+            continue
+        due.setdefault(day, set()).add(slot)
+
+    if not due:
+        return False, "buffer full"
+
+    added = fetch_feeds(storage, cfg.rss_feeds)
+    parts = [f"{day}: " + _plan_slots(storage=storage, cfg=cfg, day=day, only=only) for day, only in sorted(due.items())]
+    return True, f"feeds_added={added}, " + "; ".join(parts)
+
+
+def _rank_candidates(storage: Storage, exclude: set[str]) -> list[tuple[int, str, dict]]:
+    candidates = [c for c in storage.list_unposted(limit=300) if c.get("guid") not in exclude]
+    weights = load_weights(storage)
+    ranked = []
+    for c in candidates:
+        s = score_item(title=c.get("title", ""), summary=c.get("summary", ""), source=c.get("source", ""), weights=weights)
+        b = bucket_topic(title=c.get("title", ""), summary=c.get("summary", ""))
+        ranked.append((s, b, c))
+    ranked.sort(key=lambda x: x[0], reverse=True)
+    return ranked
+
+
+def _plan_slots(*, storage: Storage, cfg: Config, day: str, only: set[str] | None = None) -> str:
+    existing = storage.get_queue(day)
 
     # Slots come from config times
     slots = cfg.post_times[: cfg.max_posts_per_day]
 
-    llm = LLM(
-        ollama_base_url=cfg.ollama_base_url,
-        ollama_model=cfg.ollama_model,
-        openai_api_key=cfg.openai_api_key,
-        openai_model=cfg.openai_model,
-        timeout_seconds=cfg.llm_timeout_seconds,
-        prefer_ollama=cfg.prefer_ollama,
-    )
+    llm = LLM.from_config(cfg, storage=storage)
     orchestrator = OrchestratorAgent(llm)
     writer = WriterAgent(llm)
     critic = CriticAgent(llm)
@@ -41,19 +140,18 @@ def ensure_daily_queue(*, storage: Storage, cfg: Config) -> tuple[bool, str]:
     formats = orchestrator.pick_formats(slots)
 
     # Select top items with diversity by bucket + source.
-    planned = 0
     exclude = {q["guid"] for q in existing if q.get("guid")}
+    # Items already written as spares stay in the pool for slots that fail.
+    exclude |= storage.list_pending_queue_guids() | storage.list_spare_guids()
 
-    candidates = [c for c in storage.list_unposted(limit=300) if c.get("guid") not in exclude]
-    ranked = []
-    for c in candidates:
-        s = score_item(title=c.get("title", ""), summary=c.get("summary", ""), source=c.get("source", ""))
-        b = bucket_topic(title=c.get("title", ""), summary=c.get("summary", ""))
-        ranked.append((s, b, c))
-    ranked.sort(key=lambda x: x[0], reverse=True)
+    ranked = _rank_candidates(storage, exclude)
 
     used_buckets: set[str] = set()
     used_sources: set[str] = set()
+    for q in existing:
+        item = storage.get_item(q["guid"]) if q.get("guid") else None
+        if item and item.get("source"):
+            used_sources.add(item["source"])
 
     def pick_next(prefer_bucket: str | None):
         for s, b, c in ranked:
@@ -85,9 +183,15 @@ def ensure_daily_queue(*, storage: Storage, cfg: Config) -> tuple[bool, str]:
         slots[5] if len(slots) > 5 else "": "general",
     }
 
-    enable_review = bool(cfg.enable_review)
+    # Every slot gets a deadline: its fire time (less a margin) or the end of
+    # the run budget, whichever comes first. Stages that cannot fit in what is
+    # left are skipped, so a slow backend degrades posts instead of slots.
+    run_deadline = Deadline.after(cfg.plan_run_budget_seconds)
 
+    jobs = []
     for slot in slots:
+        if only is not None and slot not in only:
+            continue
         if storage.get_queue_slot(day, slot):
             continue
         pref = slot_bucket.get(slot)
@@ -99,32 +203,245 @@ def ensure_daily_queue(*, storage: Storage, cfg: Config) -> tuple[bool, str]:
         used_buckets.add(b)
         if item.get("source"):
             used_sources.add(item["source"])
+        jobs.append(
+            {
+                "index": len(jobs),
+                "slot": slot,
+                "item": item,
+                "format": formats.get(slot, "breaking_news"),
+                "deadline": slot_deadline(cfg, day, slot, run_deadline),
+            }
+        )
+
+    review = {
+        "enabled": bool(cfg.enable_review),
+        "reviewed": 0,
+        "lint_clean": 0,
+        "lint_flagged": 0,
+        "skipped_critique": 0,
+        "skipped_revise": 0,
+    }
+
+    drafts: dict[str, PlannedPost] = {}
+    invalid: list[str] = []
+
+    def write_stage(job: dict) -> dict:
+        item = job["item"]
+        if cfg.writer_batch_size > 1:
+            # Write this job and the next few in one request; later jobs of the
+            # chunk then pass through the stage without another LLM call.
+            if item["guid"] not in drafts:
+                chunk = jobs[job["index"] : job["index"] + cfg.writer_batch_size]
+                drafts.update(
+                    writer.write_batch(
+                        items=[{**j["item"], "format": j["format"]} for j in chunk],
+                        lang=cfg.lang,
+                        # The chunk is done when its first post is, so that slot's deadline binds.
+                        deadline=min((j["deadline"] for j in chunk), key=lambda d: d.at),
+                    )
+                )
+            job["post"] = drafts.pop(item["guid"])
+        else:
+            job["post"] = writer.write(
+                title=item["title"],
+                source=item["source"],
+                link=item["link"],
+                summary=item["summary"],
+                format=job["format"],
+                lang=cfg.lang,
+                deadline=job["deadline"],
+            )
+        job["text"] = job["post"].post_text
+        return job
+
+    def critique_stage(job: dict) -> dict:
+        job["critique"] = None
+        if not review["enabled"]:
+            return job
+        lint = None
+        if cfg.review_lint_gate:
+            item = job["item"]
+            source_text = "\n".join(item.get(k) or "" for k in ("title", "summary", "link"))
+            lint = lint_post(job["text"], link=item["link"], source_text=source_text)
+            if lint.clean:
+                # The draft already meets every format rule; skip critic and reviser.
+                review["lint_clean"] += 1
+                return job
+            review["lint_flagged"] += 1
+        if job["deadline"].remaining() < 2 * llm.expected_call_seconds():
+            # No room for both critic and reviser: keep the draft as written.
+            review["skipped_critique"] += 1
+            return job
+        job["critique"] = critic.review(post_text=job["text"], lang=cfg.lang, deadline=job["deadline"])
+        if lint is not None:
+            # Hand the reviser the rule violations as well as the critic's notes.
+            job["critique"] = "\n".join([job["critique"], *(f"- {msg}" for msg in lint.issues + lint.warnings)]).strip()
+        return job
+
+    def revise_stage(job: dict) -> dict:
+        if job["critique"] is None:
+            return job
+        if job["deadline"].remaining() < llm.expected_call_seconds():
+            review["skipped_revise"] += 1
+            return job
+        job["text"] = reviser.revise(
+            post_text=job["text"], critique=job["critique"], lang=cfg.lang, deadline=job["deadline"]
+        )
+        review["reviewed"] += 1
+        return job
+
+    def save_stage(job: dict) -> dict:
+        p = job["post"]
+        text, payload = _render(job["text"], job["item"], invalid)
+        storage.upsert_queue_slot(
+            day=day,
+            slot=job["slot"],
+            guid=job["item"]["guid"],
+            format=job["format"],
+            alt_title_1=p.alt_title_1,
+            alt_title_2=p.alt_title_2,
+            post_text=text,
+            payload=payload,
+        )
+        return job
+
+    pipeline = StagePipeline(
+        [
+            ("write", write_stage),
+            ("critique", critique_stage),
+            ("revise", revise_stage),
+            ("save", save_stage),
+        ],
+        maxsize=_STAGE_QUEUE_SIZE,
+    )
+    try:
+        planned = len(pipeline.run(jobs))
+    finally:
+        _record_writer_outcomes(storage, writer)
+        if invalid:
+            storage.incr_counters({"payload.invalid": len(invalid)})
+        counts = {
+            "review.lint_clean": review["lint_clean"],
+            "review.lint_flagged": review["lint_flagged"],
+            "review.llm_calls_saved": 2 * review["lint_clean"],
+            "review.skipped_critique": review["skipped_critique"],
+            "review.skipped_revise": review["skipped_revise"],
+        }
+        if any(counts.values()):
+            storage.incr_counters(counts)
+
+    info = f"planned={planned}"
+    fallbacks = writer.outcomes["freeform"] + writer.outcomes["template"]
+    if fallbacks:
+        info += f", writer_fallbacks={fallbacks}"
+    if cfg.writer_batch_size > 1:
+        info += f", batch_retries={writer.batch_retries}"
+    if invalid:
+        info += f", invalid_payloads={len(invalid)} ({invalid[0]})"
+    if cfg.enable_review:
+        info += f", reviewed={review['reviewed']}/{planned}"
+        if cfg.review_lint_gate:
+            info += f", lint_clean={review['lint_clean']} (llm_calls_saved={2 * review['lint_clean']})"
+        skipped = review["skipped_critique"] + review["skipped_revise"]
+        if skipped:
+            info += f", degraded=skip_critique:{review['skipped_critique']},skip_revise:{review['skipped_revise']}"
+        info += f", stages=[{pipeline.summary()}]"
+    return info
+
+
+def _render(text: str, item: dict, invalid: list[str]) -> tuple[str, list[str]]:
+    """The post and its Telegram messages; a post that fails validation is
+    replaced by the template, and the reason appended to invalid."""
+    try:
+        return text, render_payload(text)
+    except PayloadError as e:
+        invalid.append(f"{item['guid']}: {e}")
+        text = template_post(title=item["title"], source=item["source"], link=item["link"], summary=item["summary"])
+        return text, render_payload(text)
+
+
+def backfill_payloads(storage: Storage) -> int:
+    """Render payloads for planned slots and spares saved before payloads existed."""
+    invalid: list[str] = []
+    n = 0
+    for row in storage.list_missing_payloads():
+        item = storage.get_item(row["guid"]) if row["guid"] else None
+        if not item:
+            continue
+        text, payload = _render(row["post_text"], item, invalid)
+        storage.set_payload(row["table"], row["id"], post_text=text, payload=payload)
+        n += 1
+    return n
+
+
+def _record_writer_outcomes(storage: Storage, writer: WriterAgent):
+    counts = {f"writer.{k}": v for k, v in writer.outcomes.items() if v}
+    if counts:
+        storage.incr_counters(counts)
+
+
+def refill_spares(*, storage: Storage, cfg: Config) -> tuple[bool, str]:
+    """Top up the hot-spare pool with drafts for the next-best unplanned items."""
+    missing = cfg.spare_pool_size - storage.count_available_spares()
+    if missing <= 0:
+        return False, "spare pool full"
+
+    exclude = storage.list_pending_queue_guids() | storage.list_spare_guids()
+    ranked = _rank_candidates(storage, exclude)[:missing]
+    if not ranked:
+        return False, "no candidates for spares"
+
+    llm = LLM.from_config(cfg, storage=storage)
+    writer = WriterAgent(llm)
+    formats = OrchestratorAgent(llm).pick_formats([str(i) for i in range(len(ranked))])
+    invalid: list[str] = []
+    for i, (_, _, item) in enumerate(ranked):
         p = writer.write(
             title=item["title"],
             source=item["source"],
             link=item["link"],
             summary=item["summary"],
-            format=formats.get(slot, "breaking_news"),
+            format=formats[str(i)],
             lang=cfg.lang,
         )
-
-        improved = p.post_text
-        if enable_review:
-            t0 = time.time()
-            critique = critic.review(post_text=improved, lang=cfg.lang)
-            improved = reviser.revise(post_text=improved, critique=critique, lang=cfg.lang)
-            # If review cycle is too slow, disable it for this run.
-            if (time.time() - t0) > max(6, cfg.llm_timeout_seconds):
-                enable_review = False
-        storage.upsert_queue_slot(
-            day=day,
-            slot=slot,
+        text, payload = _render(p.post_text, item, invalid)
+        storage.add_spare(
             guid=item["guid"],
-            format=formats.get(slot, "breaking_news"),
+            format=p.format,
             alt_title_1=p.alt_title_1,
             alt_title_2=p.alt_title_2,
-            post_text=improved,
+            post_text=text,
+            payload=payload,
         )
-        planned += 1
+    _record_writer_outcomes(storage, writer)
+    if invalid:
+        storage.incr_counters({"payload.invalid": len(invalid)})
+    return True, f"spares_added={len(ranked)}"
 
-    return True, f"feeds_added={added}, planned={planned}"
+
+def use_spare(*, storage: Storage, day: str, slot: str) -> dict | None:
+    """Put a pre-written spare into the slot; returns the new queue row or None."""
+    spare = storage.take_spare()
+    if not spare:
+        return None
+    storage.upsert_queue_slot(
+        day=day,
+        slot=slot,
+        guid=spare["guid"],
+        format=spare["format"],
+        alt_title_1=spare["alt_title_1"],
+        alt_title_2=spare["alt_title_2"],
+        post_text=spare["post_text"],
+        payload=spare["payload"],
+    )
+    # If the slot already fired, its unsent outbox rows must carry the spare too,
+    # or the old post would go out (or stay failed) under the spare's guid.
+    storage.rearm_slot_outbox(
+        day=day,
+        slot=slot,
+        guid=spare["guid"],
+        text=spare["post_text"],
+        payload=spare["payload"],
+        now=datetime.now(timezone.utc).timestamp(),
+    )
+    return storage.get_queue_slot(day, slot)
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+
+from .storage import Storage
+
+
+# Format rules from the writer/reviser prompts.
+MAX_CHARS = 900
+# Drafts this close to the length limit still go to the critic.
+BORDERLINE_CHARS = 850
+MIN_BULLETS, MAX_BULLETS = 3, 6
+MIN_HASHTAGS, MAX_HASHTAGS = 2, 5
+HEADER_MAX_CHARS = 120
+
+_BULLET = re.compile(r"^\s*(?:[-•*–—▪✅🔹🔸]|\d{1,2}[.)])\s*")
+_HASHTAG = re.compile(r"#\w+")
+_URL = re.compile(r"https?://[^\s<>\"')\]]+")
+_NUMBER = re.compile(r"(?<![\w.])\d+(?:[.,]\d+)?%?")
+
+
+@dataclass
+class LintResult:
+    issues: list[str] = field(default_factory=list)
+    warnings: list[str] = field(default_factory=list)
+
+    @property
+    def clean(self) -> bool:
+        """No rule broken and nothing borderline: the critic has nothing to add."""
+        return not self.issues and not self.warnings
+
+
+def _numbers(text: str) -> set[str]:
+    return {m.group(0).replace(",", ".").rstrip("%") for m in _NUMBER.finditer(text)}
+
+
+def lint_post(text: str, *, link: str, source_text: str) -> LintResult:
+    """Check a draft against the post format rules without calling the LLM.
+
+    source_text is everything the writer was given (title, summary, link);
+    URLs and figures in the draft must come from it.
+    """
+    res = LintResult()
+    text = (text or "").strip()
+    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+
+    if len(text) > MAX_CHARS:
+        res.issues.append(f"длина {len(text)} > {MAX_CHARS} символов")
+    elif len(text) > BORDERLINE_CHARS:
+        res.warnings.append(f"длина {len(text)} близко к лимиту {MAX_CHARS}")
+
+    if not lines or _BULLET.match(lines[0]) or _URL.search(lines[0]) or len(lines[0]) > HEADER_MAX_CHARS:
+        res.issues.append("нет строки-заголовка")
+
+    bullet_idx = [i for i, ln in enumerate(lines) if _BULLET.match(ln)]
+    if not MIN_BULLETS <= len(bullet_idx) <= MAX_BULLETS:
+        res.issues.append(f"буллетов {len(bullet_idx)}, нужно {MIN_BULLETS}-{MAX_BULLETS}")
+
+    after = lines[bullet_idx[-1] + 1 :] if bullet_idx else []
+    if not any(not _URL.search(ln) and not ln.startswith("#") for ln in after):
+        res.issues.append("нет takeaway после буллетов")
+
+    if link and link not in text:
+        res.issues.append("нет ссылки на источник")
+
+    tags = _HASHTAG.findall(text)
+    if not MIN_HASHTAGS <= len(tags) <= MAX_HASHTAGS:
+        res.issues.append(f"хэштегов {len(tags)}, нужно {MIN_HASHTAGS}-{MAX_HASHTAGS}")
+
+    source_urls = set(_URL.findall(source_text or "")) | ({link} if link else set())
+    foreign = [u for u in _URL.findall(text) if u.rstrip(".,;") not in source_urls]
+    if foreign:
+        res.issues.append("ссылки не из источника: " + ", ".join(foreign[:3]))
+
+    # Figures are where invented facts show up; list numbering and small counts are fine.
+    body = "\n".join(_BULLET.sub("", ln) for ln in lines)
+    body = _URL.sub("", _HASHTAG.sub("", body))
+    source_numbers = _numbers(source_text or "")
+    unknown = sorted(
+        n for n in _numbers(body) - source_numbers if "." in n or float(n) > 10
+    )
+    if unknown:
+        res.issues.append("цифры не из источника: " + ", ".join(unknown[:5]))
+    return res
+
+
+def review_gate_stats(storage: Storage) -> dict:
+    c = storage.get_counters("review.")
+    return {
+        "lint_clean": int(c.get("review.lint_clean", 0)),
+        "lint_flagged": int(c.get("review.lint_flagged", 0)),
+        "llm_calls_saved": int(c.get("review.llm_calls_saved", 0)),
+        # Stages dropped because the slot's deadline had no room for them.
+        "skipped_critique": int(c.get("review.skipped_critique", 0)),
+        "skipped_revise": int(c.get("review.skipped_revise", 0)),
+    }
@@ -1,104 +1,382 @@
-import html
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
+from typing import Callable
 
 from aiogram import Bot
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
 
-from .config import load_config
-from .llm import LLM
-from .planner import ensure_daily_queue
+from .config import Config, load_config
+from .llm import AsyncLLM, LLM
+from .planner import ensure_daily_queue, refill_spares, slot_lateness_seconds, use_spare
+from .rate_limit import RateLimiter
+from .render import render_payload
 from .storage import Storage
 
 
-def _html_post(text: str) -> str:
-    # Keep it safe for HTML parse mode.
-    return html.escape(text or "")
-
-
 def _today_utc() -> str:
     return datetime.now(timezone.utc).date().isoformat()
 
 
-async def post_scheduled(*, storage: Storage, slot: str) -> tuple[bool, str]:
-    cfg = load_config()
+# Strong refs to fire-and-forget tasks so they aren't garbage collected mid-run.
+_BACKGROUND: set[asyncio.Task] = set()
+
+# Publish latency (one send_message round trip) of recent posts, and how many
+# short-lived Bot clients had to be created for callers without a shared one.
+_PUBLISH_MS: deque[float] = deque(maxlen=200)
+_STATS = {"sends": 0, "bots_created": 0, "retries": 0, "rate_limited": 0, "failed": 0}
+
+
+def _percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def publish_stats() -> dict:
+    ms = list(_PUBLISH_MS)
+    return {
+        **_STATS,
+        "p50_ms": round(_percentile(ms, 0.5), 1),
+        "p95_ms": round(_percentile(ms, 0.95), 1),
+    }
+
+
+def make_bot(cfg: Config) -> Bot:
+    return Bot(token=cfg.telegram_bot_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+
+
+@asynccontextmanager
+async def _bot_client(cfg: Config, bot: Bot | None):
+    """The app's long-lived bot if given; otherwise a one-off client closed afterwards.
+
+    A Bot's HTTP session belongs to the event loop it was created on, so callers
+    running their own loop (the dashboard) cannot borrow the bot's client.
+    """
+    if bot is not None:
+        yield bot
+        return
+    own = make_bot(cfg)
+    _STATS["bots_created"] += 1
+    try:
+        yield own
+    finally:
+        await own.session.close()
+
+
+def publish_targets(storage: Storage, cfg: Config) -> list[str]:
+    """Chats every post goes to: the target_chat_id setting (or env), comma-separated."""
+    raw = storage.get_setting("target_chat_id", "").strip() or cfg.target_chat_id
+    out: list[str] = []
+    for chat in raw.split(","):
+        chat = chat.strip()
+        if chat and chat not in out:
+            out.append(chat)
+    return out
+
+
+_LIMITERS: dict[tuple, RateLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def _limiter(key: tuple, rate: float, per: float) -> RateLimiter:
+    with _LIMITERS_LOCK:
+        if key not in _LIMITERS:
+            _LIMITERS[key] = RateLimiter(rate, per=per)
+        return _LIMITERS[key]
+
+
+async def _throttle(cfg: Config, chat_id: str):
+    """Wait for the chat's own limit, then for the bot-wide one (Telegram: ~30 msg/s per bot)."""
+    await _limiter(("chat", chat_id, cfg.publish_chat_rate_per_minute), cfg.publish_chat_rate_per_minute, 60.0).acquire()
+    await _limiter(("global", cfg.publish_rate_per_second), cfg.publish_rate_per_second, 1.0).acquire()
+
+
+def limiter_stats() -> dict:
+    with _LIMITERS_LOCK:
+        items = list(_LIMITERS.items())
+    out = {"global": {"waits": 0, "waited_seconds": 0.0}, "chats": {}}
+    for key, lim in items:
+        st = lim.stats()
+        if key[0] == "global":
+            out["global"] = {k: out["global"][k] + v for k, v in st.items()}
+        else:
+            out["chats"][key[1]] = st
+    return out
+
+
+async def _send(client: Bot, chat_id: str, part: str):
+    """Send one pre-rendered (already escaped) message part."""
+    t0 = time.perf_counter()
+    msg = await client.send_message(chat_id=chat_id, text=part)
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    _PUBLISH_MS.append(elapsed_ms)
+    _STATS["sends"] += 1
+    return msg, elapsed_ms
+
+
+def refill_spares_soon(*, storage: Storage, cfg: Config):
+    """Schedule a spare-pool refill in a worker thread without waiting for it."""
+    if cfg.spare_pool_size <= 0:
+        return
+    task = asyncio.get_running_loop().create_task(asyncio.to_thread(refill_spares, storage=storage, cfg=cfg))
+    _BACKGROUND.add(task)
+    task.add_done_callback(_BACKGROUND.discard)
+
+
+def _take_spare(*, storage: Storage, cfg: Config, day: str, slot: str) -> dict | None:
+    if cfg.spare_pool_size <= 0:
+        return None
+    q = use_spare(storage=storage, day=day, slot=slot)
+    if q:
+        refill_spares_soon(storage=storage, cfg=cfg)
+    return q
+
+
+async def post_scheduled(
+    *, storage: Storage, slot: str, cfg: Config | None = None, bot: Bot | None = None
+) -> tuple[bool, str]:
+    cfg = cfg or load_config()
     if not cfg.telegram_bot_token:
         return False, "TELEGRAM_BOT_TOKEN missing"
 
-    target = storage.get_setting("target_chat_id", "").strip() or cfg.target_chat_id
-    if not target:
+    targets = publish_targets(storage, cfg)
+    if not targets:
         return False, "target_chat_id not set"
 
     day = _today_utc()
-    ensure_daily_queue(storage=storage, cfg=cfg)
+    if cfg.planner_mode != "lookahead":
+        await asyncio.to_thread(ensure_daily_queue, storage=storage, cfg=cfg)
+
+    queued = [storage.get_outbox(_slot_key(day, slot, chat)) for chat in targets]
+    if all(queued):
+        if all(r["status"] == "sent" for r in queued):
+            return False, "already posted"
+        # Every target was already handed to the outbox (e.g. retries are pending): never enqueue twice.
+        return await _fan_out(storage, cfg, bot, queued, day=day, slot=slot)
 
     q = storage.get_queue_slot(day, slot)
     if not q:
-        return False, "no planned slot"
+        # Nothing planned in time: take a hot spare instead of generating now.
+        q = _take_spare(storage=storage, cfg=cfg, day=day, slot=slot)
+        if not q:
+            return False, "no planned slot"
     if q.get("status") == "posted":
         return False, "already posted"
 
+    # The planner stored the final, escaped and length-checked messages; nothing
+    # is generated or rendered here.
     item = storage.get_item(q["guid"])
+    if not item or not q.get("payload"):
+        spare = _take_spare(storage=storage, cfg=cfg, day=day, slot=slot)
+        if spare:
+            q = spare
+            item = storage.get_item(q["guid"])
     if not item:
         storage.mark_queue_error(day=day, slot=slot, error="item not found")
         return False, "item not found"
+    if not q.get("payload"):
+        storage.mark_queue_error(day=day, slot=slot, error="no rendered payload")
+        return False, "no rendered payload"
 
-    text = (q.get("post_text") or "").strip()
-    if not text:
-        # fallback
-        llm = LLM(
-            ollama_base_url=cfg.ollama_base_url,
-            ollama_model=cfg.ollama_model,
-            openai_api_key=cfg.openai_api_key,
-            openai_model=cfg.openai_model,
-            timeout_seconds=cfg.llm_timeout_seconds,
-            prefer_ollama=cfg.prefer_ollama,
-        )
-        text = llm.rewrite_news(
-            title=item["title"],
-            source=item["source"],
-            link=item["link"],
-            summary=item["summary"],
-            lang=cfg.lang,
+    now = time.time()
+    rows = [
+        storage.add_outbox(
+            key=_slot_key(day, slot, chat),
+            chat_id=chat,
+            text=q["post_text"],
+            payload=q["payload"],
+            day=day,
+            slot=slot,
+            guid=item["guid"],
+            now=now,
         )
-
-    bot = Bot(token=cfg.telegram_bot_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-    try:
-        msg = await bot.send_message(chat_id=target, text=_html_post(text))
-        storage.mark_queue_posted(day=day, slot=slot, tg_message_id=msg.message_id)
-        storage.mark_posted(item["guid"], text)
-        return True, str(msg.message_id)
-    except Exception as e:
-        storage.mark_queue_error(day=day, slot=slot, error=str(e))
-        return False, str(e)
-    finally:
-        await bot.session.close()
+        for chat in targets
+    ]
+    return await _fan_out(storage, cfg, bot, rows, day=day, slot=slot)
 
 
-async def post_one(*, storage: Storage, target_chat_id: str) -> tuple[bool, str]:
-    cfg = load_config()
+async def post_one(
+    *,
+    storage: Storage,
+    targets: list[str],
+    cfg: Config | None = None,
+    bot: Bot | None = None,
+    progress: Callable[[str], None] | None = None,
+) -> tuple[bool, str]:
+    """Post the newest unposted item now. progress, if given, is told each stage."""
+    cfg = cfg or load_config()
+    report = progress or (lambda _stage: None)
     if not cfg.telegram_bot_token:
         return False, "TELEGRAM_BOT_TOKEN missing"
 
-    # manual: post the newest unposted item now
-    ensure_daily_queue(storage=storage, cfg=cfg)
+    report("planning")
+    await asyncio.to_thread(ensure_daily_queue, storage=storage, cfg=cfg)
     item = storage.pick_next_unposted()
     if not item:
         return False, "no unposted items"
 
-    llm = LLM(
-        ollama_base_url=cfg.ollama_base_url,
-        ollama_model=cfg.ollama_model,
-        openai_api_key=cfg.openai_api_key,
-        openai_model=cfg.openai_model,
-        timeout_seconds=cfg.llm_timeout_seconds,
-        prefer_ollama=cfg.prefer_ollama,
+    report("writing")
+    llm = AsyncLLM(LLM.from_config(cfg, storage=storage))
+    rewritten = await llm.rewrite_news(
+        title=item["title"], source=item["source"], link=item["link"], summary=item["summary"], lang=cfg.lang
     )
-    rewritten = llm.rewrite_news(title=item["title"], source=item["source"], link=item["link"], summary=item["summary"], lang=cfg.lang)
 
-    bot = Bot(token=cfg.telegram_bot_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-    msg = await bot.send_message(chat_id=target_chat_id, text=_html_post(rewritten))
-    await bot.session.close()
+    payload = render_payload(rewritten)
+    now = time.time()
+    rows = []
+    for chat in targets:
+        row = storage.add_outbox(
+            key=f"manual:{item['guid']}:{chat}", chat_id=chat, text=rewritten, payload=payload, guid=item["guid"], now=now
+        )
+        if row["status"] == "failed":
+            # An earlier manual attempt gave up; asking again means trying again.
+            row = storage.rearm_outbox(row["id"], text=rewritten, payload=payload, now=now)
+        rows.append(row)
+    report(f"sending to {len(rows)} target(s)")
+    return await _fan_out(storage, cfg, bot, rows)
+
+
+async def _fan_out(
+    storage: Storage, cfg: Config, bot: Bot | None, rows: list[dict], *, day: str = "", slot: str = ""
+) -> tuple[bool, str]:
+    """Send the due rows concurrently; ok once every target has the post.
+
+    Sends share one client and pass through the per-chat and global limiters,
+    so N targets cost about one send of latency rather than N.
+    """
+    due = [r for r in rows if r["status"] == "pending" and r["next_attempt_at"] <= time.time()]
+    results = {r["chat_id"]: (r["status"], f"outbox: {r['status']}") for r in rows}
+    t0 = time.perf_counter()
+    if due:
+        async with _bot_client(cfg, bot) as client:
+            outcomes = await asyncio.gather(*(_deliver(storage, cfg, client, r) for r in due))
+        results.update({r["chat_id"]: res for r, res in zip(due, outcomes)})
+    if slot:
+        _settle_slot(storage, cfg, day, slot, publish_ms=(time.perf_counter() - t0) * 1000)
+    ok = all(status == "sent" for status, _ in results.values())
+    if len(results) == 1:
+        return ok, next(iter(results.values()))[1]
+    return ok, "; ".join(f"{chat}: {info}" for chat, (_, info) in results.items())
+
+
+def _slot_key(day: str, slot: str, chat_id: str) -> str:
+    return f"slot:{day}:{slot}:{chat_id}"
+
+
+def outbox_backoff_seconds(cfg: Config, attempts: int) -> float:
+    """Delay after the attempts-th failed send: exponential, capped, jittered."""
+    delay = min(cfg.outbox_backoff_max_seconds, cfg.outbox_backoff_seconds * 2 ** max(0, attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+
+async def _deliver(storage: Storage, cfg: Config, client: Bot, row: dict) -> tuple[str, str]:
+    """Claim one outbox row and try to send it; returns (status, info).
+
+    status is "sent", "retry", "rate_limited", "failed" or "busy" (claimed by
+    another worker). The queue slot is settled by the caller once every
+    target's row is done.
+    """
+    if not storage.claim_outbox(row["id"]):
+        return "busy", "already being sent"
+    attempts = int(row["attempts"]) + 1
+    publish_ms = 0.0
+    try:
+        # Resume after the parts an earlier attempt already delivered, so none is sent twice.
+        for i in range(row["parts_sent"], len(row["payload"])):
+            await _throttle(cfg, row["chat_id"])
+            msg, elapsed_ms = await _send(client, row["chat_id"], row["payload"][i])
+            publish_ms += elapsed_ms
+            storage.outbox_part_sent(row["id"], parts_sent=i + 1, tg_message_id=msg.message_id)
+    except TelegramRetryAfter as e:
+        # Flood control: Telegram rejected the send, so wait as told; this is not the post's fault.
+        storage.retry_outbox(row["id"], next_attempt_at=time.time() + e.retry_after, error=str(e), count_attempt=False)
+        _STATS["rate_limited"] += 1
+        return "rate_limited", f"rate limited, retry in {e.retry_after}s"
+    except TelegramAPIError as e:
+        if not isinstance(e, (TelegramNetworkError, TelegramServerError)):
+            # Bad request, blocked, chat not found...: a retry would fail the same way.
+            return _fail(storage, row, str(e))
+        return _retry(storage, cfg, row, attempts, e)
+    except Exception as e:
+        return _retry(storage, cfg, row, attempts, e)
+
+    storage.finish_outbox(row["id"], status="sent", publish_ms=publish_ms)
+    if row["guid"]:
+        storage.mark_posted(row["guid"], row["text"])
+    return "sent", str(storage.get_outbox(row["key"])["tg_message_id"])
+
+
+def _retry(storage: Storage, cfg: Config, row: dict, attempts: int, error: Exception) -> tuple[str, str]:
+    if attempts >= cfg.outbox_max_attempts:
+        return _fail(storage, row, f"gave up after {attempts} attempts: {error}")
+    delay = outbox_backoff_seconds(cfg, attempts)
+    storage.retry_outbox(row["id"], next_attempt_at=time.time() + delay, error=str(error))
+    _STATS["retries"] += 1
+    return "retry", f"send failed ({error}), retry {attempts + 1}/{cfg.outbox_max_attempts} in {delay:.0f}s"
+
+
+def _fail(storage: Storage, row: dict, error: str) -> tuple[str, str]:
+    storage.finish_outbox(row["id"], status="failed", error=error)
+    _STATS["failed"] += 1
+    return "failed", error
+
+
+def _settle_slot(storage: Storage, cfg: Config, day: str, slot: str, *, publish_ms: float | None = None):
+    """Mark the queue slot posted once every target has it, or error once none is left pending.
+
+    If every target failed, the slot's post is swapped for a spare (once: a spare
+    that fails too is an error) and the re-armed rows go out on the next drain.
+    """
+    rows = storage.list_slot_outbox(day, slot)
+    if not rows or any(r["status"] in ("pending", "sending") for r in rows):
+        return
+    if all(r["status"] == "sent" for r in rows):
+        storage.mark_queue_posted(
+            day=day,
+            slot=slot,
+            tg_message_id=rows[0]["tg_message_id"],
+            lateness_seconds=slot_lateness_seconds(cfg, slot),
+            publish_ms=publish_ms,
+        )
+        return
+    if all(r["status"] == "failed" for r in rows):
+        q = storage.get_queue_slot(day, slot)
+        if q and not storage.is_used_spare(q["guid"]) and _take_spare(storage=storage, cfg=cfg, day=day, slot=slot):
+            return
+    errors = [f"{r['chat_id']}: {r['error'] or r['status']}" for r in rows if r["status"] != "sent"]
+    storage.mark_queue_error(day=day, slot=slot, error="; ".join(errors))
+
+
+async def drain_outbox(*, storage: Storage, cfg: Config, bot: Bot | None = None, limit: int = 50) -> dict[str, int]:
+    """Send every outbox row that is due; run periodically by the scheduler."""
+    counts: dict[str, int] = {}
+    rows = storage.list_due_outbox(now=time.time(), limit=limit)
+    if not rows:
+        return counts
+    async with _bot_client(cfg, bot) as client:
+        for row in rows:
+            status, _ = await _deliver(storage, cfg, client, row)
+            counts[status] = counts.get(status, 0) + 1
+            if row["slot"] and status in ("sent", "failed"):
+                _settle_slot(storage, cfg, row["day"], row["slot"])
+            if status == "rate_limited":
+                # The whole bot is throttled; the rest would only hit the same limit.
+                break
+    return counts
+
 
-    storage.mark_posted(item["guid"], rewritten)
-    return True, str(msg.message_id)
+def recover_outbox(storage: Storage, cfg: Config) -> int:
+    """At startup: park sends a crash interrupted rather than risk posting them twice."""
+    rows = storage.abandon_sending_outbox()
+    for row in rows:
+        if row["slot"]:
+            _settle_slot(storage, cfg, row["day"], row["slot"])
+    return len(rows)
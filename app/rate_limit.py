@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    """At most `rate` acquisitions per `per` seconds, allowing bursts of `burst`.
+
+    Slots are reserved under a thread lock and waited for with asyncio.sleep,
+    so one limiter can be shared by event loops in different threads (the bot
+    and the dashboard's asyncio.run) without binding to either loop.
+    """
+
+    def __init__(self, rate: float, per: float = 1.0, burst: int = 1):
+        self.interval = float(per) / max(float(rate), 1e-9)
+        self.burst = max(1, int(burst))
+        self._tat = 0.0  # theoretical arrival time of the next acquisition
+        self._lock = threading.Lock()
+        self.waits = 0
+        self.waited_seconds = 0.0
+
+    def reserve(self) -> float:
+        """Take the next slot; returns how long to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            tat = max(self._tat, now)
+            wait = max(0.0, tat - (self.burst - 1) * self.interval - now)
+            self._tat = tat + self.interval
+            if wait:
+                self.waits += 1
+                self.waited_seconds += wait
+            return wait
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"waits": self.waits, "waited_seconds": round(self.waited_seconds, 2)}
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import html
+
+
+# Telegram's limit for one message's text (after entity parsing, in UTF-16 units).
+TELEGRAM_MAX_CHARS = 4096
+# A post that needs more messages than this is not a post; the planner rejects it.
+MAX_PARTS = 3
+
+_SEPARATORS = ("\n\n", "\n", " ")
+
+
+class PayloadError(ValueError):
+    """A post that cannot be sent as a Telegram payload."""
+
+
+def _size(chunk: str) -> int:
+    # Escaped length for what goes over the wire; UTF-16 length for what Telegram counts.
+    return max(len(html.escape(chunk)), len(chunk.encode("utf-16-le")) // 2)
+
+
+def _hard_cut(text: str, limit: int) -> tuple[str, str]:
+    lo, hi = 1, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if _size(text[:mid]) <= limit:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo], text[lo:]
+
+
+def split_text(text: str, limit: int = TELEGRAM_MAX_CHARS, separators: tuple[str, ...] = _SEPARATORS) -> list[str]:
+    """Split text into chunks that fit limit once escaped, preferring paragraph,
+    then line, then word boundaries."""
+    if _size(text) <= limit:
+        return [text]
+    if not separators:
+        head, rest = _hard_cut(text, limit)
+        return [head, *split_text(rest, limit, ())] if rest else [head]
+    sep = separators[0]
+    out: list[str] = []
+    cur = ""
+    for piece in text.split(sep):
+        candidate = cur + sep + piece if cur else piece
+        if _size(candidate) <= limit:
+            cur = candidate
+            continue
+        if cur:
+            out.append(cur)
+        if _size(piece) <= limit:
+            cur = piece
+        else:
+            *full, cur = split_text(piece, limit, separators[1:])
+            out.extend(full)
+    if cur:
+        out.append(cur)
+    return [c.strip() for c in out if c.strip()]
+
+
+def render_payload(text: str, *, limit: int = TELEGRAM_MAX_CHARS, max_parts: int = MAX_PARTS) -> list[str]:
+    """The messages to send for a post: HTML-escaped parts, each within limit."""
+    text = (text or "").strip()
+    if not text:
+        raise PayloadError("empty post")
+    parts = [html.escape(chunk) for chunk in split_text(text, limit)]
+    if len(parts) > max_parts:
+        raise PayloadError(f"post needs {len(parts)} messages, at most {max_parts} allowed")
+    return parts
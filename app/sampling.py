@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+
+# A post is re-sampled after about a quarter of its age: every few minutes in
+# its first hour, hourly at four hours, daily from four days on.
+_AGE_FRACTION = 0.25
+# Views grew by at least this share since the last sample: sample twice as often.
+_FAST_GROWTH = 0.10
+# No change at all since the last sample: stretch the previous interval.
+_IDLE_STRETCH = 1.5
+
+
+def next_sample_interval(
+    *,
+    age_seconds: float,
+    views: int,
+    prev_views: int | None,
+    prev_interval: float | None,
+    min_seconds: float,
+    max_seconds: float,
+) -> float:
+    """Seconds until a post should be sampled again, from its age and recent growth."""
+    interval = max(0.0, float(age_seconds)) * _AGE_FRACTION
+    if prev_views is not None and prev_interval:
+        growth = (int(views) - int(prev_views)) / max(int(prev_views), 1)
+        if growth >= _FAST_GROWTH:
+            interval /= 2
+        elif growth <= 0:
+            interval = max(interval, float(prev_interval) * _IDLE_STRETCH)
+    return min(float(max_seconds), max(float(min_seconds), interval))
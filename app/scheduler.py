@@ -1,20 +1,118 @@
+import asyncio
+from datetime import datetime
+
+from aiogram import Bot
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
-from .publisher import post_scheduled
+from .config import Config
+from .llm import LLM
+from .planner import plan_ahead, refill_spares
+from .publisher import drain_outbox, post_scheduled
 from .storage import Storage
 
 
-async def _post_slot(storage: Storage, slot: str):
-    await post_scheduled(storage=storage, slot=slot)
+# How often the lookahead planner and the spare pool are topped up between
+# slot-driven runs.
+_PLAN_REFILL_MINUTES = 15
+
+# How often due outbox retries are sent.
+_OUTBOX_POLL_SECONDS = 30
+
+
+async def _post_slot(storage: Storage, slot: str, cfg: Config | None = None, bot: Bot | None = None):
+    await post_scheduled(storage=storage, slot=slot, cfg=cfg, bot=bot)
+
+
+async def _drain_outbox(storage: Storage, cfg: Config, bot: Bot | None = None):
+    await drain_outbox(storage=storage, cfg=cfg, bot=bot)
+
+
+async def _plan_ahead(storage: Storage, cfg: Config):
+    # Feed fetching and LLM calls are blocking; keep them off the event loop.
+    await asyncio.to_thread(plan_ahead, storage=storage, cfg=cfg)
+
+
+async def _refill_spares(storage: Storage, cfg: Config):
+    await asyncio.to_thread(refill_spares, storage=storage, cfg=cfg)
+
 
+def _warm_up_ollama(storage: Storage, cfg: Config):
+    LLM.from_config(cfg, storage=storage).warm_up(timeout_seconds=cfg.ollama_warmup_timeout_seconds)
 
-def setup_scheduler(*, storage: Storage, post_times: list[str], timezone: str = "UTC"):
+
+async def _warm_up(storage: Storage, cfg: Config):
+    await asyncio.to_thread(_warm_up_ollama, storage, cfg)
+
+
+def warmup_minutes(cfg: Config, post_times: list[str]) -> list[int]:
+    """Minutes of the day at which to load the Ollama model ahead of generation."""
+    # Generation happens at the slot itself in daily mode and plan_lead earlier in lookahead mode.
+    lead = cfg.ollama_warmup_lead_minutes + (cfg.plan_lead_minutes if cfg.planner_mode == "lookahead" else 0)
+    out = set()
+    for t in post_times:
+        hh, mm = t.split(":")
+        out.add((int(hh) * 60 + int(mm) - lead) % (24 * 60))
+    return sorted(out)
+
+
+def setup_scheduler(
+    *,
+    storage: Storage,
+    post_times: list[str],
+    timezone: str = "UTC",
+    cfg: Config | None = None,
+    bot: Bot | None = None,
+):
     scheduler = AsyncIOScheduler(timezone=timezone)
 
     for t in post_times:
         hh, mm = t.split(":")
         trigger = CronTrigger(hour=int(hh), minute=int(mm), timezone=timezone)
-        scheduler.add_job(_post_slot, trigger=trigger, kwargs={"storage": storage, "slot": t})
+        scheduler.add_job(_post_slot, trigger=trigger, kwargs={"storage": storage, "slot": t, "cfg": cfg, "bot": bot})
+
+    if cfg is not None:
+        scheduler.add_job(
+            _drain_outbox,
+            trigger=IntervalTrigger(seconds=_OUTBOX_POLL_SECONDS, timezone=timezone),
+            kwargs={"storage": storage, "cfg": cfg, "bot": bot},
+            max_instances=1,
+            coalesce=True,
+        )
+
+    if cfg is not None and cfg.planner_mode == "lookahead":
+        plan_kwargs = {"storage": storage, "cfg": cfg}
+        for t in post_times:
+            hh, mm = t.split(":")
+            minute_of_day = (int(hh) * 60 + int(mm) - cfg.plan_lead_minutes) % (24 * 60)
+            trigger = CronTrigger(hour=minute_of_day // 60, minute=minute_of_day % 60, timezone=timezone)
+            scheduler.add_job(_plan_ahead, trigger=trigger, kwargs=plan_kwargs, max_instances=1, coalesce=True)
+        scheduler.add_job(
+            _plan_ahead,
+            trigger=IntervalTrigger(minutes=_PLAN_REFILL_MINUTES, timezone=timezone),
+            kwargs=plan_kwargs,
+            next_run_time=datetime.now(scheduler.timezone),
+            max_instances=1,
+            coalesce=True,
+        )
+
+    if cfg is not None and cfg.spare_pool_size > 0:
+        scheduler.add_job(
+            _refill_spares,
+            trigger=IntervalTrigger(minutes=_PLAN_REFILL_MINUTES, timezone=timezone),
+            kwargs={"storage": storage, "cfg": cfg},
+            next_run_time=datetime.now(scheduler.timezone),
+            max_instances=1,
+            coalesce=True,
+        )
+
+    if cfg is not None and cfg.ollama_warmup_lead_minutes > 0 and cfg.ollama_base_url and cfg.ollama_model:
+        warm_kwargs = {"storage": storage, "cfg": cfg}
+        for minute_of_day in warmup_minutes(cfg, post_times):
+            trigger = CronTrigger(hour=minute_of_day // 60, minute=minute_of_day % 60, timezone=timezone)
+            scheduler.add_job(_warm_up, trigger=trigger, kwargs=warm_kwargs, max_instances=1, coalesce=True)
+        # One-off warm-up at startup.
+        scheduler.add_job(_warm_up, kwargs=warm_kwargs)
 
     return scheduler
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import json
+
+from .storage import Storage
+
+
+# Fixed part of a metrics row: four integers and the rowid.
+_ROW_BYTES = 5 * 8
+
+
+def _state(views: int, forwards: int, replies: int, reactions: dict[str, int]) -> tuple:
+    return int(views), int(forwards), int(replies), tuple(sorted(reactions.items()))
+
+
+def snapshot_bytes(*, chat_id: str, captured_at: str, reactions: dict[str, int] | None) -> int:
+    """Approximate size of a full snapshot row, reactions stored inline as JSON."""
+    inline = len(json.dumps(reactions or {}, ensure_ascii=False).encode("utf-8"))
+    return _ROW_BYTES + len(str(chat_id)) + len(captured_at) + inline
+
+
+class SnapshotRecorder:
+    """Writes a post's metrics only when a value changed since its last snapshot.
+
+    The last written state of every post is kept in memory, so an unchanged
+    sample costs no database access. Posts not seen since start are primed
+    from the database in one query per chat.
+    """
+
+    def __init__(self, storage: Storage):
+        self.storage = storage
+        self._last: dict[tuple[str, int], tuple] = {}
+        self.stats = {"written": 0, "skipped": 0, "bytes_saved": 0}
+
+    def prime(self, chat_id: str, message_ids: list[int]):
+        missing = [int(m) for m in message_ids if (str(chat_id), int(m)) not in self._last]
+        for message_id, snap in self.storage.get_last_metric_snapshots(chat_id=chat_id, message_ids=missing).items():
+            self._last[(str(chat_id), message_id)] = _state(
+                snap["views"], snap["forwards"], snap["replies"], snap["reactions"]
+            )
+
+    def record(
+        self,
+        *,
+        chat_id: str,
+        message_id: int,
+        captured_at: str,
+        views: int,
+        forwards: int,
+        replies: int,
+        reactions: dict[str, int],
+    ) -> bool:
+        """Store the sample if anything changed; returns whether a row was written."""
+        key = (str(chat_id), int(message_id))
+        state = _state(views, forwards, replies, reactions)
+        prev = self._last.get(key)
+        full = snapshot_bytes(chat_id=chat_id, captured_at=captured_at, reactions=reactions)
+        if prev == state:
+            self.stats["skipped"] += 1
+            self.stats["bytes_saved"] += full
+            return False
+        reactions_changed = prev is None or prev[3] != state[3]
+        self.storage.add_metric_snapshot(
+            chat_id=str(chat_id),
+            message_id=int(message_id),
+            captured_at=captured_at,
+            views=views,
+            forwards=forwards,
+            replies=replies,
+            reactions=dict(reactions) if reactions_changed else None,
+        )
+        if not reactions_changed:
+            self.stats["bytes_saved"] += full - snapshot_bytes(chat_id=chat_id, captured_at=captured_at, reactions=None)
+        self.stats["written"] += 1
+        self._last[key] = state
+        return True
+
+    def flush_stats(self) -> dict:
+        """Add the counts since the last flush to the metrics.snapshot_* counters."""
+        stats, self.stats = self.stats, {"written": 0, "skipped": 0, "bytes_saved": 0}
+        if any(stats.values()):
+            self.storage.incr_counters({f"metrics.snapshot_{k}": v for k, v in stats.items()})
+        return stats
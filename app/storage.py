@@ -1,3 +1,4 @@
+import json
 import sqlite3
 from datetime import datetime
 
@@ -30,6 +31,7 @@ CREATE TABLE IF NOT EXISTS queue (
   error TEXT,
   created_at TEXT,
   posted_at TEXT,
+  lateness_seconds REAL,
   UNIQUE(day, slot)
 );
 
@@ -46,12 +48,160 @@ CREATE TABLE IF NOT EXISTS metrics (
 
 CREATE INDEX IF NOT EXISTS idx_metrics_msg ON metrics(chat_id, message_id, captured_at);
 
+-- Reaction counts of a metrics snapshot, one row per emoji. A snapshot whose
+-- reactions did not change points at the earlier snapshot that holds them
+-- (metrics.reactions_from) instead of repeating the rows.
+CREATE TABLE IF NOT EXISTS metric_reactions (
+  snapshot_id INTEGER,
+  emoji TEXT,
+  count INTEGER,
+  PRIMARY KEY(snapshot_id, emoji)
+);
+
+CREATE TABLE IF NOT EXISTS post_engagement (
+  chat_id TEXT,
+  message_id INTEGER,
+  source TEXT,
+  bucket TEXT,
+  views INTEGER,
+  forwards INTEGER,
+  updated_at TEXT,
+  PRIMARY KEY(chat_id, message_id)
+);
+
+CREATE TABLE IF NOT EXISTS engagement_stats (
+  kind TEXT,
+  key TEXT,
+  posts REAL,
+  views REAL,
+  forwards REAL,
+  updated_at TEXT,
+  PRIMARY KEY(kind, key)
+);
+
+CREATE TABLE IF NOT EXISTS spares (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  guid TEXT UNIQUE,
+  format TEXT,
+  alt_title_1 TEXT,
+  alt_title_2 TEXT,
+  post_text TEXT,
+  created_at TEXT,
+  used_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS llm_cache (
+  key TEXT PRIMARY KEY,
+  backend TEXT,
+  model TEXT,
+  response TEXT,
+  latency_ms REAL,
+  size_bytes INTEGER,
+  hits INTEGER DEFAULT 0,
+  created_at REAL,
+  last_used_at REAL
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_cache_lru ON llm_cache(last_used_at);
+
+CREATE TABLE IF NOT EXISTS llm_calls (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  created_at TEXT,
+  day TEXT,
+  agent TEXT,
+  format TEXT,
+  backend TEXT,
+  fallback_path TEXT,
+  prompt_tokens INTEGER,
+  completion_tokens INTEGER,
+  tokens_estimated INTEGER,
+  latency_ms REAL,
+  cache_status TEXT,
+  outcome TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_calls_day ON llm_calls(day);
+
+-- Posts waiting to be sent. key makes enqueueing idempotent; a row is claimed
+-- (pending -> sending) before the send so two workers never send it twice.
+CREATE TABLE IF NOT EXISTS outbox (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  key TEXT UNIQUE,
+  chat_id TEXT,
+  text TEXT,
+  day TEXT,
+  slot TEXT,
+  guid TEXT,
+  status TEXT DEFAULT 'pending',
+  attempts INTEGER DEFAULT 0,
+  next_attempt_at REAL,
+  tg_message_id INTEGER,
+  error TEXT,
+  created_at TEXT,
+  sent_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at);
+
+-- When the collector should next sample each post's metrics (epoch seconds),
+-- plus the previous sample it derives the interval from.
+CREATE TABLE IF NOT EXISTS metric_schedule (
+  chat_id TEXT,
+  message_id INTEGER,
+  next_sample_at REAL DEFAULT 0,
+  interval_seconds REAL,
+  last_views INTEGER,
+  sampled_at REAL,
+  PRIMARY KEY(chat_id, message_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_metric_schedule_due ON metric_schedule(chat_id, next_sample_at);
+
+-- Telethon input peers by chat id, so the collector doesn't resolve the
+-- channel again on every start. kind is channel|chat|user.
+CREATE TABLE IF NOT EXISTS tg_entities (
+  chat_id TEXT PRIMARY KEY,
+  kind TEXT,
+  peer_id INTEGER,
+  access_hash INTEGER,
+  resolved_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS counters (
+  name TEXT PRIMARY KEY,
+  value REAL DEFAULT 0
+);
+
 CREATE TABLE IF NOT EXISTS settings (
   key TEXT PRIMARY KEY,
   value TEXT
 );
 """
 
+# Columns added after the first release; CREATE TABLE IF NOT EXISTS won't add
+# them to an existing database, so _init() patches them in.
+COLUMNS = [
+    ("queue", "lateness_seconds", "REAL"),
+    ("queue", "publish_ms", "REAL"),
+    ("outbox", "publish_ms", "REAL"),
+    # Rendered message parts (JSON list), written at plan time
+    ("queue", "payload", "TEXT"),
+    ("spares", "payload", "TEXT"),
+    ("outbox", "payload", "TEXT"),
+    ("outbox", "parts_sent", "INTEGER DEFAULT 0"),
+    ("llm_calls", "model_load", "TEXT"),
+    # Snapshot whose metric_reactions rows apply; NULL on rows with reactions_json
+    ("metrics", "reactions_from", "INTEGER"),
+]
+
+
+def _dump_payload(payload: list[str] | None) -> str | None:
+    return json.dumps(payload, ensure_ascii=False) if payload is not None else None
+
+
+def _load_payload(raw: str | None) -> list[str] | None:
+    return json.loads(raw) if raw else None
+
 
 class Storage:
     def __init__(self, db_path: str):
@@ -65,6 +215,10 @@ class Storage:
         con = self._conn()
         cur = con.cursor()
         cur.executescript(SCHEMA)
+        for table, column, decl in COLUMNS:
+            cur.execute(f"PRAGMA table_info({table})")
+            if column not in {r[1] for r in cur.fetchall()}:
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
         con.commit()
         con.close()
 
@@ -237,23 +391,25 @@ class Storage:
         alt_title_1: str,
         alt_title_2: str,
         post_text: str,
+        payload: list[str] | None = None,
     ):
         con = self._conn()
         cur = con.cursor()
         cur.execute(
             """
-            INSERT INTO queue (day, slot, guid, format, alt_title_1, alt_title_2, post_text, status, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, 'planned', datetime('now'))
+            INSERT INTO queue (day, slot, guid, format, alt_title_1, alt_title_2, post_text, payload, status, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'planned', datetime('now'))
             ON CONFLICT(day, slot) DO UPDATE SET
               guid=excluded.guid,
               format=excluded.format,
               alt_title_1=excluded.alt_title_1,
               alt_title_2=excluded.alt_title_2,
               post_text=excluded.post_text,
+              payload=excluded.payload,
               status='planned',
               error=NULL
             """,
-            (day, slot, guid, format, alt_title_1, alt_title_2, post_text),
+            (day, slot, guid, format, alt_title_1, alt_title_2, post_text, _dump_payload(payload)),
         )
         con.commit()
         con.close()
@@ -262,7 +418,8 @@ class Storage:
         con = self._conn()
         cur = con.cursor()
         cur.execute(
-            "SELECT day, slot, guid, format, alt_title_1, alt_title_2, post_text, status FROM queue WHERE day=? AND slot=?",
+            "SELECT day, slot, guid, format, alt_title_1, alt_title_2, post_text, status, payload"
+            " FROM queue WHERE day=? AND slot=?",
             (day, slot),
         )
         row = cur.fetchone()
@@ -278,14 +435,35 @@ class Storage:
             "alt_title_2": row[5],
             "post_text": row[6],
             "status": row[7],
+            "payload": _load_payload(row[8]),
         }
 
-    def mark_queue_posted(self, *, day: str, slot: str, tg_message_id: int):
+    def list_pending_queue_guids(self) -> set[str]:
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute("SELECT guid FROM queue WHERE status='planned' AND guid IS NOT NULL")
+        rows = cur.fetchall()
+        con.close()
+        return {r[0] for r in rows}
+
+    def mark_queue_posted(
+        self,
+        *,
+        day: str,
+        slot: str,
+        tg_message_id: int,
+        lateness_seconds: float | None = None,
+        publish_ms: float | None = None,
+    ):
         con = self._conn()
         cur = con.cursor()
         cur.execute(
-            "UPDATE queue SET status='posted', tg_message_id=?, posted_at=datetime('now') WHERE day=? AND slot=?",
-            (int(tg_message_id), day, slot),
+            """
+            UPDATE queue SET status='posted', tg_message_id=?, posted_at=datetime('now'), lateness_seconds=?,
+                publish_ms=?
+            WHERE day=? AND slot=?
+            """,
+            (int(tg_message_id), lateness_seconds, publish_ms, day, slot),
         )
         con.commit()
         con.close()
@@ -300,6 +478,127 @@ class Storage:
         con.commit()
         con.close()
 
+    # Rows that are still to be sent, by table.
+    _UNSENT = {
+        "queue": "status='planned'",
+        "spares": "used_at IS NULL",
+        "outbox": "status='pending'",
+    }
+
+    def list_missing_payloads(self) -> list[dict]:
+        """Unsent posts saved before payloads were rendered at plan time."""
+        con = self._conn()
+        cur = con.cursor()
+        out = []
+        for table, unsent in self._UNSENT.items():
+            text_col = "text" if table == "outbox" else "post_text"
+            cur.execute(f"SELECT id, guid, {text_col} FROM {table} WHERE {unsent} AND payload IS NULL")
+            out += [{"table": table, "id": r[0], "guid": r[1], "post_text": r[2] or ""} for r in cur.fetchall()]
+        con.close()
+        return out
+
+    def set_payload(self, table: str, row_id: int, *, post_text: str, payload: list[str]):
+        if table not in self._UNSENT:
+            raise ValueError(f"unknown table: {table}")
+        text_col = "text" if table == "outbox" else "post_text"
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            f"UPDATE {table} SET {text_col}=?, payload=? WHERE id=?", (post_text, _dump_payload(payload), int(row_id))
+        )
+        con.commit()
+        con.close()
+
+    # A spare is usable while its item is neither posted nor already queued.
+    _AVAILABLE_SPARES = """
+        FROM spares s JOIN items i ON i.guid = s.guid
+        WHERE s.used_at IS NULL AND i.posted_at IS NULL
+          AND s.guid NOT IN (SELECT guid FROM queue WHERE guid IS NOT NULL)
+    """
+
+    def add_spare(
+        self,
+        *,
+        guid: str,
+        format: str,
+        alt_title_1: str,
+        alt_title_2: str,
+        post_text: str,
+        payload: list[str] | None = None,
+    ):
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            """
+            INSERT INTO spares (guid, format, alt_title_1, alt_title_2, post_text, payload, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
+            ON CONFLICT(guid) DO UPDATE SET
+              format=excluded.format,
+              alt_title_1=excluded.alt_title_1,
+              alt_title_2=excluded.alt_title_2,
+              post_text=excluded.post_text,
+              payload=excluded.payload,
+              created_at=excluded.created_at,
+              used_at=NULL
+            """,
+            (guid, format, alt_title_1, alt_title_2, post_text, _dump_payload(payload)),
+        )
+        con.commit()
+        con.close()
+
+    def count_available_spares(self) -> int:
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute("SELECT COUNT(1) " + self._AVAILABLE_SPARES)
+        n = cur.fetchone()[0]
+        con.close()
+        return int(n)
+
+    def is_used_spare(self, guid: str) -> bool:
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute("SELECT 1 FROM spares WHERE guid=? AND used_at IS NOT NULL", (guid,))
+        row = cur.fetchone()
+        con.close()
+        return row is not None
+
+
+    def list_spare_guids(self) -> set[str]:
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute("SELECT guid FROM spares WHERE used_at IS NULL")
+        rows = cur.fetchall()
+        con.close()
+        return {r[0] for r in rows}
+
+    def take_spare(self):
+        con = self._conn()
+        cur = con.cursor()
+        try:
+            while True:
+                cur.execute(
+                    "SELECT s.id, s.guid, s.format, s.alt_title_1, s.alt_title_2, s.post_text, s.payload "
+                    + self._AVAILABLE_SPARES
+                    + " ORDER BY s.created_at, s.id LIMIT 1"
+                )
+                row = cur.fetchone()
+                if not row:
+                    return None
+                # Claim it; another worker may have taken it in the meantime.
+                cur.execute("UPDATE spares SET used_at=datetime('now') WHERE id=? AND used_at IS NULL", (row[0],))
+                con.commit()
+                if cur.rowcount == 1:
+                    return {
+                        "guid": row[1],
+                        "format": row[2],
+                        "alt_title_1": row[3],
+                        "alt_title_2": row[4],
+                        "post_text": row[5],
+                        "payload": _load_payload(row[6]),
+                    }
+        finally:
+            con.close()
+
     def set_setting(self, key: str, value: str):
         con = self._conn()
         cur = con.cursor()
@@ -318,6 +617,248 @@ class Storage:
         con.close()
         return row[0] if row else default
 
+    OUTBOX_FIELDS = (
+        "id", "key", "chat_id", "text", "day", "slot", "guid", "status", "attempts", "next_attempt_at",
+        "tg_message_id", "error", "payload", "parts_sent",
+    )
+
+    def _outbox_row(self, row) -> dict:
+        out = dict(zip(self.OUTBOX_FIELDS, row))
+        out["payload"] = _load_payload(out["payload"])
+        out["parts_sent"] = int(out["parts_sent"] or 0)
+        return out
+
+    def add_outbox(
+        self,
+        *,
+        key: str,
+        chat_id: str,
+        text: str,
+        payload: list[str],
+        day: str = "",
+        slot: str = "",
+        guid: str = "",
+        now: float,
+    ) -> dict:
+        """Queue a post under key; an existing row with that key is returned unchanged."""
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            """
+            INSERT OR IGNORE INTO outbox (key, chat_id, text, payload, day, slot, guid, next_attempt_at, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))
+            """,
+            (key, chat_id, text, _dump_payload(payload), day, slot, guid, float(now)),
+        )
+        con.commit()
+        con.close()
+        return self.get_outbox(key)
+
+    def get_outbox(self, key: str) -> dict | None:
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(f"SELECT {', '.join(self.OUTBOX_FIELDS)} FROM outbox WHERE key=?", (key,))
+        row = cur.fetchone()
+        con.close()
+        return self._outbox_row(row) if row else None
+
+    def list_due_outbox(self, *, now: float, limit: int = 50) -> list[dict]:
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            f"""
+            SELECT {', '.join(self.OUTBOX_FIELDS)} FROM outbox
+            WHERE status='pending' AND next_attempt_at <= ?
+            ORDER BY next_attempt_at, id
+            LIMIT ?
+            """,
+            (float(now), int(limit)),
+        )
+        rows = cur.fetchall()
+        con.close()
+        return [self._outbox_row(r) for r in rows]
+
+    def list_slot_outbox(self, day: str, slot: str) -> list[dict]:
+        """One row per target of a slot, in the order they were queued."""
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            f"SELECT {', '.join(self.OUTBOX_FIELDS)} FROM outbox WHERE day=? AND slot=? ORDER BY id", (day, slot)
+        )
+        rows = cur.fetchall()
+        con.close()
+        return [self._outbox_row(r) for r in rows]
+
+    def claim_outbox(self, outbox_id: int) -> bool:
+        """pending -> sending; False if another worker got there first."""
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            "UPDATE outbox SET status='sending', attempts=attempts+1 WHERE id=? AND status='pending'", (int(outbox_id),)
+        )
+        claimed = cur.rowcount == 1
+        con.commit()
+        con.close()
+        return claimed
+
+    def outbox_part_sent(self, outbox_id: int, *, parts_sent: int, tg_message_id: int):
+        """Record progress through a multi-part payload; the first part's id is the post's id."""
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            "UPDATE outbox SET parts_sent=?, tg_message_id=COALESCE(tg_message_id, ?) WHERE id=?",
+            (int(parts_sent), int(tg_message_id), int(outbox_id)),
+        )
+        con.commit()
+        con.close()
+
+    def finish_outbox(
+        self,
+        outbox_id: int,
+        *,
+        status: str,
+        tg_message_id: int | None = None,
+        error: str = "",
+        publish_ms: float | None = None,
+    ):
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            """
+            UPDATE outbox SET status=?, tg_message_id=COALESCE(?, tg_message_id), error=?, publish_ms=?,
+                sent_at=CASE WHEN ?='sent' THEN datetime('now') ELSE sent_at END
+            WHERE id=?
+            """,
+            (status, tg_message_id, error, publish_ms, status, int(outbox_id)),
+        )
+        con.commit()
+        con.close()
+
+    def retry_outbox(self, outbox_id: int, *, next_attempt_at: float, error: str, count_attempt: bool = True):
+        """sending -> pending, due again at next_attempt_at."""
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            """
+            UPDATE outbox SET status='pending', next_attempt_at=?, error=?, attempts=attempts-?
+            WHERE id=? AND status='sending'
+            """,
+            (float(next_attempt_at), error, 0 if count_attempt else 1, int(outbox_id)),
+        )
+        con.commit()
+        con.close()
+
+    def rearm_outbox(self, outbox_id: int, *, text: str, payload: list[str], now: float) -> dict | None:
+        """failed -> pending with fresh content and attempts, for a post asked for again."""
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            """
+            UPDATE outbox SET status='pending', text=?, payload=?, attempts=0, parts_sent=0, error=NULL,
+                              next_attempt_at=?
+            WHERE id=? AND status='failed'
+            """,
+            (text, _dump_payload(payload), float(now), int(outbox_id)),
+        )
+        cur.execute(f"SELECT {', '.join(self.OUTBOX_FIELDS)} FROM outbox WHERE id=?", (int(outbox_id),))
+        row = cur.fetchone()
+        con.commit()
+        con.close()
+        return self._outbox_row(row) if row else None
+
+    def rearm_slot_outbox(self, *, day: str, slot: str, guid: str, text: str, payload: list[str], now: float) -> int:
+        """Point a slot's unsent outbox rows (pending or failed) at a replacement post.
+
+        Rows already sent, in flight or 'unknown' are left alone. Returns how
+        many rows will now send the new post.
+        """
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            """
+            UPDATE outbox SET status='pending', guid=?, text=?, payload=?, attempts=0, parts_sent=0, error=NULL,
+                              next_attempt_at=?
+            WHERE day=? AND slot=? AND status IN ('pending', 'failed')
+            """,
+            (guid, text, _dump_payload(payload), float(now), day, slot),
+        )
+        n = cur.rowcount
+        con.commit()
+        con.close()
+        return int(n)
+
+    def abandon_sending_outbox(self) -> list[dict]:
+        """Rows left in 'sending' by a crashed worker: the send may have gone out,
+        so they are parked as 'unknown' instead of being sent again."""
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(f"SELECT {', '.join(self.OUTBOX_FIELDS)} FROM outbox WHERE status='sending'")
+        rows = [self._outbox_row(r) for r in cur.fetchall()]
+        cur.execute(
+            "UPDATE outbox SET status='unknown', error='interrupted during send' WHERE status='sending'"
+        )
+        con.commit()
+        con.close()
+        return rows
+
+    def outbox_target_stats(self, days: int = 7) -> list[dict]:
+        """Per target chat: sends by outcome and average send latency."""
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            """
+            SELECT chat_id,
+                   SUM(CASE WHEN status='sent' THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN status IN ('pending', 'sending') THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN status IN ('failed', 'unknown') THEN 1 ELSE 0 END),
+                   SUM(attempts), AVG(publish_ms)
+            FROM outbox
+            WHERE created_at >= datetime('now', ?)
+            GROUP BY chat_id
+            ORDER BY chat_id
+            """,
+            (f"-{int(days)} day",),
+        )
+        rows = cur.fetchall()
+        con.close()
+        return [
+            {
+                "chat_id": r[0],
+                "sent": int(r[1] or 0),
+                "pending": int(r[2] or 0),
+                "failed": int(r[3] or 0),
+                "attempts": int(r[4] or 0),
+                "avg_publish_ms": round(float(r[5] or 0.0), 1),
+            }
+            for r in rows
+        ]
+
+    def outbox_summary(self) -> dict[str, int]:
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute("SELECT status, COUNT(1) FROM outbox GROUP BY status")
+        out = {status: int(n) for status, n in cur.fetchall()}
+        con.close()
+        return out
+
+    def incr_counters(self, values: dict[str, float]):
+        con = self._conn()
+        cur = con.cursor()
+        cur.executemany(
+            "INSERT INTO counters (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value=value+excluded.value",
+            [(k, float(v)) for k, v in values.items()],
+        )
+        con.commit()
+        con.close()
+
+    def get_counters(self, prefix: str = "") -> dict[str, float]:
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute("SELECT name, value FROM counters WHERE name LIKE ? ORDER BY name", (prefix + "%",))
+        rows = cur.fetchall()
+        con.close()
+        return {r[0]: float(r[1] or 0.0) for r in rows}
+
     def count_items(self):
         con = self._conn()
         cur = con.cursor()
@@ -375,6 +916,33 @@ class Storage:
             "total_posts": total_posts,
             "posts_last_24h": posts_last_24h,
             "top_sources": top_sources,
+            "slot_lateness": self.get_lateness_summary(),
+            # written / skipped (unchanged) snapshots and the bytes the skips saved
+            "snapshots": self.get_counters("metrics.snapshot_"),
+        }
+
+    def get_lateness_summary(self, days: int = 7):
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            """
+            SELECT COUNT(1), AVG(lateness_seconds), MAX(lateness_seconds),
+                   SUM(CASE WHEN lateness_seconds > 60 THEN 1 ELSE 0 END),
+                   AVG(publish_ms), MAX(publish_ms)
+            FROM queue
+            WHERE status='posted' AND lateness_seconds IS NOT NULL AND day >= date('now', ?)
+            """,
+            (f"-{int(days)} day",),
+        )
+        row = cur.fetchone()
+        con.close()
+        return {
+            "posts": int(row[0] or 0),
+            "avg_seconds": round(float(row[1] or 0.0), 1),
+            "max_seconds": round(float(row[2] or 0.0), 1),
+            "late_over_60s": int(row[3] or 0),
+            "avg_publish_ms": round(float(row[4] or 0.0), 1),
+            "max_publish_ms": round(float(row[5] or 0.0), 1),
         }
 
     def add_metric_snapshot(
@@ -386,14 +954,17 @@ class Storage:
         views: int,
         forwards: int,
         replies: int,
-        reactions_json: str,
-    ):
+        reactions: dict[str, int] | None,
+    ) -> int:
+        """Record a post's counters; reactions=None means unchanged since its previous snapshot."""
         con = self._conn()
         cur = con.cursor()
         cur.execute(
             """
-            INSERT INTO metrics (captured_at, chat_id, message_id, views, forwards, replies, reactions_json)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO metrics (captured_at, chat_id, message_id, views, forwards, replies, reactions_from)
+            VALUES (?, ?, ?, ?, ?, ?, (
+              SELECT reactions_from FROM metrics WHERE chat_id=? AND message_id=? ORDER BY id DESC LIMIT 1
+            ))
             """,
             (
                 captured_at,
@@ -402,9 +973,193 @@ class Storage:
                 int(views),
                 int(forwards),
                 int(replies),
-                reactions_json or "{}",
+                str(chat_id),
+                int(message_id),
             ),
         )
+        snapshot_id = int(cur.lastrowid)
+        if reactions is not None:
+            cur.execute("UPDATE metrics SET reactions_from=id WHERE id=?", (snapshot_id,))
+            cur.executemany(
+                "INSERT INTO metric_reactions (snapshot_id, emoji, count) VALUES (?, ?, ?)",
+                [(snapshot_id, emoji, int(count)) for emoji, count in reactions.items()],
+            )
+        con.commit()
+        con.close()
+        return snapshot_id
+
+    def _snapshot_reactions(self, cur, rows) -> dict[int, dict[str, int]]:
+        """Reactions for metrics rows (id, reactions_from, reactions_json), keyed by row id."""
+        wanted = {r[1] for r in rows if r[1] is not None}
+        by_source: dict[int, dict[str, int]] = {sid: {} for sid in wanted}
+        if wanted:
+            marks = ",".join("?" * len(wanted))
+            cur.execute(
+                f"SELECT snapshot_id, emoji, count FROM metric_reactions WHERE snapshot_id IN ({marks})",
+                tuple(wanted),
+            )
+            for sid, emoji, count in cur.fetchall():
+                by_source[int(sid)][emoji] = int(count)
+        out = {}
+        for row_id, source, legacy in rows:
+            # Rows from before metric_reactions kept a JSON object.
+            out[row_id] = dict(by_source[source]) if source is not None else json.loads(legacy or "{}")
+        return out
+
+    def get_last_metric_snapshots(self, *, chat_id: str, message_ids: list[int]) -> dict[int, dict]:
+        """The newest snapshot of each given post, for comparing new samples against."""
+        if not message_ids:
+            return {}
+        con = self._conn()
+        cur = con.cursor()
+        marks = ",".join("?" * len(message_ids))
+        cur.execute(
+            f"""
+            SELECT id, message_id, views, forwards, replies, reactions_from, reactions_json FROM metrics
+            WHERE id IN (
+              SELECT MAX(id) FROM metrics WHERE chat_id=? AND message_id IN ({marks}) GROUP BY message_id
+            )
+            """,
+            (str(chat_id), *[int(m) for m in message_ids]),
+        )
+        rows = cur.fetchall()
+        reactions = self._snapshot_reactions(cur, [(r[0], r[5], r[6]) for r in rows])
+        con.close()
+        return {
+            int(r[1]): {"views": r[2], "forwards": r[3], "replies": r[4], "reactions": reactions[r[0]]} for r in rows
+        }
+
+    def get_metric_series(self, *, chat_id: str, message_id: int) -> list[dict]:
+        """A post's snapshots, oldest first, each with its full reaction counts.
+
+        Snapshots are written only on change, so the value at any sample time
+        is the one of the newest snapshot at or before it.
+        """
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            """
+            SELECT id, captured_at, views, forwards, replies, reactions_from, reactions_json FROM metrics
+            WHERE chat_id=? AND message_id=?
+            ORDER BY id
+            """,
+            (str(chat_id), int(message_id)),
+        )
+        rows = cur.fetchall()
+        reactions = self._snapshot_reactions(cur, [(r[0], r[5], r[6]) for r in rows])
+        con.close()
+        return [
+            {"captured_at": r[1], "views": r[2], "forwards": r[3], "replies": r[4], "reactions": reactions[r[0]]}
+            for r in rows
+        ]
+
+    def schedule_metric_messages(self, *, chat_id: str, message_ids: list[int]) -> int:
+        """Make the schedule follow the recent sent posts: new ones are due at once,
+        ones that left the window are dropped. Returns how many are still sampled."""
+        ids = [int(m) for m in message_ids]
+        con = self._conn()
+        cur = con.cursor()
+        cur.executemany(
+            "INSERT OR IGNORE INTO metric_schedule (chat_id, message_id) VALUES (?, ?)",
+            [(str(chat_id), m) for m in ids],
+        )
+        marks = ",".join("?" * len(ids))
+        cur.execute(
+            f"DELETE FROM metric_schedule WHERE chat_id=? AND message_id NOT IN ({marks})",
+            (str(chat_id), *ids),
+        )
+        cur.execute(
+            "SELECT COUNT(*) FROM metric_schedule WHERE chat_id=? AND next_sample_at IS NOT NULL", (str(chat_id),)
+        )
+        total = int(cur.fetchone()[0])
+        con.commit()
+        con.close()
+        return total
+
+    def list_due_metric_messages(self, *, chat_id: str, now: float, limit: int = 200) -> list[dict]:
+        """Scheduled posts whose next sample is due, most overdue first."""
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            """
+            SELECT message_id, interval_seconds, last_views FROM metric_schedule
+            WHERE chat_id=? AND next_sample_at<=?
+            ORDER BY next_sample_at
+            LIMIT ?
+            """,
+            (str(chat_id), float(now), int(limit)),
+        )
+        rows = cur.fetchall()
+        con.close()
+        return [{"message_id": int(r[0]), "interval_seconds": r[1], "last_views": r[2]} for r in rows]
+
+    def reschedule_metric_messages(self, *, chat_id: str, rows: list[dict], sampled_at: float):
+        """rows: message_id, interval_seconds and views (None if the post wasn't returned).
+
+        A row with interval_seconds None is retired: it keeps its place (so it
+        isn't scheduled again) but is never due.
+        """
+        con = self._conn()
+        cur = con.cursor()
+        cur.executemany(
+            """
+            UPDATE metric_schedule
+            SET next_sample_at=?, interval_seconds=?, last_views=COALESCE(?, last_views), sampled_at=?
+            WHERE chat_id=? AND message_id=?
+            """,
+            [
+                (
+                    float(sampled_at) + float(r["interval_seconds"]) if r["interval_seconds"] is not None else None,
+                    r["interval_seconds"],
+                    r.get("views"),
+                    float(sampled_at),
+                    str(chat_id),
+                    int(r["message_id"]),
+                )
+                for r in rows
+            ],
+        )
+        con.commit()
+        con.close()
+
+    def next_metric_sample_at(self) -> float | None:
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute("SELECT MIN(next_sample_at) FROM metric_schedule")
+        row = cur.fetchone()
+        con.close()
+        return float(row[0]) if row and row[0] is not None else None
+
+    def get_tg_entity(self, chat_id: str) -> dict | None:
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute("SELECT kind, peer_id, access_hash FROM tg_entities WHERE chat_id=?", (str(chat_id),))
+        row = cur.fetchone()
+        con.close()
+        if not row:
+            return None
+        return {"kind": row[0], "peer_id": int(row[1]), "access_hash": int(row[2]) if row[2] is not None else None}
+
+    def save_tg_entity(self, *, chat_id: str, kind: str, peer_id: int, access_hash: int | None):
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            """
+            INSERT INTO tg_entities (chat_id, kind, peer_id, access_hash, resolved_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(chat_id) DO UPDATE SET
+              kind=excluded.kind, peer_id=excluded.peer_id,
+              access_hash=excluded.access_hash, resolved_at=excluded.resolved_at
+            """,
+            (str(chat_id), kind, int(peer_id), access_hash, datetime.utcnow().isoformat()),
+        )
+        con.commit()
+        con.close()
+
+    def delete_tg_entity(self, chat_id: str):
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute("DELETE FROM tg_entities WHERE chat_id=?", (str(chat_id),))
         con.commit()
         con.close()
 
@@ -437,31 +1192,299 @@ class Storage:
         con.close()
         return [int(r[0]) for r in rows if r and r[0] is not None]
 
+    def list_sent_message_ids(self, *, chat_id: str, limit: int = 200, include_legacy: bool = False) -> list[int]:
+        """Message ids of our posts in chat_id, newest first.
+
+        include_legacy adds posts from before the outbox, which only recorded
+        the message id in the (single-target) queue row.
+        """
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            """
+            SELECT tg_message_id, sent_at AS at FROM outbox
+            WHERE chat_id=? AND status='sent' AND tg_message_id IS NOT NULL
+            UNION ALL
+            SELECT q.tg_message_id, q.posted_at AS at FROM queue q
+            WHERE ? AND q.status='posted' AND q.tg_message_id IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM outbox o WHERE o.day=q.day AND o.slot=q.slot)
+            ORDER BY at DESC
+            LIMIT ?
+            """,
+            (str(chat_id), int(include_legacy), int(limit)),
+        )
+        rows = cur.fetchall()
+        con.close()
+        return [int(r[0]) for r in rows]
+
     def get_latest_metrics(self, *, chat_id: str, limit: int = 10):
+        """The current counters of the most recently updated posts in chat_id."""
         con = self._conn()
         cur = con.cursor()
         cur.execute(
             """
-            SELECT message_id, captured_at, views, forwards, replies, reactions_json
+            SELECT id, message_id, captured_at, views, forwards, replies, reactions_from, reactions_json
             FROM metrics
-            WHERE chat_id=?
+            WHERE id IN (SELECT MAX(id) FROM metrics WHERE chat_id=? GROUP BY message_id)
             ORDER BY captured_at DESC
             LIMIT ?
             """,
             (str(chat_id), int(limit)),
         )
         rows = cur.fetchall()
+        reactions = self._snapshot_reactions(cur, [(r[0], r[6], r[7]) for r in rows])
         con.close()
         out = []
         for r in rows:
             out.append(
                 {
-                    "message_id": r[0],
-                    "captured_at": r[1],
-                    "views": r[2],
-                    "forwards": r[3],
-                    "replies": r[4],
-                    "reactions_json": r[5],
+                    "message_id": r[1],
+                    "captured_at": r[2],
+                    "views": r[3],
+                    "forwards": r[4],
+                    "replies": r[5],
+                    "reactions": reactions[r[0]],
                 }
             )
         return out
+
+    def get_queue_guid_by_message_id(self, message_id: int, chat_id: str | None = None) -> str | None:
+        con = self._conn()
+        cur = con.cursor()
+        if chat_id is not None:
+            # Message ids are per chat; the outbox knows which chat each post went to.
+            cur.execute(
+                "SELECT guid FROM outbox WHERE chat_id=? AND tg_message_id=? AND status='sent' LIMIT 1",
+                (str(chat_id), int(message_id)),
+            )
+            row = cur.fetchone()
+            if row:
+                con.close()
+                return row[0]
+        cur.execute("SELECT guid FROM queue WHERE tg_message_id=? ORDER BY posted_at DESC LIMIT 1", (int(message_id),))
+        row = cur.fetchone()
+        con.close()
+        return row[0] if row else None
+
+    def get_post_engagement(self, *, chat_id: str, message_id: int):
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            "SELECT source, bucket, views, forwards, updated_at FROM post_engagement WHERE chat_id=? AND message_id=?",
+            (str(chat_id), int(message_id)),
+        )
+        row = cur.fetchone()
+        con.close()
+        if not row:
+            return None
+        return {"source": row[0], "bucket": row[1], "views": row[2], "forwards": row[3], "updated_at": row[4]}
+
+    def get_engagement_stat(self, kind: str, key: str):
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute("SELECT posts, views, forwards, updated_at FROM engagement_stats WHERE kind=? AND key=?", (kind, key))
+        row = cur.fetchone()
+        con.close()
+        if not row:
+            return None
+        return {"posts": row[0], "views": row[1], "forwards": row[2], "updated_at": row[3]}
+
+    def save_engagement(self, *, post: dict, stats: list[dict]):
+        """Write one post's last-seen counters and the aggregates it touched in one transaction."""
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            """
+            INSERT INTO post_engagement (chat_id, message_id, source, bucket, views, forwards, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(chat_id, message_id) DO UPDATE SET
+              views=excluded.views,
+              forwards=excluded.forwards,
+              updated_at=excluded.updated_at
+            """,
+            (
+                str(post["chat_id"]),
+                int(post["message_id"]),
+                post["source"],
+                post["bucket"],
+                int(post["views"]),
+                int(post["forwards"]),
+                post["updated_at"],
+            ),
+        )
+        cur.executemany(
+            """
+            INSERT INTO engagement_stats (kind, key, posts, views, forwards, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(kind, key) DO UPDATE SET
+              posts=excluded.posts,
+              views=excluded.views,
+              forwards=excluded.forwards,
+              updated_at=excluded.updated_at
+            """,
+            [(st["kind"], st["key"], st["posts"], st["views"], st["forwards"], st["updated_at"]) for st in stats],
+        )
+        con.commit()
+        con.close()
+
+    def list_engagement_stats(self):
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute("SELECT kind, key, posts, views, forwards, updated_at FROM engagement_stats ORDER BY kind, key")
+        rows = cur.fetchall()
+        con.close()
+        return [
+            {"kind": r[0], "key": r[1], "posts": r[2], "views": r[3], "forwards": r[4], "updated_at": r[5]}
+            for r in rows
+        ]
+
+    def cache_get(self, key: str, *, min_created_at: float, now: float):
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute("SELECT response, latency_ms FROM llm_cache WHERE key=? AND created_at >= ?", (key, min_created_at))
+        row = cur.fetchone()
+        if row:
+            cur.execute("UPDATE llm_cache SET hits=hits+1, last_used_at=? WHERE key=?", (now, key))
+            con.commit()
+        con.close()
+        if not row:
+            return None
+        return {"response": row[0], "latency_ms": float(row[1] or 0.0)}
+
+    def cache_put(self, *, key: str, backend: str, model: str, response: str, latency_ms: float, now: float):
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            """
+            INSERT INTO llm_cache (key, backend, model, response, latency_ms, size_bytes, hits, created_at, last_used_at)
+            VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+              response=excluded.response,
+              latency_ms=excluded.latency_ms,
+              size_bytes=excluded.size_bytes,
+              created_at=excluded.created_at,
+              last_used_at=excluded.last_used_at
+            """,
+            (key, backend, model, response, float(latency_ms), len(response.encode("utf-8")), now, now),
+        )
+        con.commit()
+        con.close()
+
+    def cache_evict(self, *, min_created_at: float, max_entries: int, max_bytes: int) -> int:
+        """Drop expired entries, then least recently used ones over the count/size limits."""
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute("DELETE FROM llm_cache WHERE created_at < ?", (min_created_at,))
+        n = cur.rowcount
+        cur.execute(
+            """
+            DELETE FROM llm_cache WHERE key IN (
+              SELECT key FROM llm_cache ORDER BY last_used_at DESC, key LIMIT -1 OFFSET ?
+            )
+            """,
+            (int(max_entries),),
+        )
+        n += cur.rowcount
+        cur.execute(
+            """
+            DELETE FROM llm_cache WHERE key IN (
+              SELECT key FROM (
+                SELECT key, SUM(size_bytes) OVER (ORDER BY last_used_at DESC, key) AS running
+                FROM llm_cache
+              ) WHERE running > ?
+            )
+            """,
+            (int(max_bytes),),
+        )
+        n += cur.rowcount
+        con.commit()
+        con.close()
+        return n
+
+    def cache_summary(self):
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute("SELECT COUNT(1), COALESCE(SUM(size_bytes), 0) FROM llm_cache")
+        row = cur.fetchone()
+        con.close()
+        return {"entries": int(row[0]), "bytes": int(row[1])}
+
+    def add_llm_call(
+        self,
+        *,
+        agent: str,
+        format: str,
+        backend: str,
+        fallback_path: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        tokens_estimated: bool,
+        latency_ms: float,
+        cache_status: str,
+        outcome: str,
+        model_load: str = "",
+    ):
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            """
+            INSERT INTO llm_calls (
+              created_at, day, agent, format, backend, fallback_path, prompt_tokens, completion_tokens,
+              tokens_estimated, latency_ms, cache_status, outcome, model_load
+            )
+            VALUES (datetime('now'), date('now'), ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                agent,
+                format,
+                backend,
+                fallback_path,
+                int(prompt_tokens),
+                int(completion_tokens),
+                1 if tokens_estimated else 0,
+                float(latency_ms),
+                cache_status,
+                outcome,
+                model_load,
+            ),
+        )
+        con.commit()
+        con.close()
+
+    LLM_CALL_GROUPS = ("day", "agent", "format", "backend", "outcome", "model_load")
+
+    def get_llm_call_rollup(self, *, by: str = "day", days: int = 7):
+        if by not in self.LLM_CALL_GROUPS:
+            raise ValueError(f"unknown llm_calls grouping: {by}")
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            f"""
+            SELECT {by}, COUNT(1),
+                   SUM(CASE WHEN outcome IN ('ok', 'fallback') THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN cache_status='hit' THEN 1 ELSE 0 END),
+                   SUM(prompt_tokens), SUM(completion_tokens),
+                   AVG(latency_ms), MAX(latency_ms), SUM(latency_ms)
+            FROM llm_calls
+            WHERE day >= date('now', ?)
+            GROUP BY {by}
+            ORDER BY {by}
+            """,
+            (f"-{int(days)} day",),
+        )
+        rows = cur.fetchall()
+        con.close()
+        return [
+            {
+                by: r[0],
+                "calls": int(r[1]),
+                "ok": int(r[2] or 0),
+                "cache_hits": int(r[3] or 0),
+                "prompt_tokens": int(r[4] or 0),
+                "completion_tokens": int(r[5] or 0),
+                "avg_latency_ms": round(float(r[6] or 0.0), 1),
+                "max_latency_ms": round(float(r[7] or 0.0), 1),
+                "total_seconds": round(float(r[8] or 0.0) / 1000.0, 1),
+            }
+            for r in rows
+        ]
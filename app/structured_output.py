@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import json
+import re
+
+from .storage import Storage
+
+
+# What WriterAgent asks for. Passed to Ollama's `format` and OpenAI's
+# `response_format` so the backend constrains decoding to this shape.
+POST_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "alt_title_1": {"type": "string"},
+        "alt_title_2": {"type": "string"},
+        "post": {"type": "string"},
+    },
+    "required": ["alt_title_1", "alt_title_2", "post"],
+    "additionalProperties": False,
+}
+
+# OpenAI only accepts an object at the top level, so batches are wrapped.
+BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "posts": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"guid": {"type": "string"}, **POST_SCHEMA["properties"]},
+                "required": ["guid", *POST_SCHEMA["required"]],
+                "additionalProperties": False,
+            },
+        }
+    },
+    "required": ["posts"],
+    "additionalProperties": False,
+}
+
+# How a writer answer ended up as a post; the last two are fallbacks.
+WRITER_OUTCOMES = ("valid", "repaired", "freeform", "template")
+
+_KEY_ALIASES = {
+    "title": "alt_title_1",
+    "title_1": "alt_title_1",
+    "alt_title1": "alt_title_1",
+    "title_2": "alt_title_2",
+    "alt_title2": "alt_title_2",
+    "text": "post",
+    "body": "post",
+    "post_text": "post",
+    "content": "post",
+}
+_FENCE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def _close_truncated(s: str) -> str:
+    """Close an unterminated string and any open brackets of a cut-off answer."""
+    stack: list[str] = []
+    in_string = escaped = False
+    for ch in s:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if escaped:
+        s = s[:-1]
+    if in_string:
+        s += '"'
+    s = s.rstrip().rstrip(",")
+    return s + "".join(reversed(stack))
+
+
+def _loads(s: str):
+    # strict=False accepts raw newlines inside strings, which models emit a lot.
+    return json.loads(s, strict=False)
+
+
+def parse_json(raw: str) -> tuple[object | None, bool]:
+    """Parse a model's JSON answer; returns (value, repaired) or (None, False)."""
+    s = (raw or "").strip()
+    if not s:
+        return None, False
+    try:
+        return json.loads(s), False
+    except ValueError:
+        pass
+
+    s = _FENCE.sub("", s).strip()
+    starts = [i for i in (s.find("{"), s.find("[")) if i != -1]
+    if not starts:
+        return None, False
+    s = s[min(starts) :]
+    candidates = [s]
+    end = max(s.rfind("}"), s.rfind("]"))
+    if end != -1:
+        candidates.insert(0, s[: end + 1])
+    for c in candidates:
+        for attempt in (c, _TRAILING_COMMA.sub(r"\1", c), _close_truncated(_TRAILING_COMMA.sub(r"\1", c))):
+            try:
+                return _loads(attempt), True
+            except ValueError:
+                continue
+    return None, False
+
+
+def normalize_post(obj: object) -> tuple[dict | None, bool]:
+    """Coerce a parsed object to the POST_SCHEMA fields; returns (post, changed)."""
+    if not isinstance(obj, dict):
+        return None, False
+    out: dict[str, str] = {}
+    changed = False
+    for key, value in obj.items():
+        name = str(key).strip().lower()
+        name = _KEY_ALIASES.get(name, name)
+        if name not in POST_SCHEMA["properties"] and name != "guid":
+            changed = True
+            continue
+        if name != key:
+            changed = True
+        if value is None:
+            value = ""
+        if not isinstance(value, str):
+            value = "\n".join(map(str, value)) if isinstance(value, list) else str(value)
+            changed = True
+        out.setdefault(name, value.strip())
+    if not out.get("post"):
+        return None, changed
+    return out, changed or any(not out.get(k) for k in POST_SCHEMA["required"])
+
+
+def parse_post(raw: str) -> tuple[dict | None, str]:
+    """Parse a single writer answer; status is "valid", "repaired" or "invalid"."""
+    value, repaired = parse_json(raw)
+    if isinstance(value, dict) and "post" not in value:
+        # {"result": {...}} and similar one-level wrappers
+        inner = [v for v in value.values() if isinstance(v, dict)]
+        if len(inner) == 1:
+            value, repaired = inner[0], True
+    post, changed = normalize_post(value)
+    if post is None:
+        return None, "invalid"
+    return post, "repaired" if repaired or changed else "valid"
+
+
+def parse_post_list(raw: str) -> list:
+    """Items of a batch answer, whether wrapped as {"posts": [...]} or a bare array."""
+    value, _ = parse_json(raw)
+    if isinstance(value, dict):
+        value = value.get("posts", next((v for v in value.values() if isinstance(v, list)), None))
+    return value if isinstance(value, list) else []
+
+
+def writer_output_stats(storage: Storage) -> dict:
+    counts = storage.get_counters("writer.")
+    out = {k: int(counts.get(f"writer.{k}", 0)) for k in WRITER_OUTCOMES}
+    total = sum(out.values())
+    out["fallback_rate"] = round((out["freeform"] + out["template"]) / total, 3) if total else 0.0
+    return out
@@ -1,13 +1,18 @@
 from __future__ import annotations
 
 import asyncio
-import json
+import time
 from datetime import datetime, timezone
 
-from telethon import TelegramClient
-from telethon.tl.types import PeerChannel, PeerChat, PeerUser
+from telethon import TelegramClient, utils
+from telethon.errors import RPCError
+from telethon.tl.types import InputPeerChannel, InputPeerChat, InputPeerUser, PeerChannel, PeerChat, PeerUser
 
-from .config import load_config
+from .config import Config, load_config
+from .engagement import EngagementAggregator
+from .publisher import publish_targets
+from .sampling import next_sample_interval
+from .snapshots import SnapshotRecorder
 from .storage import Storage
 
 
@@ -15,37 +20,30 @@ def _now_utc_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def _reactions_to_json(message) -> str:
+def _reaction_key(reaction) -> str:
+    emoticon = getattr(reaction, "emoticon", None)
+    if emoticon:
+        return emoticon
+    document_id = getattr(reaction, "document_id", None)
+    if document_id:
+        return f"custom:{document_id}"
+    if type(reaction).__name__ == "ReactionPaid":
+        return "paid"
+    return str(reaction)
+
+
+def _reactions(message) -> dict[str, int]:
     # message.reactions can be None
     try:
         r = message.reactions
         if not r or not getattr(r, "results", None):
-            return "{}"
-        out = {}
-        for x in r.results:
-            # x.reaction is a Reaction object; stringify best-effort
-            key = str(getattr(x, "reaction", "reaction"))
-            out[key] = int(getattr(x, "count", 0) or 0)
-        return json.dumps(out, ensure_ascii=False)
+            return {}
+        return {_reaction_key(getattr(x, "reaction", None)): int(getattr(x, "count", 0) or 0) for x in r.results}
     except Exception:
-        return "{}"
-
-
-async def collect_once(*, storage: Storage) -> tuple[bool, str]:
-    cfg = load_config()
-    if not cfg.telethon_api_id or not cfg.telethon_api_hash:
-        return False, "TELETHON_API_ID/TELETHON_API_HASH missing"
+        return {}
 
-    chat_id = storage.get_setting("target_chat_id", "").strip() or cfg.target_chat_id
-    if not chat_id:
-        return False, "target_chat_id not set"
-
-    msg_ids = storage.list_recent_posted_message_ids(limit=200)
 
-    client = TelegramClient(cfg.telethon_session, cfg.telethon_api_id, cfg.telethon_api_hash)
-    await client.start()  # first run will ask for phone/code in console
-
-    entity = None
+async def _resolve_entity(client: TelegramClient, chat_id: str):
     # Robust entity resolution:
     # - channel ids often come as -100xxxxxxxxxx (Bot API format)
     # - Telethon expects PeerChannel(channel_id) where channel_id is without -100
@@ -54,31 +52,152 @@ async def collect_once(*, storage: Storage) -> tuple[bool, str]:
         if s.startswith("@"):
             s = s[1:]
         if s.startswith("-100") and s[4:].isdigit():
-            entity = await client.get_entity(PeerChannel(int(s[4:])))
-        elif s.lstrip("-").isdigit():
+            return await client.get_entity(PeerChannel(int(s[4:])))
+        if s.lstrip("-").isdigit():
             n = int(s)
             if n < 0 and str(n).startswith("-100"):
-                entity = await client.get_entity(PeerChannel(int(str(n)[4:])))
-            else:
-                # fallback: try as-is
-                entity = await client.get_entity(n)
-        else:
-            entity = await client.get_entity(s)
+                return await client.get_entity(PeerChannel(int(str(n)[4:])))
+            # fallback: try as-is
+            return await client.get_entity(n)
+        return await client.get_entity(s)
     except Exception:
-        entity = None
+        return None
+
+
+def _peer_to_row(peer) -> dict | None:
+    if isinstance(peer, InputPeerChannel):
+        return {"kind": "channel", "peer_id": peer.channel_id, "access_hash": peer.access_hash}
+    if isinstance(peer, InputPeerUser):
+        return {"kind": "user", "peer_id": peer.user_id, "access_hash": peer.access_hash}
+    if isinstance(peer, InputPeerChat):
+        return {"kind": "chat", "peer_id": peer.chat_id, "access_hash": None}
+    return None
+
+
+def _row_to_peer(row: dict):
+    if row["kind"] == "channel":
+        return InputPeerChannel(row["peer_id"], row["access_hash"])
+    if row["kind"] == "user":
+        return InputPeerUser(row["peer_id"], row["access_hash"])
+    if row["kind"] == "chat":
+        return InputPeerChat(row["peer_id"])
+    return None
+
+
+class CollectorSession:
+    """One Telethon client kept connected across collection cycles.
+
+    The MTProto handshake happens once; after a dropped connection the next
+    cycle reconnects. Resolved chats are kept as input peers in memory and in
+    the tg_entities table, so get_messages needs no lookup round-trip.
+    """
+
+    def __init__(self, cfg: Config, storage: Storage, *, client_factory=None):
+        self.cfg = cfg
+        self.storage = storage
+        self._client_factory = client_factory or self._make_client
+        self._client = None
+        self._peers: dict[str, object] = {}
+        self.snapshots = SnapshotRecorder(storage)
+        self.stats = {"connects": 0, "reconnects": 0, "peer_hits": 0, "peer_db_hits": 0, "resolves": 0}
+
+    def _make_client(self) -> TelegramClient:
+        return TelegramClient(
+            self.cfg.telethon_session,
+            self.cfg.telethon_api_id,
+            self.cfg.telethon_api_hash,
+            auto_reconnect=True,
+            connection_retries=5,
+            retry_delay=2,
+        )
+
+    async def client(self) -> TelegramClient:
+        if self._client is None:
+            self._client = self._client_factory()
+            await self._client.start()  # first run will ask for phone/code in console
+            self.stats["connects"] += 1
+        elif not self._client.is_connected():
+            await self._client.connect()
+            self.stats["reconnects"] += 1
+        return self._client
+
+    async def peer(self, chat_id: str):
+        """The input peer for chat_id: memory, then DB, then a network lookup."""
+        key = str(chat_id)
+        if key in self._peers:
+            self.stats["peer_hits"] += 1
+            return self._peers[key]
+        row = self.storage.get_tg_entity(key)
+        peer = _row_to_peer(row) if row else None
+        if peer is not None:
+            self.stats["peer_db_hits"] += 1
+        else:
+            entity = await _resolve_entity(await self.client(), key)
+            if not entity:
+                return None
+            self.stats["resolves"] += 1
+            peer = utils.get_input_peer(entity)
+            saved = _peer_to_row(peer)
+            if saved:
+                self.storage.save_tg_entity(chat_id=key, **saved)
+        self._peers[key] = peer
+        return peer
+
+    def forget(self, chat_id: str):
+        """Drop a cached peer, e.g. after the channel's access hash stopped working."""
+        self._peers.pop(str(chat_id), None)
+        self.storage.delete_tg_entity(str(chat_id))
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.disconnect()
+            self._client = None
+
+
+async def _fetch_messages(session: CollectorSession, *, cfg, chat_id: str, msg_ids: list[int]):
+    peer = await session.peer(chat_id)
+    if peer is None:
+        return None
+    client = await session.client()
+    # If there is no queue history yet (e.g. bot was just installed),
+    # collect metrics for the most recent posts in the channel.
+    query = {"ids": msg_ids} if msg_ids else {"limit": max(5, int(cfg.metrics_recent_limit))}
+    try:
+        return await client.get_messages(peer, **query)
+    except RPCError:
+        # A cached peer can go stale (channel re-created, hash changed): resolve once more.
+        session.forget(chat_id)
+        peer = await session.peer(chat_id)
+        if peer is None:
+            return None
+        return await client.get_messages(peer, **query)
+
 
-    if not entity:
-        await client.disconnect()
+async def _collect_chat(session: CollectorSession, *, storage: Storage, cfg, chat_id: str, primary: bool) -> tuple[bool, str]:
+    # Message ids are per chat: each target has its own, recorded by the outbox.
+    sent_ids = storage.list_sent_message_ids(chat_id=chat_id, limit=200, include_legacy=primary)
+    scheduled = storage.schedule_metric_messages(chat_id=chat_id, message_ids=sent_ids)
+    # Only the posts whose own sampling time has come are fetched this cycle.
+    now = time.time()
+    due = storage.list_due_metric_messages(chat_id=chat_id, now=now, limit=200)
+    if scheduled and not due:
+        return True, f"mode=by_queue due=0/{scheduled}"
+    msg_ids = [d["message_id"] for d in due]
+
+    try:
+        msgs = await _fetch_messages(session, cfg=cfg, chat_id=chat_id, msg_ids=msg_ids)
+    except RPCError as e:
+        # Still failing after a fresh resolve (kicked, channel private or gone):
+        # report this target and let the others be collected.
+        return False, f"fetch failed for {chat_id}: {e.__class__.__name__}"
+    if msgs is None:
         return False, f"cannot resolve entity for {chat_id} (try @username)"
 
     captured_at = _now_utc_iso()
-    if msg_ids:
-        msgs = await client.get_messages(entity, ids=msg_ids)
-    else:
-        # If there is no queue history yet (e.g. bot was just installed),
-        # collect metrics for the most recent posts in the channel.
-        msgs = await client.get_messages(entity, limit=max(5, int(cfg.metrics_recent_limit)))
+    engagement = EngagementAggregator(storage, half_life_days=cfg.engagement_half_life_days)
     count = 0
+    sampled: dict[int, tuple[int, datetime | None]] = {}
+    session.snapshots.prime(chat_id, [m.id for m in msgs if m])
     for m in msgs:
         if not m:
             continue
@@ -96,32 +215,110 @@ async def collect_once(*, storage: Storage) -> tuple[bool, str]:
                 replies = int(m.replies.replies or 0)
         except Exception:
             replies = 0
-        reactions_json = _reactions_to_json(m)
-
-        storage.add_metric_snapshot(
+        # Unchanged samples are not stored; the series carries the last value forward.
+        session.snapshots.record(
             chat_id=str(chat_id),
             message_id=int(m.id),
             captured_at=captured_at,
             views=views,
             forwards=forwards,
             replies=replies,
-            reactions_json=reactions_json,
+            reactions=_reactions(m),
+        )
+        engagement.observe(
+            chat_id=str(chat_id),
+            message_id=int(m.id),
+            captured_at=captured_at,
+            views=views,
+            forwards=forwards,
         )
+        sampled[int(m.id)] = (views, getattr(m, "date", None))
         count += 1
 
-    await client.disconnect()
+    if due:
+        _reschedule(storage, cfg, chat_id=chat_id, due=due, sampled=sampled, now=now)
+    written = session.snapshots.flush_stats()["written"]
     if count == 0:
         return False, "no messages collected"
-    mode = "by_queue" if msg_ids else "recent"
-    return True, f"mode={mode} snapshots={count}"
+    if msg_ids:
+        return True, f"mode=by_queue due={len(due)}/{scheduled} snapshots={count} changed={written}"
+    return True, f"mode=recent snapshots={count} changed={written}"
+
+
+def _reschedule(storage: Storage, cfg, *, chat_id: str, due: list[dict], sampled: dict, now: float):
+    rows = []
+    for d in due:
+        views, date = sampled.get(d["message_id"], (None, None))
+        age = now - date.timestamp() if date else 0.0
+        if views is None:
+            # Deleted or not returned: check back rarely.
+            interval = float(cfg.metrics_max_sample_seconds)
+        elif age > cfg.metrics_max_age_days * 86400:
+            # Old enough that its numbers have settled: retire it.
+            interval = None
+        else:
+            interval = next_sample_interval(
+                age_seconds=age,
+                views=views,
+                prev_views=d["last_views"],
+                prev_interval=d["interval_seconds"],
+                min_seconds=cfg.metrics_min_sample_seconds,
+                max_seconds=cfg.metrics_max_sample_seconds,
+            )
+        rows.append({"message_id": d["message_id"], "interval_seconds": interval, "views": views})
+    storage.reschedule_metric_messages(chat_id=chat_id, rows=rows, sampled_at=now)
+
+
+def _sleep_seconds(cfg, storage: Storage) -> float:
+    """Until the next post is due, but at most the collect interval (new posts get picked up)."""
+    wait = float(max(60, int(cfg.collect_interval_seconds)))
+    next_at = storage.next_metric_sample_at()
+    if next_at is not None:
+        wait = min(wait, next_at - time.time())
+    return max(60.0, wait)
+
+
+async def collect_once(*, storage: Storage, session: CollectorSession | None = None) -> tuple[bool, str]:
+    """One collection cycle. Without a session, connects for this cycle only."""
+    cfg = session.cfg if session else load_config()
+    if not cfg.telethon_api_id or not cfg.telethon_api_hash:
+        return False, "TELETHON_API_ID/TELETHON_API_HASH missing"
+
+    targets = publish_targets(storage, cfg)
+    if not targets:
+        return False, "target_chat_id not set"
+
+    own = session is None
+    session = session or CollectorSession(cfg, storage)
+    results = []
+    try:
+        for i, chat_id in enumerate(targets):
+            # Posts from before multi-target publishing only went to the first target.
+            ok, info = await _collect_chat(session, storage=storage, cfg=cfg, chat_id=chat_id, primary=i == 0)
+            results.append((chat_id, ok, info))
+    finally:
+        if own:
+            await session.close()
+
+    if len(results) == 1:
+        return results[0][1], results[0][2]
+    return any(ok for _, ok, _ in results), "; ".join(f"{chat}: {info}" for chat, _, info in results)
 
 
 async def run_loop(*, storage: Storage):
     cfg = load_config()
-    while True:
-        ok, info = await collect_once(storage=storage)
-        print(f"collector: ok={ok} info={info}")
-        await asyncio.sleep(max(60, int(cfg.collect_interval_seconds)))
+    session = CollectorSession(cfg, storage)
+    try:
+        while True:
+            try:
+                ok, info = await collect_once(storage=storage, session=session)
+            except (ConnectionError, OSError) as e:
+                # The client reconnects at the start of the next cycle.
+                ok, info = False, f"connection error: {e}"
+            print(f"collector: ok={ok} info={info} session={session.stats}")
+            await asyncio.sleep(_sleep_seconds(cfg, storage))
+    finally:
+        await session.close()
 
 
 def main():
@@ -0,0 +1,32 @@
+import dataclasses
+
+from app.config import Config
+
+
+def make_cfg(**overrides) -> Config:
+    """A Config for tests: no feeds, no LLM backends, no target; override what a test needs."""
+    cfg = Config(
+        telegram_bot_token="123:test",
+        app_mode="bot",
+        dashboard_port=18080,
+        timezone="UTC",
+        target_chat_id="",
+        post_times=["09:00", "12:00", "00:00"],
+        max_posts_per_day=3,
+        rss_feeds=[],
+        lang="ru",
+        db_path=":memory:",
+        ollama_base_url="",
+        ollama_model="",
+        openai_api_key="",
+        openai_model="gpt-3.5-turbo",
+        llm_timeout_seconds=5,
+        prefer_ollama=True,
+        enable_review=False,
+        telethon_api_id=0,
+        telethon_api_hash="",
+        telethon_session="test",
+        collect_interval_seconds=600,
+        metrics_recent_limit=10,
+    )
+    return dataclasses.replace(cfg, **overrides)
@@ -0,0 +1,57 @@
+import unittest
+
+from app.agents import WriterAgent
+from app.deadline import Deadline
+from app.llm import LLM, Completion
+
+
+def make_llm(reply):
+    llm = LLM(ollama_base_url="http://ollama", ollama_model="m", openai_api_key="", openai_model="")
+    llm._ollama_request = lambda **kw: Completion(text=reply, backend="ollama")
+    return llm
+
+
+ITEM = dict(title="T", source="example.com", link="https://e.x/1", summary="S", format="breaking_news", lang="ru")
+
+
+class TestAgents(unittest.TestCase):
+    def test_writer_parses_json(self) -> None:
+        llm = make_llm('{"alt_title_1": "A1", "alt_title_2": "A2", "post": "Body"}')
+        p = WriterAgent(llm).write(**ITEM)
+        self.assertEqual((p.alt_title_1, p.alt_title_2, p.post_text), ("A1", "A2", "Body"))
+
+    def test_expired_deadline_falls_back_to_template_without_a_call(self) -> None:
+        llm = make_llm('{"alt_title_1": "A1", "alt_title_2": "A2", "post": "Body"}')
+        calls = []
+        llm._ollama_request = lambda **kw: calls.append(kw)
+        writer = WriterAgent(llm)
+        p = writer.write(**ITEM, deadline=Deadline.after(0))
+        self.assertEqual(calls, [])
+        self.assertEqual(writer.outcomes["template"], 1)
+        self.assertIn("https://e.x/1", p.post_text)
+
+    def test_write_batch_retries_only_failed_items(self) -> None:
+        llm = LLM(ollama_base_url="http://ollama", ollama_model="m", openai_api_key="", openai_model="")
+        prompts = []
+
+        def fake(**kw):
+            prompts.append(kw["prompt"])
+            if len(prompts) == 1:
+                return '[{"guid": "a", "alt_title_1": "A", "post": "Post A"}, {"guid": "b", "post": ""}]'
+            return '{"alt_title_1": "B1", "post": "Post B"}'
+
+        llm._ollama_request = lambda **kw: Completion(text=fake(**kw), backend="ollama")
+        items = [
+            {**ITEM, "guid": "a"},
+            {**ITEM, "guid": "b", "title": "TB"},
+        ]
+        out = WriterAgent(llm).write_batch(items=items, lang="ru")
+        self.assertEqual(len(prompts), 2)
+        self.assertIn("guid: b", prompts[0])
+        self.assertEqual(out["a"].post_text, "Post A")
+        self.assertEqual(out["b"].post_text, "Post B")
+        self.assertEqual(out["b"].alt_title_1, "B1")
+
+
+if __name__ == "__main__":
+    unittest.main()
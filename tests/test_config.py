@@ -1,6 +1,8 @@
+import os
 import unittest
+from unittest import mock
 
-from app.config import _safe_int, _validate_hhmm
+from app.config import _safe_float, _safe_int, _validate_hhmm, load_config, parse_hhmm
 
 
 class TestConfig(unittest.TestCase):
@@ -8,10 +10,26 @@ class TestConfig(unittest.TestCase):
         got = _validate_hhmm(["09:00", "9:aa", "25:00", "18:30", "xx", "00:00"])
         self.assertEqual(got, ["09:00", "18:30", "00:00"])
 
+    def test_parse_hhmm_pads_and_rejects(self) -> None:
+        self.assertEqual(parse_hhmm(" 9:05 "), "09:05")
+        self.assertIsNone(parse_hhmm("24:00"))
+        self.assertIsNone(parse_hhmm("12"))
+
     def test_safe_int_fallback(self) -> None:
         self.assertEqual(_safe_int("12", 6), 12)
         self.assertEqual(_safe_int("abc", 6), 6)
 
+    def test_safe_float_fallback(self) -> None:
+        self.assertEqual(_safe_float("3.5", 14.0), 3.5)
+        self.assertEqual(_safe_float("abc", 14.0), 14.0)
+        self.assertEqual(_safe_float("nan", 14.0), 14.0)
+
+    def test_fractional_half_life_is_kept(self) -> None:
+        with mock.patch.dict(os.environ, {"TELEGRAM_BOT_TOKEN": "t", "ENGAGEMENT_HALF_LIFE_DAYS": "3.5"}):
+            self.assertEqual(load_config().engagement_half_life_days, 3.5)
+        with mock.patch.dict(os.environ, {"TELEGRAM_BOT_TOKEN": "t", "ENGAGEMENT_HALF_LIFE_DAYS": "0.2"}):
+            self.assertEqual(load_config().engagement_half_life_days, 1.0)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -4,12 +4,16 @@ import threading
 import time
 import unittest
 import urllib.parse
+import urllib.error
 import urllib.request
+from unittest import mock
 
-from app.config import Config
+from app import dashboard
 from app.dashboard import create_dashboard_server
 from app.storage import Storage
 
+from conftest import make_cfg
+
 
 class TestDashboard(unittest.TestCase):
     @classmethod
@@ -17,29 +21,14 @@ class TestDashboard(unittest.TestCase):
         cls.tmp = tempfile.TemporaryDirectory()
         cls.db_path = cls.tmp.name + "/test.db"
         cls.storage = Storage(cls.db_path)
-        cls.cfg = Config(
-            telegram_bot_token="123:test",
+        cls.cfg = make_cfg(
             app_mode="dashboard",
-            dashboard_port=18080,
-            timezone="UTC",
-            target_chat_id="",
             post_times=["09:00"],
             max_posts_per_day=1,
             rss_feeds=["https://example.com/rss"],
-            lang="ru",
             db_path=cls.db_path,
             ollama_base_url="http://localhost:11434",
             ollama_model="llama3.1:8b",
-            openai_api_key="",
-            openai_model="gpt-3.5-turbo",
-            llm_timeout_seconds=5,
-            prefer_ollama=True,
-            enable_review=False,
-            telethon_api_id=0,
-            telethon_api_hash="",
-            telethon_session="test",
-            collect_interval_seconds=600,
-            metrics_recent_limit=10,
         )
         cls.server = create_dashboard_server(cfg=cls.cfg, storage=cls.storage, host="127.0.0.1", port=18080)
         cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
@@ -50,6 +39,7 @@ class TestDashboard(unittest.TestCase):
     def tearDownClass(cls) -> None:
         try:
             cls.server.shutdown()
+            cls.server.jobs.shutdown()
             cls.server.server_close()
         finally:
             cls.tmp.cleanup()
@@ -78,6 +68,43 @@ class TestDashboard(unittest.TestCase):
 
         self.assertEqual(self.storage.get_setting("target_chat_id", ""), "777")
 
+    def test_post_now_returns_job_and_reports_result(self) -> None:
+        self.storage.set_setting("target_chat_id", "@a,@b")
+        release = threading.Event()
+
+        async def fake_post_one(*, storage, targets, cfg, progress):
+            progress("sending")
+            release.wait(3)
+            return True, f"sent to {','.join(targets)}"
+
+        req = urllib.request.Request("http://127.0.0.1:18080/post-now", data=b"", method="POST")
+        with mock.patch.object(dashboard, "post_one", fake_post_one):
+            t0 = time.perf_counter()
+            with urllib.request.urlopen(req, timeout=3) as resp:
+                self.assertEqual(resp.status, 202)
+                job_url = resp.headers["Location"]
+                first = json.loads(resp.read().decode("utf-8"))
+            self.assertLess(time.perf_counter() - t0, 1.0)
+            # A second click while the first is running gets the same job.
+            with urllib.request.urlopen(req, timeout=3) as resp:
+                second = json.loads(resp.read().decode("utf-8"))
+            self.assertEqual((second["job_id"], second["created"]), (first["job_id"], False))
+
+            release.set()
+            for _ in range(50):
+                with urllib.request.urlopen("http://127.0.0.1:18080" + job_url, timeout=3) as resp:
+                    job = json.loads(resp.read().decode("utf-8"))
+                if job["status"] == "done":
+                    break
+                time.sleep(0.05)
+        self.assertEqual(job["progress"], "sending")
+        self.assertEqual(job["result"], {"ok": True, "info": "sent to @a,@b"})
+
+    def test_unknown_job_is_404(self) -> None:
+        with self.assertRaises(urllib.error.HTTPError) as ctx:
+            urllib.request.urlopen("http://127.0.0.1:18080/api/jobs/nope", timeout=3)
+        self.assertEqual(ctx.exception.code, 404)
+
 
 if __name__ == "__main__":
     unittest.main()
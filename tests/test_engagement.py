@@ -0,0 +1,54 @@
+import tempfile
+import unittest
+
+from app.engagement import EngagementAggregator, decay_factor, load_weights
+from app.news import score_item
+from app.storage import Storage
+
+
+class TestEngagement(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = Storage(self.tmp.name + "/test.db")
+        self.agg = EngagementAggregator(self.storage, half_life_days=1)
+        for i, (source, title) in enumerate([("a.com", "New agent"), ("b.com", "Paper on arxiv")]):
+            guid = f"g{i}"
+            self.storage.upsert_item(guid=guid, source=source, title=title, link="", published="", summary="")
+            self.storage.upsert_queue_slot(
+                day="2026-01-01", slot=f"0{i}:00", guid=guid, format="f", alt_title_1="", alt_title_2="", post_text="x"
+            )
+            self.storage.mark_queue_posted(day="2026-01-01", slot=f"0{i}:00", tg_message_id=100 + i)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_decay_factor_halves_per_half_life(self) -> None:
+        self.assertAlmostEqual(decay_factor(3600, 3600), 0.5)
+        self.assertEqual(decay_factor(-5, 3600), 1.0)
+
+    def test_observe_adds_only_deltas(self) -> None:
+        ts = "2026-01-01T00:00:00+00:00"
+        self.assertTrue(self.agg.observe(chat_id="c", message_id=100, captured_at=ts, views=100, forwards=1))
+        self.assertFalse(self.agg.observe(chat_id="c", message_id=100, captured_at=ts, views=100, forwards=1))
+        self.agg.observe(chat_id="c", message_id=100, captured_at=ts, views=150, forwards=1)
+        stat = self.storage.get_engagement_stat("source", "a.com")
+        self.assertEqual(stat["posts"], 1.0)
+        self.assertEqual(stat["views"], 150.0)
+        self.assertIsNotNone(self.storage.get_engagement_stat("bucket", "agents"))
+
+    def test_unknown_messages_are_ignored(self) -> None:
+        self.assertFalse(self.agg.observe(chat_id="c", message_id=999, captured_at="", views=5, forwards=0))
+
+    def test_weights_favor_better_sources(self) -> None:
+        ts = "2026-01-01T00:00:00+00:00"
+        self.agg.observe(chat_id="c", message_id=100, captured_at=ts, views=4000, forwards=0)
+        self.agg.observe(chat_id="c", message_id=101, captured_at=ts, views=100, forwards=0)
+        w = load_weights(self.storage)
+        self.assertGreater(w.source("a.com"), w.source("b.com"))
+        self.assertIsNone(w.source("c.com"))
+        base = score_item(title="x", summary="", source="a.com")
+        self.assertEqual(score_item(title="x", summary="", source="a.com", weights=w), base + w.source("a.com"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.deadline import Deadline
+from app.http_transport import Transport, _retry_after_seconds
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    throttle = 0
+
+    def do_POST(self):  # noqa: N802
+        self.rfile.read(int(self.headers.get("Content-Length", "0")))
+        if type(self).throttle > 0:
+            type(self).throttle -= 1
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps({"ok": True}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # noqa: A003
+        return
+
+
+class TestTransport(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/api"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_connections_are_reused(self) -> None:
+        t = Transport("test", read_timeout=3)
+        for _ in range(3):
+            self.assertEqual(t.post(self.url, json={}).json(), {"ok": True})
+        stats = t.stats()
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["connections_opened"], 1)
+        self.assertEqual(stats["connections_reused"], 2)
+
+    def test_retries_after_429(self) -> None:
+        _Handler.throttle = 1
+        t = Transport("test", read_timeout=3, max_retries=2)
+        self.assertEqual(t.post(self.url, json={}).status_code, 200)
+        self.assertEqual(t.stats()["retries"], 1)
+
+    def test_gives_up_after_max_retries(self) -> None:
+        _Handler.throttle = 5
+        t = Transport("test", read_timeout=3, max_retries=1)
+        self.assertEqual(t.post(self.url, json={}).status_code, 429)
+        _Handler.throttle = 0
+
+    def test_expired_deadline_sends_nothing(self) -> None:
+        t = Transport("test", read_timeout=3)
+        self.assertIsNone(t.post(self.url, json={}, deadline=Deadline.after(0)))
+        self.assertEqual(t.stats()["requests"], 0)
+
+    def test_retry_after_parsing(self) -> None:
+        self.assertEqual(_retry_after_seconds("2"), 2.0)
+        self.assertEqual(_retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+        self.assertIsNone(_retry_after_seconds("soon"))
+
+
+if __name__ == "__main__":
+    unittest.main()
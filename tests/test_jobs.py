@@ -0,0 +1,57 @@
+import threading
+import time
+import unittest
+
+from app.jobs import JobRunner
+
+
+def wait_for(runner: JobRunner, job_id: str):
+    for _ in range(100):
+        job = runner.get(job_id)
+        if job.status in ("done", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+class TestJobRunner(unittest.TestCase):
+    def setUp(self) -> None:
+        self.runner = JobRunner(max_workers=2, keep=3)
+
+    def tearDown(self) -> None:
+        self.runner.shutdown()
+
+    def test_failure_is_recorded_on_the_job(self) -> None:
+        def boom(report):
+            report("working")
+            raise RuntimeError("LLM down")
+
+        job, _ = self.runner.submit("x", boom)
+        job = wait_for(self.runner, job.id)
+        self.assertEqual((job.status, job.progress, job.error), ("failed", "working", "LLM down"))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_same_key_reuses_the_running_job_until_it_finishes(self) -> None:
+        gate = threading.Event()
+        first, created = self.runner.submit("x", lambda report: gate.wait(3) and {"n": 1}, key="k")
+        again, created_again = self.runner.submit("x", lambda report: {"n": 2}, key="k")
+        self.assertTrue(created)
+        self.assertEqual((again.id, created_again), (first.id, False))
+        gate.set()
+        self.assertEqual(wait_for(self.runner, first.id).result, {"n": 1})
+        later, created_later = self.runner.submit("x", lambda report: {"n": 3}, key="k")
+        self.assertTrue(created_later)
+        self.assertEqual(wait_for(self.runner, later.id).result, {"n": 3})
+
+    def test_keeps_only_recent_finished_jobs(self) -> None:
+        ids = []
+        for i in range(5):
+            job, _ = self.runner.submit("x", lambda report, i=i: {"i": i})
+            wait_for(self.runner, job.id)
+            ids.append(job.id)
+        self.assertIsNone(self.runner.get(ids[0]))
+        self.assertEqual([j.id for j in self.runner.recent()], ids[:1:-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.llm import LLM, JsonObjectTracker
+from app.llm_accounting import model_load_state
+from app.llm_cache import GenerationCache
+from app.storage import Storage
+
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    chunks = ['{"post": "a {b}', ' \\" }"', "}", " trailing chatter", " more"]
+    sent = 0
+
+    def do_POST(self):  # noqa: N802
+        self.rfile.read(int(self.headers.get("Content-Length", "0")))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for i, c in enumerate(self.chunks):
+            done = i == len(self.chunks) - 1
+            chunk = {"response": c, "done": done, **({"load_duration": 5_000_000} if done else {})}
+            try:
+                self.wfile.write((json.dumps(chunk) + "\n").encode())
+                self.wfile.flush()
+            except OSError:
+                return
+            type(self).sent += 1
+
+    def log_message(self, format, *args):  # noqa: A003
+        return
+
+
+class TestJsonObjectTracker(unittest.TestCase):
+    def test_finds_end_across_chunks(self) -> None:
+        t = JsonObjectTracker()
+        self.assertIsNone(t.feed('noise {"a": "}'))
+        self.assertIsNone(t.feed('", "b": {"c": 1}'))
+        self.assertEqual(t.feed("} tail"), 1)
+
+
+class TestStreaming(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _StreamHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.llm = LLM(
+            ollama_base_url=f"http://127.0.0.1:{cls.server.server_address[1]}",
+            ollama_model="m",
+            openai_api_key="",
+            openai_model="",
+            stream=True,
+        )
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_stops_when_json_closes(self) -> None:
+        out = self.llm.generate(system="s", user="u", stop="json")
+        self.assertEqual(json.loads(out), {"post": 'a {b} " }'})
+
+    def test_reads_to_the_end_without_stop(self) -> None:
+        out = self.llm.generate(system="s", user="u")
+        self.assertTrue(out.endswith("more"))
+        self.assertGreater(self.llm._transport("ollama").stats()["ttft_p50_ms"], 0.0)
+
+    def test_truncated_stream_is_not_cached_and_load_is_unknown(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = GenerationCache(Storage(os.path.join(tmp, "t.db")), ttl_seconds=3600)
+            llm = LLM(
+                ollama_base_url=self.llm.ollama_base_url,
+                ollama_model="m",
+                openai_api_key="",
+                openai_model="",
+                stream=True,
+                cache=cache,
+            )
+            full = llm._ollama_complete(system="s", prompt="u")
+            self.assertFalse(full.truncated)
+            self.assertEqual(model_load_state(full), "warm")
+
+            llm.stream_max_chars = 10
+            for _ in range(2):
+                cut = llm._ollama_complete(system="s", prompt="u")
+                self.assertTrue(cut.truncated)
+                self.assertFalse(cut.cached)
+                self.assertIsNone(cut.load_ms)
+                self.assertEqual(model_load_state(cut), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
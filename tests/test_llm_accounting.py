@@ -0,0 +1,50 @@
+import tempfile
+import unittest
+
+from app.agents import CriticAgent
+from app.llm import LLM, Completion
+from app.llm_accounting import CallRecorder, call_context
+from app.storage import Storage
+
+
+class TestLLMAccounting(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = Storage(self.tmp.name + "/test.db")
+        self.llm = LLM(
+            ollama_base_url="http://ollama",
+            ollama_model="m",
+            openai_api_key="",
+            openai_model="",
+            recorder=CallRecorder(self.storage),
+        )
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_reported_usage_is_stored(self) -> None:
+        self.llm._ollama_request = lambda **kw: Completion(
+            text="ok", backend="ollama", prompt_tokens=120, completion_tokens=30
+        )
+        with call_context(agent="writer", format="digest"):
+            self.llm.generate(system="s", user="u")
+        (row,) = self.storage.get_llm_call_rollup(by="format")
+        self.assertEqual(row["format"], "digest")
+        self.assertEqual((row["prompt_tokens"], row["completion_tokens"]), (120, 30))
+
+    def test_agents_tag_calls_and_missing_usage_is_estimated(self) -> None:
+        self.llm._ollama_request = lambda **kw: Completion(text="x" * 40, backend="ollama")
+        CriticAgent(self.llm).review(post_text="text", lang="ru")
+        self.llm._ollama_request = lambda **kw: None
+        self.llm.generate(system="s", user="u")
+
+        rows = {r["agent"]: r for r in self.storage.get_llm_call_rollup(by="agent")}
+        self.assertEqual(rows["critic"]["completion_tokens"], 10)
+        self.assertGreater(rows["critic"]["prompt_tokens"], 0)
+        self.assertEqual(rows["direct"]["ok"], 0)
+        outcomes = {r["outcome"] for r in self.storage.get_llm_call_rollup(by="outcome")}
+        self.assertEqual(outcomes, {"ok", "failed"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import tempfile
+import unittest
+
+from app.llm import LLM, Completion
+from app.llm_cache import GenerationCache, cache_stats
+from app.storage import Storage
+
+
+class TestGenerationCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = Storage(self.tmp.name + "/test.db")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_key_depends_on_every_field(self) -> None:
+        base = dict(backend="ollama", model="m", system="s", user="u", params={"t": 1})
+        keys = {GenerationCache.key(**base)}
+        for field, value in [("backend", "openai"), ("model", "m2"), ("system", "s2"), ("user", "u2"), ("params", {"t": 2})]:
+            keys.add(GenerationCache.key(**{**base, field: value}))
+        self.assertEqual(len(keys), 6)
+
+    def test_lru_eviction_over_entry_limit(self) -> None:
+        cache = GenerationCache(self.storage, ttl_seconds=3600, max_entries=2)
+        for k in ("a", "b"):
+            cache.put(k, backend="ollama", model="m", response=k, latency_ms=10)
+        self.assertEqual(cache.get("a"), "a")  # "b" is now least recently used
+        cache.put("c", backend="ollama", model="m", response="c", latency_ms=10)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "a")
+        self.assertEqual(cache_stats(self.storage)["entries"], 2)
+
+    def test_expired_entries_miss(self) -> None:
+        cache = GenerationCache(self.storage, ttl_seconds=-1)
+        cache.put("a", backend="ollama", model="m", response="a", latency_ms=10)
+        self.assertIsNone(cache.get("a"))
+
+    def test_llm_serves_repeated_prompt_from_cache(self) -> None:
+        llm = LLM(
+            ollama_base_url="http://ollama",
+            ollama_model="m",
+            openai_api_key="",
+            openai_model="",
+            cache=GenerationCache(self.storage, ttl_seconds=3600),
+        )
+        calls = []
+        llm._ollama_request = lambda **kw: calls.append(kw) or Completion(text="draft", backend="ollama")
+        self.assertEqual(llm._ollama_generate(system="s", prompt="p"), "draft")
+        self.assertEqual(llm._ollama_generate(system="s", prompt="p"), "draft")
+        self.assertEqual(len(calls), 1)
+        stats = cache_stats(self.storage)
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
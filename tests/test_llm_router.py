@@ -0,0 +1,157 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from app.deadline import Deadline
+from app import llm as llm_module
+from app.llm import LLM, Completion
+from app.llm_router import BackendRouter, HedgeBudget
+
+
+class TestBackendRouter(unittest.TestCase):
+    def test_keeps_preference_until_much_slower(self) -> None:
+        r = BackendRouter(slow_factor=2.0)
+        r.record("ollama", ok=True, seconds=3.0)
+        r.record("openai", ok=True, seconds=2.0)
+        self.assertEqual(r.order(["ollama", "openai"]), ["ollama", "openai"])
+        for _ in range(5):
+            r.record("ollama", ok=True, seconds=10.0)
+        self.assertEqual(r.order(["ollama", "openai"]), ["openai", "ollama"])
+
+    def test_breaker_opens_then_probes_once(self) -> None:
+        r = BackendRouter(failure_threshold=2, open_seconds=30)
+        with mock.patch("app.llm_router.time.monotonic", return_value=100.0):
+            r.record("ollama", ok=False, seconds=1)
+            self.assertEqual(r.order(["ollama", "openai"]), ["ollama", "openai"])
+            r.record("ollama", ok=False, seconds=1)
+            self.assertEqual(r.order(["ollama", "openai"]), ["openai"])
+        with mock.patch("app.llm_router.time.monotonic", return_value=131.0):
+            self.assertEqual(r.order(["ollama", "openai"]), ["ollama", "openai"])
+            self.assertEqual(r.order(["ollama", "openai"]), ["openai"])  # probe already handed out
+            r.record("ollama", ok=True, seconds=1)
+            self.assertEqual(r.snapshot()["ollama"]["state"], "closed")
+
+    def test_llm_skips_broken_backend(self) -> None:
+        r = BackendRouter(failure_threshold=1, open_seconds=60)
+        llm = LLM(ollama_base_url="http://o", ollama_model="m", openai_api_key="k", openai_model="g", router=r)
+        calls = []
+        llm._ollama_request = lambda **kw: calls.append("ollama") and None
+        llm._openai_request = lambda **kw: calls.append("openai") or Completion(text="ok", backend="openai")
+        self.assertEqual(llm.generate(system="s", user="u"), "ok")
+        self.assertEqual(llm.generate(system="s", user="u"), "ok")
+        self.assertEqual(calls, ["ollama", "openai", "openai"])
+
+    def test_deadline_capped_calls_leave_breaker_closed(self) -> None:
+        r = BackendRouter(failure_threshold=1, open_seconds=60)
+        llm = LLM(ollama_base_url="http://o", ollama_model="m", openai_api_key="", openai_model="", router=r)
+
+        def capped(*, deadline, **kw):
+            # What the transport does with a healthy but slower backend: the
+            # read timeout is capped to the deadline and the call gives up.
+            if deadline is not None:
+                time.sleep(deadline.remaining())
+                return None
+            return Completion(text="ok", backend="ollama")
+
+        llm._ollama_request = capped
+        for _ in range(3):
+            self.assertIsNone(llm.generate(system="s", user="u", deadline=Deadline.after(0.05)))
+        self.assertEqual(r.snapshot()["ollama"]["state"], "closed")
+        self.assertEqual(llm.generate(system="s", user="u"), "ok")
+
+
+class TestHedging(unittest.TestCase):
+    def make_llm(self, budget: HedgeBudget) -> LLM:
+        r = BackendRouter()
+        for _ in range(20):
+            r.record("ollama", ok=True, seconds=0.01)
+        return LLM(
+            ollama_base_url="http://o",
+            ollama_model="m",
+            openai_api_key="k",
+            openai_model="g",
+            router=r,
+            hedge_percentile=0.95,
+            hedge_budget=budget,
+        )
+
+    def test_slow_primary_is_hedged_and_loser_ignored(self) -> None:
+        budget = HedgeBudget(1.0)
+        llm = self.make_llm(budget)
+        release = threading.Event()
+
+        def slow_ollama(**kw):
+            release.wait(5)
+            return Completion(text="late", backend="ollama")
+
+        llm._ollama_request = slow_ollama
+        llm._openai_request = lambda **kw: Completion(text="fast", backend="openai")
+        t0 = time.perf_counter()
+        self.assertEqual(llm.generate(system="s", user="u"), "fast")
+        self.assertLess(time.perf_counter() - t0, 1.0)
+        release.set()
+        self.assertEqual((budget.fired, budget.won), (1, 1))
+
+    def test_stalled_backups_never_queue_the_primary(self) -> None:
+        budget = HedgeBudget(1.0)
+        llm = self.make_llm(budget)
+        llm.max_concurrency = 1
+        for _ in range(200):
+            llm.router.record("ollama", ok=True, seconds=0.01)
+        release = threading.Event()
+
+        def slowish(**kw):
+            time.sleep(0.05)
+            return Completion(text="primary", backend="ollama")
+
+        def stalled(**kw):
+            release.wait(5)
+            return None
+
+        llm._ollama_request = slowish
+        llm._openai_request = stalled
+        with mock.patch.object(llm_module, "_HEDGE_POOL", llm_module._HedgePool()):
+            try:
+                t0 = time.perf_counter()
+                for _ in range(10):
+                    self.assertEqual(llm.generate(system="s", user="u"), "primary")
+                self.assertLess(time.perf_counter() - t0, 2.0)
+            finally:
+                release.set()
+        # A pool of 4 for one concurrent call: after three stalled backups, calls go out unhedged.
+        self.assertEqual(budget.fired, 3)
+
+    def test_budget_caps_extra_requests(self) -> None:
+        budget = HedgeBudget(0.0)
+        llm = self.make_llm(budget)
+        calls = []
+
+        def slowish(**kw):
+            calls.append("ollama")
+            time.sleep(0.05)
+            return Completion(text="primary", backend="ollama")
+
+        llm._ollama_request = slowish
+        llm._openai_request = lambda **kw: calls.append("openai") or Completion(text="x", backend="openai")
+        self.assertEqual(llm.generate(system="s", user="u"), "primary")
+        self.assertEqual(calls, ["ollama"])
+        self.assertEqual((budget.fired, budget.denied), (0, 1))
+
+    def test_no_hedge_until_latency_is_known(self) -> None:
+        llm = LLM(
+            ollama_base_url="http://o",
+            ollama_model="m",
+            openai_api_key="",
+            openai_model="",
+            router=BackendRouter(),
+            hedge_percentile=0.95,
+            hedge_budget=HedgeBudget(1.0),
+        )
+        llm._ollama_request = lambda **kw: Completion(text="ok", backend="ollama")
+        self.assertEqual(llm.generate(system="s", user="u"), "ok")
+        self.assertEqual(llm.hedge_budget.fired, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
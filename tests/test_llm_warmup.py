@@ -0,0 +1,65 @@
+import json
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.llm import LLM
+from app.llm_accounting import CallRecorder
+from app.storage import Storage
+
+
+class _OllamaHandler(BaseHTTPRequestHandler):
+    payloads: list = []
+    load_ns = 5_000_000_000
+
+    def do_POST(self):  # noqa: N802
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", "0"))))
+        type(self).payloads.append(payload)
+        body = {"response": "ok" if payload["prompt"] else "", "done": True, "load_duration": type(self).load_ns}
+        type(self).load_ns = 20_000_000  # loaded from now on
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):  # noqa: A003
+        return
+
+
+class TestWarmUp(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = Storage(self.tmp.name + "/test.db")
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _OllamaHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        _OllamaHandler.payloads = []
+        _OllamaHandler.load_ns = 5_000_000_000
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_warm_up_then_generate_is_recorded_cold_and_warm(self) -> None:
+        llm = LLM(
+            ollama_base_url=f"http://127.0.0.1:{self.server.server_address[1]}",
+            ollama_model="m",
+            openai_api_key="",
+            openai_model="",
+            recorder=CallRecorder(self.storage),
+            keep_alive="-1",
+        )
+        self.assertIsNotNone(llm.warm_up(timeout_seconds=5))
+        self.assertEqual(llm.generate(system="s", user="u"), "ok")
+
+        self.assertEqual([p["keep_alive"] for p in _OllamaHandler.payloads], [-1, -1])
+        self.assertEqual(_OllamaHandler.payloads[0]["prompt"], "")
+        rows = {r["model_load"]: r["calls"] for r in self.storage.get_llm_call_rollup(by="model_load")}
+        self.assertEqual(rows, {"cold": 1, "warm": 1})
+        agents = {r["agent"] for r in self.storage.get_llm_call_rollup(by="agent")}
+        self.assertEqual(agents, {"warmup", "direct"})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import json
+import unittest
+import urllib.request
+
+from app.llm import LLM
+from app.llm_stub import StubOptions, parse_latency, start_stub_server
+from app.loadtest import run_load_test
+
+from conftest import make_cfg
+
+
+# Three slots a day, full review, like a busy channel.
+LOADTEST_CFG = dict(post_times=["09:00", "12:00", "18:00"], enable_review=True)
+
+
+class TestLoadTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server, self.base_url = start_stub_server(options=StubOptions(chunk_chars=7))
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stub_stats(self) -> dict:
+        with urllib.request.urlopen(self.base_url + "/stats") as r:
+            return json.loads(r.read())
+
+    def test_plans_every_channel_and_day(self) -> None:
+        cfg = make_cfg(**LOADTEST_CFG, review_lint_gate=False)
+        report = run_load_test(cfg, base_url=self.base_url, days=2, channels=2)
+        self.assertEqual((report["runs"], report["failed_runs"], report["planned_posts"]), (4, 0, 12))
+        self.assertGreaterEqual(report["run_p95_ms"], report["run_p50_ms"])
+        kinds = self.stub_stats()["by_kind"]
+        self.assertEqual((kinds["writer"], kinds["critic"], kinds["reviser"]), (12, 12, 12))
+
+    def test_lint_gate_skips_review_of_clean_drafts(self) -> None:
+        report = run_load_test(make_cfg(**LOADTEST_CFG), base_url=self.base_url, days=1, channels=1)
+        self.assertEqual(report["planned_posts"], 3)
+        self.assertEqual(self.stub_stats()["by_kind"], {"writer": 3})
+
+    def test_spent_budget_degrades_to_template_without_calls(self) -> None:
+        cfg = make_cfg(**LOADTEST_CFG, review_lint_gate=False, plan_run_budget_seconds=0)
+        report = run_load_test(cfg, base_url=self.base_url, days=1, channels=1)
+        self.assertEqual(report["planned_posts"], 3)
+        self.assertEqual(self.stub_stats()["requests"], 0)
+
+    def test_openai_streaming_answer(self) -> None:
+        llm = LLM(
+            ollama_base_url="",
+            ollama_model="",
+            openai_api_key="k",
+            openai_model="m",
+            openai_base_url=self.base_url + "/v1",
+            stream=True,
+        )
+        out = llm.generate(system="s", user='Верни JSON {"post": "..."}', stop="json")
+        self.assertEqual(json.loads(out)["alt_title_1"], "Заголовок 1")
+        self.assertEqual(self.stub_stats()["streamed"], 1)
+
+    def test_latency_specs(self) -> None:
+        self.assertEqual(parse_latency("fixed:250")(), 0.25)
+        self.assertTrue(0.1 <= parse_latency("uniform:100:200")() <= 0.2)
+        with self.assertRaises(ValueError):
+            parse_latency("normal:1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import threading
+import time
+import unittest
+
+from app.pipeline import StagePipeline
+
+
+class TestStagePipeline(unittest.TestCase):
+    def test_results_keep_input_order(self) -> None:
+        pipe = StagePipeline([("double", lambda x: x * 2), ("inc", lambda x: x + 1)])
+        self.assertEqual(pipe.run(range(5)), [1, 3, 5, 7, 9])
+        self.assertEqual([s.processed for s in pipe.stats], [5, 5])
+
+    def test_stages_overlap(self) -> None:
+        active = set()
+        overlapped = threading.Event()
+        lock = threading.Lock()
+
+        def stage(name):
+            def fn(x):
+                with lock:
+                    active.add(name)
+                    if len(active) > 1:
+                        overlapped.set()
+                time.sleep(0.05)
+                with lock:
+                    active.discard(name)
+                return x
+
+            return fn
+
+        pipe = StagePipeline([("a", stage("a")), ("b", stage("b"))], maxsize=1)
+        pipe.run(range(4))
+        self.assertTrue(overlapped.is_set())
+
+    def test_error_is_reraised_after_drain(self) -> None:
+        seen = []
+
+        def boom(x):
+            if x == 1:
+                raise RuntimeError("bad job")
+            return x
+
+        pipe = StagePipeline([("boom", boom), ("sink", lambda x: seen.append(x) or x)])
+        with self.assertRaises(RuntimeError):
+            pipe.run(range(3))
+        self.assertEqual(seen, [0, 2])
+        self.assertEqual(pipe.stats[0].errors, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
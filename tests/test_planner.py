@@ -0,0 +1,131 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+from app.deadline import Deadline
+from app.planner import (
+    backfill_payloads,
+    ensure_daily_queue,
+    refill_spares,
+    slot_deadline,
+    slot_fire_time,
+    slot_lateness_seconds,
+    upcoming_slots,
+    use_spare,
+)
+from app.render import render_payload
+from app.scheduler import warmup_minutes
+from app.storage import Storage
+
+from conftest import make_cfg
+
+
+class TestLookaheadSlots(unittest.TestCase):
+    def test_upcoming_slots_wrap_to_next_day(self) -> None:
+        now = datetime(2026, 3, 1, 10, 0, tzinfo=timezone.utc)
+        got = upcoming_slots(make_cfg(), now)
+        self.assertEqual([slot for _, slot in got], ["12:00", "00:00", "09:00"])
+        self.assertEqual(got[1][0].date().isoformat(), "2026-03-02")
+
+    def test_slot_lateness_uses_config_timezone(self) -> None:
+        cfg = make_cfg(timezone="Europe/Moscow")
+        now = datetime(2026, 3, 1, 6, 1, 30, tzinfo=timezone.utc)  # 09:01:30 MSK
+        self.assertEqual(slot_lateness_seconds(cfg, "09:00", now), 90.0)
+
+    def test_warmup_minutes_lead_generation(self) -> None:
+        cfg = make_cfg(post_times=["00:02", "12:00"], max_posts_per_day=2, ollama_warmup_lead_minutes=5)
+        self.assertEqual(warmup_minutes(cfg, cfg.post_times), [11 * 60 + 55, 23 * 60 + 57])
+        cfg = make_cfg(post_times=["12:00"], planner_mode="lookahead", plan_lead_minutes=30)
+        self.assertEqual(warmup_minutes(cfg, cfg.post_times), [11 * 60 + 25])
+
+
+class TestSlotDeadline(unittest.TestCase):
+    def test_fire_time_matches_utc_queue_day(self) -> None:
+        cfg = make_cfg(timezone="Europe/Moscow")
+        # 01:00 MSK is 22:00 UTC the day before, so it belongs to that queue day.
+        self.assertEqual(slot_fire_time(cfg, "2026-03-01", "01:00").isoformat(), "2026-03-02T01:00:00+03:00")
+        self.assertEqual(slot_fire_time(cfg, "2026-03-01", "12:00").isoformat(), "2026-03-01T12:00:00+03:00")
+
+    def test_deadline_is_slot_or_run_whichever_is_first(self) -> None:
+        cfg = make_cfg()
+        now = datetime(2026, 3, 1, 8, 50, tzinfo=timezone.utc)
+        run = Deadline.after(3600)
+        soon = slot_deadline(cfg, "2026-03-01", "09:00", run, now=now)
+        self.assertAlmostEqual(soon.remaining(), 600 - 30, delta=2)
+        self.assertIs(slot_deadline(cfg, "2026-03-01", "12:00", run, now=now), run)
+        # A slot that is already due gets the run budget.
+        self.assertIs(slot_deadline(cfg, "2026-03-01", "00:00", run, now=now), run)
+
+
+class TestBackfillPayloads(unittest.TestCase):
+    def test_renders_legacy_rows_and_templates_invalid_ones(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = Storage(os.path.join(tmp, "t.db"))
+            for guid in ("g1", "g2"):
+                storage.upsert_item(
+                    guid=guid, source="s", title="Title " + guid, link="https://e.x/" + guid, published="", summary="S"
+                )
+            storage.upsert_queue_slot(
+                day="2026-03-01", slot="09:00", guid="g1", format="f", alt_title_1="", alt_title_2="", post_text="a & b"
+            )
+            storage.add_spare(guid="g2", format="f", alt_title_1="", alt_title_2="", post_text="")
+            self.assertEqual(backfill_payloads(storage), 2)
+            self.assertEqual(storage.get_queue_slot("2026-03-01", "09:00")["payload"], ["a &amp; b"])
+            spare = storage.take_spare()
+            self.assertIn("Title g2", spare["payload"][0])
+            self.assertEqual(backfill_payloads(storage), 0)
+
+
+class TestSparePool(unittest.TestCase):
+    ITEMS = {
+        "queued": "Multi-agent MCP paper release",
+        "agent": "New agent framework launch",
+        "mcp": "MCP tool support",
+        "plain": "Weather report",
+    }
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = Storage(os.path.join(self.tmp.name, "t.db"))
+        for guid, title in self.ITEMS.items():
+            self.storage.upsert_item(guid=guid, source="s", title=title, link="https://e.x/" + guid, published="", summary="")
+        self.cfg = make_cfg(post_times=["09:00"], max_posts_per_day=1, spare_pool_size=2)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def add_spare(self, guid: str):
+        self.storage.add_spare(
+            guid=guid, format="f", alt_title_1="", alt_title_2="", post_text=guid, payload=render_payload(guid)
+        )
+
+    def test_refill_takes_best_unplanned_items(self) -> None:
+        self.storage.upsert_queue_slot(
+            day="2026-03-01", slot="09:00", guid="queued", format="f", alt_title_1="", alt_title_2="", post_text="q"
+        )
+        ok, info = refill_spares(storage=self.storage, cfg=self.cfg)
+        self.assertTrue(ok, info)
+        self.assertEqual(self.storage.list_spare_guids(), {"agent", "mcp"})
+        self.assertEqual(refill_spares(storage=self.storage, cfg=self.cfg), (False, "spare pool full"))
+
+    def test_use_spare_fills_slot_and_skips_posted_items(self) -> None:
+        self.add_spare("agent")
+        self.add_spare("mcp")
+        self.storage.mark_posted("agent", "posted elsewhere")
+        q = use_spare(storage=self.storage, day="2026-03-01", slot="09:00")
+        self.assertEqual((q["guid"], q["payload"]), ("mcp", ["mcp"]))
+        self.assertEqual(self.storage.count_available_spares(), 0)
+        self.assertIsNone(use_spare(storage=self.storage, day="2026-03-01", slot="12:00"))
+
+    def test_planning_leaves_spare_items_alone(self) -> None:
+        for guid in ("queued", "agent", "mcp"):
+            self.add_spare(guid)
+        ok, info = ensure_daily_queue(storage=self.storage, cfg=self.cfg, day="2026-03-01")
+        self.assertTrue(ok, info)
+        self.assertEqual(self.storage.get_queue_slot("2026-03-01", "09:00")["guid"], "plain")
+        self.assertEqual(self.storage.count_available_spares(), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
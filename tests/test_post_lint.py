@@ -0,0 +1,45 @@
+import unittest
+
+from app.post_lint import lint_post
+
+LINK = "https://example.com/a"
+SOURCE = "OpenAI выпустила модель на 128000 токенов\nКонтекст вырос в 4 раза.\n" + LINK
+GOOD = f"""Новая модель с длинным контекстом
+
+- Окно контекста 128000 токенов
+- Контекст вырос в 4 раза
+- Доступна через API
+
+Вывод: длинные документы можно давать целиком.
+{LINK}
+#ai #llm"""
+
+
+class TestPostLint(unittest.TestCase):
+    def test_post_meeting_the_rules_is_clean(self) -> None:
+        self.assertTrue(lint_post(GOOD, link=LINK, source_text=SOURCE).clean)
+
+    def test_each_rule_is_checked(self) -> None:
+        cases = {
+            "длина": GOOD.replace("Вывод:", "Вывод: " + "очень " * 150),
+            "заголовка": GOOD.split("\n", 2)[2],
+            "буллетов": GOOD.replace("- Доступна через API\n", ""),
+            "takeaway": GOOD.replace("Вывод: длинные документы можно давать целиком.\n", ""),
+            "нет ссылки": GOOD.replace(LINK, ""),
+            "хэштегов": GOOD.replace(" #llm", ""),
+            "ссылки не из источника": GOOD + "\nhttps://other.example/x",
+            "цифры не из источника": GOOD.replace("в 4 раза", "на 35%"),
+        }
+        for rule, text in cases.items():
+            res = lint_post(text, link=LINK, source_text=SOURCE)
+            self.assertTrue(any(rule in msg for msg in res.issues), f"{rule}: {res}")
+
+    def test_near_limit_is_borderline(self) -> None:
+        text = GOOD.replace("Вывод:", "Вывод: " + "а" * (870 - len(GOOD)))
+        res = lint_post(text, link=LINK, source_text=SOURCE)
+        self.assertEqual(res.issues, [])
+        self.assertFalse(res.clean)
+
+
+if __name__ == "__main__":
+    unittest.main()
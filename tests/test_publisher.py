@@ -0,0 +1,335 @@
+import asyncio
+import dataclasses
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from app import publisher
+from app.planner import use_spare
+from app.publisher import drain_outbox, post_one, post_scheduled, publish_stats, recover_outbox
+from app.rate_limit import RateLimiter
+from app.render import render_payload
+from app.storage import Storage
+
+from conftest import make_cfg
+
+
+METHOD = SendMessage(chat_id="@chan", text="x")
+
+
+class FakeBot:
+    def __init__(self, errors=(), delay=0.002, fail_chats=()):
+        self.sent = []
+        # Raised by the next sends, in order.
+        self.errors = list(errors)
+        self.delay = delay
+        self.fail_chats = set(fail_chats)
+
+    async def send_message(self, *, chat_id, text):
+        await asyncio.sleep(self.delay)
+        if self.errors:
+            raise self.errors.pop(0)
+        if chat_id in self.fail_chats:
+            raise TelegramBadRequest(METHOD, "chat not found")
+        self.sent.append((chat_id, text))
+        return SimpleNamespace(message_id=100 + len(self.sent))
+
+
+class TestPublisher(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = Storage(os.path.join(self.tmp.name, "t.db"))
+        self.cfg = make_cfg(
+            target_chat_id="@chan",
+            post_times=["09:00", "12:00"],
+            max_posts_per_day=2,
+            planner_mode="lookahead",
+            spare_pool_size=0,
+            # Tests send to one chat back to back; don't pace them.
+            publish_chat_rate_per_minute=60000,
+        )
+        self.day = publisher._today_utc()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def plan(self, slot: str, guid: str):
+        self.storage.upsert_item(guid=guid, source="s", title="T", link="https://e.x/" + guid, published="", summary="S")
+        self.storage.upsert_queue_slot(
+            day=self.day,
+            slot=slot,
+            guid=guid,
+            format="breaking_news",
+            alt_title_1="",
+            alt_title_2="",
+            post_text="a < b",
+            payload=render_payload("a < b"),
+        )
+
+    def test_shared_bot_is_reused_and_latency_recorded(self) -> None:
+        bot = FakeBot()
+        created = publish_stats()["bots_created"]
+        self.plan("09:00", "g1")
+        self.plan("12:00", "g2")
+
+        async def run():
+            for slot in ("09:00", "12:00"):
+                ok, _ = await post_scheduled(storage=self.storage, slot=slot, cfg=self.cfg, bot=bot)
+                self.assertTrue(ok)
+
+        asyncio.run(run())
+        self.assertEqual(bot.sent, [("@chan", "a &lt; b"), ("@chan", "a &lt; b")])
+        self.assertEqual(publish_stats()["bots_created"], created)
+        self.assertEqual(self.storage.get_queue_slot(self.day, "09:00")["status"], "posted")
+        late = self.storage.get_lateness_summary()
+        self.assertEqual(late["posts"], 2)
+        self.assertGreater(late["max_publish_ms"], 0)
+
+
+    def post(self, bot, slot="09:00", **overrides):
+        cfg = dataclasses.replace(self.cfg, **overrides)
+        return asyncio.run(post_scheduled(storage=self.storage, slot=slot, cfg=cfg, bot=bot))
+
+    def drain(self, bot, **overrides):
+        cfg = dataclasses.replace(self.cfg, **overrides)
+        return asyncio.run(drain_outbox(storage=self.storage, cfg=cfg, bot=bot))
+
+    def test_transient_error_is_retried_and_posted_once(self) -> None:
+        bot = FakeBot([TelegramNetworkError(METHOD, "timeout")])
+        self.plan("09:00", "g1")
+        ok, info = self.post(bot, outbox_backoff_seconds=0)
+        self.assertFalse(ok)
+        self.assertIn("retry 2/", info)
+        self.assertEqual(self.storage.get_queue_slot(self.day, "09:00")["status"], "planned")
+
+        self.assertEqual(self.drain(bot), {"sent": 1})
+        self.assertEqual(self.storage.get_queue_slot(self.day, "09:00")["status"], "posted")
+        # The slot firing again (or a second worker) must not send it twice.
+        self.assertEqual(self.post(bot), (False, "already posted"))
+        self.assertEqual(self.drain(bot), {})
+        self.assertEqual(len(bot.sent), 1)
+
+    def test_retry_after_waits_without_spending_an_attempt(self) -> None:
+        bot = FakeBot([TelegramRetryAfter(METHOD, "flood", 60)])
+        self.plan("09:00", "g1")
+        self.plan("12:00", "g2")
+        ok, info = self.post(bot)
+        self.assertFalse(ok)
+        self.assertIn("rate limited", info)
+        row = self.storage.get_outbox(f"slot:{self.day}:09:00:@chan")
+        self.assertEqual((row["status"], row["attempts"]), ("pending", 0))
+        self.assertEqual(self.drain(bot), {})
+
+    def test_gives_up_after_max_attempts(self) -> None:
+        bot = FakeBot([TelegramNetworkError(METHOD, "down")] * 3)
+        self.plan("09:00", "g1")
+        self.post(bot, outbox_backoff_seconds=0, outbox_max_attempts=2)
+        self.assertEqual(self.drain(bot, outbox_backoff_seconds=0, outbox_max_attempts=2), {"failed": 1})
+        self.assertEqual(self.storage.get_queue_slot(self.day, "09:00")["status"], "error")
+        self.assertEqual(bot.sent, [])
+
+    def test_rejected_send_fails_without_retry(self) -> None:
+        bot = FakeBot([TelegramBadRequest(METHOD, "chat not found")])
+        self.plan("09:00", "g1")
+        ok, info = self.post(bot)
+        self.assertFalse(ok)
+        self.assertIn("chat not found", info)
+        self.assertEqual(self.storage.outbox_summary(), {"failed": 1})
+
+    def test_interrupted_send_is_not_repeated(self) -> None:
+        row = self.storage.add_outbox(key="k", chat_id="@chan", text="t", payload=["t"], day=self.day, slot="09:00", guid="g", now=0)
+        self.assertTrue(self.storage.claim_outbox(row["id"]))
+        self.assertFalse(self.storage.claim_outbox(row["id"]))
+        self.assertEqual(recover_outbox(self.storage, self.cfg), 1)
+        bot = FakeBot()
+        self.assertEqual(self.drain(bot), {})
+        self.assertEqual(self.storage.get_outbox("k")["status"], "unknown")
+
+
+    def test_fan_out_sends_to_every_target_concurrently(self) -> None:
+        self.storage.set_setting("target_chat_id", "@a, @b,@c")
+        bot = FakeBot(delay=0.2)
+        self.plan("09:00", "g1")
+        t0 = time.perf_counter()
+        ok, info = self.post(bot)
+        elapsed = time.perf_counter() - t0
+        self.assertTrue(ok, info)
+        self.assertEqual(sorted(chat for chat, _ in bot.sent), ["@a", "@b", "@c"])
+        self.assertLess(elapsed, 0.5)
+        rows = self.storage.list_slot_outbox(self.day, "09:00")
+        self.assertEqual([(r["chat_id"], r["status"]) for r in rows], [("@a", "sent"), ("@b", "sent"), ("@c", "sent")])
+        self.assertEqual(len({r["tg_message_id"] for r in rows}), 3)
+        self.assertEqual(self.storage.list_sent_message_ids(chat_id="@b"), [rows[1]["tg_message_id"]])
+        self.assertEqual(self.storage.get_queue_slot(self.day, "09:00")["status"], "posted")
+
+    def test_one_failed_target_does_not_block_the_others(self) -> None:
+        self.storage.set_setting("target_chat_id", "@a,@b")
+        bot = FakeBot(fail_chats={"@b"})
+        self.plan("09:00", "g1")
+        ok, info = self.post(bot)
+        self.assertFalse(ok)
+        self.assertIn("@b: Telegram server says - chat not found", info)
+        self.assertEqual(bot.sent[0][0], "@a")
+        stats = {t["chat_id"]: t for t in self.storage.outbox_target_stats()}
+        self.assertEqual((stats["@a"]["sent"], stats["@b"]["failed"]), (1, 1))
+        self.assertEqual(self.storage.get_queue_slot(self.day, "09:00")["status"], "error")
+
+
+    def test_multi_part_payload_resumes_after_the_sent_parts(self) -> None:
+        self.plan("09:00", "g1")
+        self.storage.upsert_queue_slot(
+            day=self.day,
+            slot="09:00",
+            guid="g1",
+            format="breaking_news",
+            alt_title_1="",
+            alt_title_2="",
+            post_text="p1\n\np2",
+            payload=["p1", "p2"],
+        )
+        bot = FakeBot()
+        original = bot.send_message
+
+        async def flaky(*, chat_id, text):
+            if text == "p2" and not getattr(bot, "failed_once", False):
+                bot.failed_once = True
+                raise TelegramNetworkError(METHOD, "reset")
+            return await original(chat_id=chat_id, text=text)
+
+        bot.send_message = flaky
+        ok, _ = self.post(bot, outbox_backoff_seconds=0)
+        self.assertFalse(ok)
+        self.assertEqual(self.drain(bot), {"sent": 1})
+        self.assertEqual([text for _, text in bot.sent], ["p1", "p2"])
+        self.assertEqual(self.storage.get_outbox(f"slot:{self.day}:09:00:@chan")["tg_message_id"], 101)
+
+    def test_slot_without_payload_is_not_generated_at_publish(self) -> None:
+        self.storage.upsert_item(guid="g1", source="s", title="T", link="https://e.x/g1", published="", summary="S")
+        self.storage.upsert_queue_slot(
+            day=self.day, slot="09:00", guid="g1", format="breaking_news", alt_title_1="", alt_title_2="", post_text=""
+        )
+        bot = FakeBot()
+        self.assertEqual(self.post(bot), (False, "no rendered payload"))
+        self.assertEqual(bot.sent, [])
+
+    def add_spare(self, guid: str):
+        self.storage.upsert_item(guid=guid, source="s", title="T", link="https://e.x/" + guid, published="", summary="S")
+        self.storage.add_spare(
+            guid=guid, format="f", alt_title_1="", alt_title_2="", post_text="spare " + guid,
+            payload=render_payload("spare " + guid),
+        )
+
+    def test_unplanned_slot_is_filled_from_spare_pool(self) -> None:
+        self.add_spare("s1")
+        bot = FakeBot()
+        with mock.patch.object(publisher, "refill_spares_soon") as refill:
+            ok, info = self.post(bot, spare_pool_size=2)
+        self.assertTrue(ok, info)
+        self.assertEqual(bot.sent, [("@chan", "spare s1")])
+        self.assertEqual(self.storage.get_queue_slot(self.day, "09:00")["guid"], "s1")
+        refill.assert_called_once()
+
+    def test_slot_without_payload_falls_back_to_spare(self) -> None:
+        self.add_spare("s1")
+        self.storage.upsert_item(guid="g1", source="s", title="T", link="https://e.x/g1", published="", summary="S")
+        self.storage.upsert_queue_slot(
+            day=self.day, slot="09:00", guid="g1", format="breaking_news", alt_title_1="", alt_title_2="", post_text=""
+        )
+        bot = FakeBot()
+        with mock.patch.object(publisher, "refill_spares_soon"):
+            ok, info = self.post(bot, spare_pool_size=2)
+        self.assertTrue(ok, info)
+        self.assertEqual(bot.sent, [("@chan", "spare s1")])
+        self.assertEqual(self.storage.count_available_spares(), 0)
+
+    def test_unplanned_slot_without_spares_is_not_posted(self) -> None:
+        bot = FakeBot()
+        self.assertEqual(self.post(bot, spare_pool_size=2), (False, "no planned slot"))
+        self.assertEqual(bot.sent, [])
+
+    def test_slot_failing_on_every_target_swaps_in_one_spare(self) -> None:
+        self.plan("09:00", "g1")
+        self.add_spare("s1")
+        self.add_spare("s2")
+        with mock.patch.object(publisher, "refill_spares_soon") as refill:
+            ok, _ = self.post(FakeBot(fail_chats={"@chan"}), spare_pool_size=2)
+            self.assertFalse(ok)
+            q = self.storage.get_queue_slot(self.day, "09:00")
+            self.assertEqual((q["status"], q["guid"]), ("planned", "s1"))
+            refill.assert_called_once()
+
+            bot = FakeBot()
+            self.assertEqual(self.drain(bot, spare_pool_size=2), {"sent": 1})
+            self.assertEqual(bot.sent, [("@chan", "spare s1")])
+            self.assertEqual(self.storage.get_queue_slot(self.day, "09:00")["status"], "posted")
+
+    def test_failed_spare_is_not_swapped_again(self) -> None:
+        self.plan("09:00", "g1")
+        self.add_spare("s1")
+        self.add_spare("s2")
+        bot = FakeBot(fail_chats={"@chan"})
+        with mock.patch.object(publisher, "refill_spares_soon"):
+            self.post(bot, spare_pool_size=2)
+            self.drain(bot, spare_pool_size=2)
+        q = self.storage.get_queue_slot(self.day, "09:00")
+        self.assertEqual((q["status"], q["guid"]), ("error", "s1"))
+        self.assertEqual(self.storage.count_available_spares(), 1)
+
+    def test_skip_after_failed_send_publishes_the_spare(self) -> None:
+        self.plan("09:00", "g1")
+        self.post(FakeBot(fail_chats={"@chan"}))
+        self.assertEqual(self.storage.get_queue_slot(self.day, "09:00")["status"], "error")
+        self.add_spare("s1")
+        use_spare(storage=self.storage, day=self.day, slot="09:00")  # what /skip does
+
+        bot = FakeBot()
+        self.assertEqual(self.drain(bot), {"sent": 1})
+        self.assertEqual(bot.sent, [("@chan", "spare s1")])
+        q = self.storage.get_queue_slot(self.day, "09:00")
+        self.assertEqual((q["guid"], q["status"]), ("s1", "posted"))
+
+    def test_skip_with_pending_retry_sends_the_spare_not_the_old_post(self) -> None:
+        self.plan("09:00", "g1")
+        self.post(FakeBot([TelegramNetworkError(METHOD, "timeout")]), outbox_backoff_seconds=0)
+        self.add_spare("s1")
+        use_spare(storage=self.storage, day=self.day, slot="09:00")
+
+        bot = FakeBot()
+        self.assertEqual(self.drain(bot), {"sent": 1})
+        self.assertEqual(bot.sent, [("@chan", "spare s1")])
+        row = self.storage.get_outbox(f"slot:{self.day}:09:00:@chan")
+        self.assertEqual((row["guid"], row["attempts"]), ("s1", 1))
+
+    def test_manual_post_can_be_retried_after_it_failed(self) -> None:
+        self.storage.upsert_item(guid="g1", source="s", title="T", link="https://e.x/g1", published="", summary="S")
+        post = lambda bot: asyncio.run(post_one(storage=self.storage, targets=["@chan"], cfg=self.cfg, bot=bot))
+        ok, info = post(FakeBot(fail_chats={"@chan"}))
+        self.assertFalse(ok)
+        self.assertEqual(self.storage.get_outbox("manual:g1:@chan")["status"], "failed")
+
+        bot = FakeBot()
+        ok, info = post(bot)
+        self.assertTrue(ok, info)
+        self.assertEqual(len(bot.sent), 1)
+        row = self.storage.get_outbox("manual:g1:@chan")
+        self.assertEqual((row["status"], row["attempts"]), ("sent", 1))
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_spaces_acquisitions_after_burst(self) -> None:
+        lim = RateLimiter(10, burst=2)
+        waits = [lim.reserve() for _ in range(4)]
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 0.1, delta=0.01)
+        self.assertAlmostEqual(waits[3], 0.2, delta=0.01)
+        self.assertEqual(lim.stats()["waits"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import html
+import unittest
+
+from app.render import PayloadError, render_payload, split_text
+
+
+class TestRender(unittest.TestCase):
+    def test_short_post_is_one_escaped_part(self) -> None:
+        self.assertEqual(render_payload(" <b>AT&T</b> \n"), ["&lt;b&gt;AT&amp;T&lt;/b&gt;"])
+
+    def test_splits_on_paragraphs_within_limit(self) -> None:
+        text = "\n\n".join(["a" * 30, "b & c " * 3, "d" * 30])
+        parts = render_payload(text, limit=45)
+        self.assertEqual(len(parts), 3)
+        self.assertTrue(all(len(p) <= 45 for p in parts))
+        self.assertEqual(html.unescape(parts[1]), ("b & c " * 3).strip())
+
+    def test_long_word_is_cut_hard(self) -> None:
+        self.assertEqual(split_text("x" * 25, limit=10), ["x" * 10, "x" * 10, "x" * 5])
+
+    def test_counts_utf16_units(self) -> None:
+        # Each emoji is two UTF-16 units, which is what Telegram counts.
+        self.assertEqual([len(p) for p in split_text("😀" * 6, limit=4)], [2, 2, 2])
+
+    def test_rejects_empty_and_oversized_posts(self) -> None:
+        with self.assertRaises(PayloadError):
+            render_payload("  ")
+        with self.assertRaises(PayloadError):
+            render_payload("word " * 100, limit=50, max_parts=3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from app.snapshots import SnapshotRecorder
+from app.storage import Storage
+
+
+class TestSnapshotRecorder(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "t.db")
+        self.storage = Storage(self.db_path)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def rows(self, table: str) -> int:
+        con = sqlite3.connect(self.db_path)
+        try:
+            return con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        finally:
+            con.close()
+
+    def test_series_reconstructs_from_changes_only(self) -> None:
+        samples = [
+            (10, 0, 0, {}),
+            (10, 0, 0, {}),
+            (25, 1, 0, {"👍": 2}),
+            (25, 1, 0, {"👍": 2}),
+            (30, 1, 0, {"👍": 2}),
+            (30, 1, 1, {"👍": 3, "custom:55": 1}),
+            (30, 1, 1, {"👍": 3, "custom:55": 1}),
+        ]
+        rec = SnapshotRecorder(self.storage)
+        times = []
+        for i, (views, forwards, replies, reactions) in enumerate(samples):
+            at = f"2026-01-01T00:{i:02d}:00+00:00"
+            times.append(at)
+            rec.record(chat_id="@c", message_id=7, captured_at=at, views=views, forwards=forwards, replies=replies,
+                       reactions=reactions)
+
+        self.assertEqual((self.rows("metrics"), self.rows("metric_reactions")), (4, 3))
+        series = self.storage.get_metric_series(chat_id="@c", message_id=7)
+        for at, (views, forwards, replies, reactions) in zip(times, samples):
+            point = [p for p in series if p["captured_at"] <= at][-1]
+            self.assertEqual((point["views"], point["forwards"], point["replies"], point["reactions"]),
+                             (views, forwards, replies, reactions))
+
+        stats = rec.flush_stats()
+        self.assertEqual((stats["written"], stats["skipped"]), (4, 3))
+        self.assertGreater(stats["bytes_saved"], 0)
+        self.assertEqual(self.storage.get_counters("metrics.snapshot_")["metrics.snapshot_skipped"], 3)
+
+    def test_new_recorder_compares_against_the_stored_snapshot(self) -> None:
+        first = SnapshotRecorder(self.storage)
+        first.record(chat_id="@c", message_id=1, captured_at="t1", views=5, forwards=0, replies=0, reactions={"🔥": 1})
+        again = SnapshotRecorder(self.storage)
+        again.prime("@c", [1])
+        written = again.record(chat_id="@c", message_id=1, captured_at="t2", views=5, forwards=0, replies=0,
+                               reactions={"🔥": 1})
+        self.assertFalse(written)
+        self.assertEqual(self.rows("metrics"), 1)
+
+    def test_legacy_json_reactions_are_still_read(self) -> None:
+        con = sqlite3.connect(self.db_path)
+        con.execute(
+            "INSERT INTO metrics (captured_at, chat_id, message_id, views, forwards, replies, reactions_json) "
+            "VALUES ('t0', '@c', 3, 1, 0, 0, '{\"x\": 4}')"
+        )
+        con.commit()
+        con.close()
+        latest = self.storage.get_latest_metrics(chat_id="@c")
+        self.assertEqual(latest[0]["reactions"], {"x": 4})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import tempfile
+import unittest
+
+from app.agents import WriterAgent
+from app.llm import LLM, Completion
+from app.llm_router import BackendRouter
+from app.planner import _record_writer_outcomes
+from app.storage import Storage
+from app.structured_output import POST_SCHEMA, parse_post, writer_output_stats
+
+ITEM = dict(title="T", source="example.com", link="https://e.x/1", summary="S", format="breaking_news", lang="ru")
+
+
+class FakeResponse:
+    status_code = 200
+
+    def json(self):
+        return {"response": '{"alt_title_1": "A", "alt_title_2": "B", "post": "P"}'}
+
+
+class TestParsePost(unittest.TestCase):
+    def test_valid_answer(self) -> None:
+        obj, status = parse_post('{"alt_title_1": "A", "alt_title_2": "B", "post": "P"}')
+        self.assertEqual((obj["post"], status), ("P", "valid"))
+
+    def test_near_misses_are_repaired(self) -> None:
+        cases = [
+            '```json\n{"alt_title_1": "A", "alt_title_2": "B", "post": "P",}\n```',
+            'Вот пост: {"alt_title_1": "A", "alt_title_2": "B", "post": "line1\nP"}',
+            '{"alt_title_1": "A", "alt_title_2": "B", "post": "P',
+            '{"Title": "A", "text": "P"}',
+            '{"result": {"alt_title_1": "A", "alt_title_2": "B", "post": "P"}}',
+        ]
+        for raw in cases:
+            obj, status = parse_post(raw)
+            self.assertEqual(status, "repaired", raw)
+            self.assertTrue(obj["post"].endswith("P"), raw)
+        self.assertEqual(parse_post('{"Title": "A", "text": "P"}')[0]["alt_title_1"], "A")
+
+    def test_unusable_answers_are_invalid(self) -> None:
+        for raw in ("", "plain text", '{"post": ""}', '{"alt_title_1": "A"}'):
+            self.assertEqual(parse_post(raw), (None, "invalid"), raw)
+
+
+class TestStructuredWriter(unittest.TestCase):
+    def test_parse_failure_does_not_generate_again(self) -> None:
+        llm = LLM(ollama_base_url="http://ollama", ollama_model="m", openai_api_key="", openai_model="")
+        calls = []
+        llm._ollama_request = lambda **kw: calls.append(kw) or Completion(text='{"alt_title_1": ', backend="ollama")
+        writer = WriterAgent(llm)
+        p = writer.write(**ITEM)
+        self.assertEqual(len(calls), 1)
+        self.assertIs(calls[0]["schema"], POST_SCHEMA)
+        self.assertIn("https://e.x/1", p.post_text)
+        self.assertEqual(writer.outcomes["template"], 1)
+
+    def test_schema_reaches_ollama_payload(self) -> None:
+        llm = LLM(ollama_base_url="http://ollama", ollama_model="m", openai_api_key="", openai_model="")
+        sent = []
+
+        class Transport:
+            def post(self, url, json, **kw):
+                sent.append(json)
+                return FakeResponse()
+
+        llm._transport = lambda backend: Transport()
+        self.assertEqual(WriterAgent(llm).write(**ITEM).post_text, "P")
+        self.assertEqual(sent[0]["format"], POST_SCHEMA)
+
+        llm.structured_output = "json"
+        self.assertEqual(llm._ollama_format(POST_SCHEMA), {"format": "json"})
+        self.assertEqual(llm._openai_format(POST_SCHEMA), {"response_format": {"type": "json_object"}})
+        self.assertEqual(llm._openai_format(None), {})
+
+    def test_openai_rejecting_schema_mode_falls_back(self) -> None:
+        llm = LLM(
+            ollama_base_url="", ollama_model="", openai_api_key="k", openai_model="gpt-3.5-turbo", router=BackendRouter()
+        )
+        sent = []
+
+        class Rejected:
+            status_code = 400
+            text = '{"error": {"message": "Invalid parameter: \'response_format\' of type \'json_schema\' is not supported with this model.", "param": "response_format"}}'
+
+            def close(self):
+                pass
+
+        class Answer:
+            status_code = 200
+
+            def json(self):
+                content = '{"alt_title_1": "A", "alt_title_2": "B", "post": "P"}'
+                return {"choices": [{"message": {"content": content}}], "usage": {}}
+
+        class Transport:
+            def post(self, url, json, **kw):
+                sent.append(json.get("response_format", {}).get("type"))
+                return Rejected() if sent[-1] == "json_schema" else Answer()
+
+        llm._transport = lambda backend: Transport()
+        self.assertEqual(WriterAgent(llm).write(**ITEM).post_text, "P")
+        self.assertEqual(WriterAgent(llm).write(**ITEM).post_text, "P")
+        # One rejected schema request, then JSON mode from then on.
+        self.assertEqual(sent, ["json_schema", "json_object", "json_object"])
+        self.assertEqual(llm.router.snapshot().get("openai", {}).get("errors", 0), 0)
+
+    def test_fallback_rate_is_persisted(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = Storage(tmp + "/test.db")
+            writer = WriterAgent(None)
+            writer.outcomes.update(valid=2, repaired=1, template=1)
+            _record_writer_outcomes(storage, writer)
+            stats = writer_output_stats(storage)
+        self.assertEqual((stats["valid"], stats["template"]), (2, 1))
+        self.assertEqual(stats["fallback_rate"], 0.25)
+
+
+if __name__ == "__main__":
+    unittest.main()
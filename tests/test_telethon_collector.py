@@ -0,0 +1,188 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from telethon.errors import ChannelPrivateError
+from telethon.tl.types import InputPeerChannel
+
+from app.sampling import next_sample_interval
+from app.storage import Storage
+from app.telethon_collector import CollectorSession, collect_once
+
+from conftest import make_cfg
+
+
+class FakeClient:
+    def __init__(self):
+        self.connected = False
+        self.starts = 0
+        self.lookups = 0
+        self.access_hash = 42
+        self.fetched_with = []
+        self.fetched_ids = []
+        # message id -> (views, date); unknown ids come back as None
+        self.messages = {}
+        # channel ids whose messages can't be read, however the peer is resolved
+        self.private = set()
+
+    async def start(self):
+        self.starts += 1
+        self.connected = True
+
+    async def connect(self):
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    async def disconnect(self):
+        self.connected = False
+
+    async def get_entity(self, peer):
+        self.lookups += 1
+        return InputPeerChannel(peer.channel_id, self.access_hash)
+
+    async def get_messages(self, peer, ids=None, limit=None):
+        if peer.access_hash != self.access_hash or peer.channel_id in self.private:
+            raise ChannelPrivateError(request=None)
+        self.fetched_with.append(peer)
+        if ids is None:
+            return [SimpleNamespace(id=1, message="m", views=10, forwards=1, replies=None, reactions=None)]
+        self.fetched_ids.append(list(ids))
+        return [
+            SimpleNamespace(id=i, message="m", views=self.messages[i][0], forwards=0, replies=None, reactions=None,
+                            date=self.messages[i][1])
+            if i in self.messages else None
+            for i in ids
+        ]
+
+
+class TestCollectorSession(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = Storage(os.path.join(self.tmp.name, "t.db"))
+        self.cfg = make_cfg(
+            app_mode="collector",
+            target_chat_id="-1001234",
+            post_times=["09:00"],
+            max_posts_per_day=1,
+            telethon_api_id=1,
+            telethon_api_hash="hash",
+        )
+        self.client = FakeClient()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def session(self) -> CollectorSession:
+        return CollectorSession(self.cfg, self.storage, client_factory=lambda: self.client)
+
+    def test_client_and_entity_are_reused_across_cycles(self) -> None:
+        session = self.session()
+
+        async def run():
+            for _ in range(3):
+                ok, info = await collect_once(storage=self.storage, session=session)
+                self.assertTrue(ok, info)
+            # Dropped connection: the next cycle reconnects instead of logging in again.
+            self.client.connected = False
+            ok, _ = await collect_once(storage=self.storage, session=session)
+            self.assertTrue(ok)
+
+        asyncio.run(run())
+        self.assertEqual((self.client.starts, self.client.lookups), (1, 1))
+        self.assertEqual(session.stats["reconnects"], 1)
+        self.assertEqual(session.stats["peer_hits"], 3)
+        # Four samples of an unchanged post: one stored snapshot.
+        self.assertEqual(len(self.storage.get_metric_series(chat_id="-1001234", message_id=1)), 1)
+        self.assertEqual(self.storage.get_tg_entity("-1001234"), {"kind": "channel", "peer_id": 1234, "access_hash": 42})
+
+    def test_peer_is_loaded_from_db_and_re_resolved_when_stale(self) -> None:
+        self.storage.save_tg_entity(chat_id="-1001234", kind="channel", peer_id=1234, access_hash=7)
+        session = self.session()
+        ok, info = asyncio.run(collect_once(storage=self.storage, session=session))
+        self.assertTrue(ok, info)
+        self.assertEqual(session.stats["peer_db_hits"], 1)
+        self.assertEqual(self.client.lookups, 1)
+        self.assertEqual(self.client.fetched_with[-1].access_hash, 42)
+        self.assertEqual(self.storage.get_tg_entity("-1001234")["access_hash"], 42)
+
+    def test_target_that_keeps_failing_does_not_stop_the_others(self) -> None:
+        self.storage.set_setting("target_chat_id", "-1005678,-1001234")
+        self.client.private = {5678}
+        ok, info = asyncio.run(collect_once(storage=self.storage, session=self.session()))
+        self.assertTrue(ok, info)
+        self.assertIn("-1005678: fetch failed for -1005678: ChannelPrivateError", info)
+        self.assertEqual([p.channel_id for p in self.client.fetched_with], [1234])
+
+    def test_only_due_posts_are_fetched(self) -> None:
+        now = datetime.now(timezone.utc)
+        self.client.messages = {
+            1: (50, now - timedelta(minutes=10)),
+            2: (900, now - timedelta(days=5)),
+        }
+        for mid in (1, 2, 3):
+            row = self.storage.add_outbox(key=f"k{mid}", chat_id="-1001234", text="t", payload=["t"], now=0)
+            self.storage.finish_outbox(row["id"], status="sent", tg_message_id=mid)
+        session = self.session()
+
+        ok, info = asyncio.run(collect_once(storage=self.storage, session=session))
+        self.assertTrue(ok, info)
+        self.assertIn("due=3/3", info)
+        self.assertEqual(sorted(self.client.fetched_ids[-1]), [1, 2, 3])
+
+        ok, info = asyncio.run(collect_once(storage=self.storage, session=session))
+        self.assertIn("due=0/3", info)
+        self.assertEqual(len(self.client.fetched_ids), 1)
+
+        # The fresh post comes due within minutes; the old and the missing one not for a day.
+        due = lambda at: [d["message_id"] for d in self.storage.list_due_metric_messages(chat_id="-1001234", now=at)]
+        self.assertEqual(due(time.time() + 300), [1])
+        self.assertEqual(sorted(due(time.time() + 86400)), [1, 2, 3])
+
+    def test_old_posts_are_retired_and_dropped_outside_the_window(self) -> None:
+        now = datetime.now(timezone.utc)
+        self.client.messages = {1: (50, now - timedelta(minutes=10)), 2: (900, now - timedelta(days=40))}
+        for mid in (1, 2):
+            row = self.storage.add_outbox(key=f"k{mid}", chat_id="-1001234", text="t", payload=["t"], now=0)
+            self.storage.finish_outbox(row["id"], status="sent", tg_message_id=mid)
+        session = self.session()
+        ok, info = asyncio.run(collect_once(storage=self.storage, session=session))
+        self.assertIn("due=2/2", info)
+
+        # The 40-day-old post was sampled once more and is never due again.
+        due = [d["message_id"] for d in self.storage.list_due_metric_messages(chat_id="-1001234", now=time.time() + 10**7)]
+        self.assertEqual(due, [1])
+        ok, info = asyncio.run(collect_once(storage=self.storage, session=session))
+        self.assertIn("due=0/1", info)
+
+        # Posts that drop out of the recent sent window leave the schedule.
+        self.assertEqual(self.storage.schedule_metric_messages(chat_id="-1001234", message_ids=[2]), 0)
+        self.assertEqual(self.storage.schedule_metric_messages(chat_id="-1001234", message_ids=[]), 0)
+        self.assertIsNone(self.storage.next_metric_sample_at())
+
+
+class TestSampling(unittest.TestCase):
+    def interval(self, age, views=100, prev_views=None, prev_interval=None):
+        return next_sample_interval(
+            age_seconds=age, views=views, prev_views=prev_views, prev_interval=prev_interval,
+            min_seconds=120, max_seconds=86400,
+        )
+
+    def test_interval_grows_with_age_within_bounds(self) -> None:
+        self.assertEqual(self.interval(60), 120)
+        self.assertEqual(self.interval(4 * 3600), 3600)
+        self.assertEqual(self.interval(30 * 86400), 86400)
+
+    def test_growth_tightens_and_idle_stretches(self) -> None:
+        self.assertEqual(self.interval(4 * 3600, views=150, prev_views=100, prev_interval=3000), 1800)
+        self.assertEqual(self.interval(4 * 3600, views=100, prev_views=100, prev_interval=3000), 4500)
+        self.assertEqual(self.interval(4 * 3600, views=102, prev_views=100, prev_interval=3000), 3600)
+
+
+if __name__ == "__main__":
+    unittest.main()